@@ -0,0 +1,211 @@
+"""
+Benchmarks for the splitting and indexing hot paths.
+
+    python -m benchmarks.bench [--sizes 1K,1M,50M] [--save FILE] [--compare FILE]
+
+Every operation is timed on synthetic decks (see decks.py) of each size and
+profile; throughput is the deck size divided by the best time, peak memory
+is measured separately with tracemalloc. Results can be saved as a baseline
+and later runs compared against it, failing with exit status 1 when an
+operation got slower or uses more memory than the thresholds allow.
+"""
+import argparse
+import gc
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from mdslider import (SEPARATORS, SearchIndex, build_deck, make_index, resolve_pages, rewrite_images, scan_lines,
+                      update_deck)
+
+from .decks import PROFILES, generate_deck
+
+UNITS = {"K": 1000, "M": 1000 ** 2}
+IMAGE_SERVER_URL = "http://localhost:8000/0123456789ab/"
+PAGE_LINES = 20
+# Time differences below this many seconds are treated as noise.
+TIME_SLACK = 0.0005
+
+
+def parse_size(label):
+    """
+    Parses a size such as '64K' or '50M' into a number of characters.
+    """
+    unit = UNITS.get(label[-1].upper())
+    return int(float(label[:-1]) * unit) if unit else int(label)
+
+
+def separator_combinations(mode):
+    """
+    Returns the separator combinations to split with: every separator on its
+    own plus all of them together ('single'), or every non-empty combination ('all').
+    """
+    if mode == "all":
+        return [frozenset(c) for n in range(1, len(SEPARATORS) + 1) for c in itertools.combinations(SEPARATORS, n)]
+    return [frozenset({s}) for s in SEPARATORS] + [frozenset(SEPARATORS)]
+
+
+def combination_name(separators):
+    if len(separators) == len(SEPARATORS):
+        return "all"
+    return "+".join(s.removeprefix("separator_") for s in SEPARATORS if s in separators)
+
+
+def operations(text, combinations):
+    """
+    Yields (name, function) for every operation measured on a deck.
+    Inputs are prepared up front so each function times one operation only.
+    """
+    index = scan_lines(text)
+    yield "scan_lines", lambda: scan_lines(text)
+    for separators in combinations:
+        yield f"split[{combination_name(separators)}]", lambda s=separators: resolve_pages(index, s, PAGE_LINES)
+    yield "rewrite_images", lambda: rewrite_images(text, IMAGE_SERVER_URL)
+    yield "rewrite_images[fit]", lambda: rewrite_images(text, IMAGE_SERVER_URL, "1920x1080")
+
+    config = (frozenset({"separator_hr", "separator_h2"}), PAGE_LINES, IMAGE_SERVER_URL, None)
+    yield "build_deck", lambda: build_deck(text, config)
+    deck = build_deck(text, config)
+    pages = deck.page_texts()
+    yield "make_index", lambda: make_index(pages)
+    yield "outline", lambda: (setattr(deck, "contents", None), deck.outline())
+    yield "search_index", lambda: SearchIndex().update(deck)
+
+    middle = text.find("\n", len(text) // 2) + 1
+    edited = text[:middle] + "Edited line\n" + text[middle:]
+    yield "update_deck", lambda: update_deck(deck, edited, config)
+
+
+def best_time(function, min_time, max_repeat):
+    """
+    Runs the function until min_time seconds have passed (at most max_repeat
+    times) and returns the fastest run. Like timeit, the garbage collector
+    is disabled while timing.
+    """
+    best = float("inf")
+    total = 0.0
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(max_repeat):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            best = min(best, elapsed)
+            total += elapsed
+            if total >= min_time:
+                break
+    finally:
+        gc.enable()
+    return best
+
+
+def peak_memory(function):
+    """
+    Returns the peak memory, in bytes, allocated while running the function.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(args):
+    """
+    Measures every operation for every size and profile, printing results
+    as they come. Returns a dict of results keyed by case name.
+    """
+    results = {}
+    combinations = separator_combinations(args.combinations)
+    for label in args.sizes.split(","):
+        size = parse_size(label)
+        for profile in args.profiles.split(","):
+            text = generate_deck(size, profile)
+            for name, function in operations(text, combinations):
+                case = f"{name} {profile} {label}"
+                seconds = best_time(function, args.min_time, args.repeat)
+                result = {"seconds": seconds, "chars": len(text), "mb_per_s": len(text) / seconds / 1e6}
+                if args.memory:
+                    result["peak_bytes"] = peak_memory(function)
+                results[case] = result
+                print(format_result(case, result), flush=True)
+    return results
+
+
+def format_result(case, result, baseline=None):
+    line = f"{case:<48} {result['seconds'] * 1000:>10.3f} ms {result['mb_per_s']:>9.1f} MB/s"
+    if "peak_bytes" in result:
+        line += f" {result['peak_bytes'] / 1e6:>9.2f} MB peak"
+    if baseline:
+        line += f"  {result['seconds'] / baseline['seconds'] - 1:+7.1%} time"
+        if "peak_bytes" in result and baseline.get("peak_bytes"):
+            line += f" {result['peak_bytes'] / baseline['peak_bytes'] - 1:+7.1%} memory"
+    return line
+
+
+def regressions(results, baseline, threshold, memory_threshold):
+    """
+    Returns the cases that got slower than the time threshold or use more
+    memory than the memory threshold allows, compared with the baseline.
+    """
+    found = []
+    for case, result in results.items():
+        old = baseline.get(case)
+        if old is None:
+            continue
+        slower = result["seconds"] - old["seconds"]
+        if slower > TIME_SLACK and result["seconds"] > old["seconds"] * (1 + threshold):
+            found.append(case)
+        elif "peak_bytes" in result and "peak_bytes" in old and \
+                result["peak_bytes"] > old["peak_bytes"] * (1 + memory_threshold):
+            found.append(case)
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sizes", default="1K,32K,1M", help="comma-separated deck sizes, e.g. 1K,1M,50M (default: 1K,32K,1M)")
+    parser.add_argument("--full", action="store_const", const="1K,32K,1M,8M,50M", dest="sizes",
+                        help="measure decks from 1K to 50M")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help=f"comma-separated deck profiles: {', '.join(PROFILES)}")
+    parser.add_argument("--combinations", choices=("single", "all"), default="single",
+                        help="separator combinations to split with (default: each separator and all of them)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to repeat each operation for (default: 0.2)")
+    parser.add_argument("--repeat", type=int, default=50, help="maximum runs of each operation (default: 50)")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip peak memory measurement")
+    parser.add_argument("--save", metavar="FILE", help="save the results as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare with a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown (default: 0.25 = 25%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.10, help="allowed peak memory growth (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "platform": platform.platform(), "results": results}, f, indent=1)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"\nCompared with {args.compare}:")
+        for case, result in results.items():
+            if case in baseline:
+                print(format_result(case, result, baseline[case]))
+        found = regressions(results, baseline, args.threshold, args.memory_threshold)
+        if found:
+            print(f"\n{len(found)} regression(s):", *found, sep="\n  ")
+            return 1
+        print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
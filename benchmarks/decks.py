@@ -0,0 +1,95 @@
+"""
+Synthetic markdown decks for the benchmarks.
+
+Decks are built from random blocks (headings, paragraphs, lists, rules,
+bold lines, code blocks, tables and images) up to a target size. How often
+code blocks, tables and images appear is set by a profile, so the same
+size can be measured with different block structure.
+"""
+import random
+
+# Share of blocks that are code blocks, tables and images.
+PROFILES = {
+    "prose": {"code": 0.0, "tables": 0.0, "images": 0.0},
+    "mixed": {"code": 0.1, "tables": 0.05, "images": 0.05},
+    "code": {"code": 0.4, "tables": 0.0, "images": 0.0},
+    "tables": {"code": 0.0, "tables": 0.4, "images": 0.0},
+    "images": {"code": 0.0, "tables": 0.0, "images": 0.4},
+}
+
+WORDS = ("slide deck markdown split page heading table image code fence render "
+         "streamlit server cache index offset stream block line text section").split()
+
+
+def sentence(rnd, words=12):
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(words // 2, words))).capitalize() + "."
+
+
+def heading(rnd):
+    level = rnd.choices((1, 2, 3, 4), (1, 4, 4, 2))[0]
+    return f"{'#' * level} {sentence(rnd, 5)[:-1]}\n"
+
+
+def paragraph(rnd):
+    return "\n".join(sentence(rnd) for _ in range(rnd.randint(1, 4))) + "\n"
+
+
+def bullet_list(rnd):
+    return "".join(f"- {sentence(rnd, 6)}\n" for _ in range(rnd.randint(2, 6)))
+
+
+def code_block(rnd):
+    # Lines that look like separators must not split inside a code block
+    lines = [rnd.choice(("x = split(text)", "# comment", "---", "**kwargs", "return pages"))
+             for _ in range(rnd.randint(3, 15))]
+    return "```python\n" + "\n".join(lines) + "\n```\n"
+
+
+def table(rnd):
+    columns = rnd.randint(2, 5)
+    rows = ["| " + " | ".join(rnd.choice(WORDS) for _ in range(columns)) + " |" for _ in range(rnd.randint(2, 10))]
+    return "\n".join([rows[0], "|" + "---|" * columns] + rows[1:]) + "\n"
+
+
+def image(rnd):
+    name = f"{rnd.choice(WORDS)}-{rnd.randint(1, 500)}.png"
+    if rnd.random() < 0.3:
+        return f"![[{name}]]\n"
+    return f"![{rnd.choice(WORDS)}](images/{rnd.choice(WORDS)}/{name})\n"
+
+
+TEXT_BLOCKS = (
+    (heading, 3),
+    (paragraph, 6),
+    (bullet_list, 2),
+    (lambda rnd: "---\n", 1),
+    (lambda rnd: f"**{sentence(rnd, 4)[:-1]}**\n", 1),
+)
+
+
+def generate_deck(size, profile="mixed", seed=0):
+    """
+    Returns a random markdown deck of about `size` characters with the
+    block mix of the named profile. The same arguments give the same deck.
+    """
+    rnd = random.Random(seed)
+    shares = PROFILES[profile]
+    text_share = 1.0 - sum(shares.values())
+    total = sum(weight for _, weight in TEXT_BLOCKS)
+    makers = [make for make, _ in TEXT_BLOCKS] + [code_block, table, image]
+    weights = [text_share * weight / total for _, weight in TEXT_BLOCKS]
+    weights += [shares["code"], shares["tables"], shares["images"]]
+
+    # A pool of blocks is sampled over and over, so decks of tens of
+    # megabytes are quick to generate.
+    pool = [make(rnd) for make in rnd.choices(makers, weights, k=2000)]
+    blocks = []
+    length = 0
+    while length < size:
+        for block in rnd.choices(pool, k=256):
+            blocks.append(block)
+            blocks.append("\n")
+            length += len(block) + 1
+            if length >= size:
+                break
+    return "".join(blocks)[:size]
@@ -0,0 +1,50 @@
+"""
+Markdown Slider core: splitting markdown documents into slides, building
+their table of contents and rewriting image links, without Streamlit.
+The Streamlit app (slider.py) and the command line interface are thin
+layers over this package.
+
+Public names are imported from their modules on first use, so importing
+the package (e.g. for the command line) doesn't load the image server,
+the process pools or the file watcher.
+"""
+import importlib
+
+# Public names, by the module they are defined in
+EXPORTS = {
+    "autosave": ("AutoSaver", "atomic_write"),
+    "blocks": ("SEPARATORS", "BlockIndex", "PageTable", "line_bounds", "line_starts", "page_text", "resolve_pages",
+               "scan_lines", "split_content", "split_segments"),
+    "deck": ("Deck", "SplitCache", "build_deck", "content_hash", "update_deck"),
+    "diskcache": ("DiskSplitCache", "deck_entry", "deck_summary", "entry_deck", "read_metadata", "write_entry"),
+    "export": ("export_deck",),
+    "files": ("DiskLRU", "FileHashes", "file_hash"),
+    "images": ("image_path", "image_reference", "image_url", "link_originals", "page_image_urls", "preload_hints",
+               "replace_image_link", "rewrite_images"),
+    "mapped": ("MappedText", "map_file", "map_stream", "mapped_deck", "scan_mapped"),
+    "metrics": ("Metrics", "RunTimer", "json_lines", "timed"),
+    "prerender": ("HtmlCache", "render_html", "static_html"),
+    "present": ("PRESENTER_TIMEOUT", "Presentation", "PresentationHub"),
+    "search": ("SearchIndex", "page_snippet", "page_words"),
+    "server": ("ImageServer",),
+    "thumbnails": ("VariantCache", "parse_fit"),
+    "toc": ("Outline", "make_index", "page_label", "remove_decorators"),
+    "watch": ("FileWatcher",),
+    "workspace": ("Workspace", "index_file"),
+}
+MODULES = {name: module for module, names in EXPORTS.items() for name in names}
+
+__all__ = list(MODULES)
+
+
+def __getattr__(name):
+    module = MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
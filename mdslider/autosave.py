@@ -0,0 +1,185 @@
+"""
+Saving documents atomically, in the background.
+"""
+import atexit
+import os
+import threading
+import time
+
+from .deck import content_hash
+from .files import FileHashes
+
+
+def atomic_write(path, text):
+    """
+    Writes text to a file as UTF-8 through a temporary file in the same
+    directory that is renamed over it, so the file is never left half
+    written. The file's permissions are kept. Returns the content hash of
+    the text (see content_hash).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    data = text.encode("utf-8", "surrogatepass")
+    temp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.urandom(6).hex()}.tmp")
+    # Created like any new file, with the process umask applied by the kernel
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # Make the rename itself durable
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            pass
+        else:
+            try:
+                os.fsync(dir_fd)
+            except OSError:
+                pass
+            finally:
+                os.close(dir_fd)
+    return content_hash(text)
+
+
+class AutoSaver:
+    """
+    Writes documents in a background thread, shared by all sessions.
+    Writes are debounced per path: a document is written once it hasn't
+    been resubmitted for `delay` seconds, only if its content differs from
+    what the file holds, and atomically (see atomic_write). Pending writes
+    are flushed when the process exits.
+    """
+
+    def __init__(self, delay=2.0):
+        self.delay = delay
+        self.pending = {}  # path -> (text, time it is due, submission number)
+        self.submissions = 0
+        self.written = {}  # path -> submission number of the last write
+        self.digests = FileHashes()  # Content hashes of the files as last written or read
+        self.saved = {}  # path -> time of the last write
+        self.errors = {}  # path -> message of the last failed write
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """
+        Starts the writer thread. Returns False if already running.
+        """
+        with self.condition:
+            if self.running:
+                return False
+            self.thread = threading.Thread(target=self.run, daemon=True, name="mdslider-autosave")
+            self.thread.start()
+        atexit.register(self.flush)
+        return True
+
+    def submit(self, path, text, delay=None):
+        """
+        Queues a document to be written to path after delay seconds (the
+        saver's delay by default), replacing a write of it still pending.
+        """
+        path = os.path.abspath(path)
+        due = time.monotonic() + (self.delay if delay is None else delay)
+        with self.condition:
+            self.submissions += 1
+            self.pending[path] = (text, due, self.submissions)
+            self.condition.notify()
+
+    def save(self, path, text):
+        """
+        Writes a document now, on the calling thread, dropping a pending
+        write of it. Returns True if the file changed. Raises OSError if it
+        can't be written.
+        """
+        path = os.path.abspath(path)
+        with self.condition:
+            self.pending.pop(path, None)
+            self.submissions += 1
+            number = self.submissions
+        return self.write(path, text, number)
+
+    def is_pending(self, path):
+        """
+        Returns True if a write of path is waiting to be made.
+        """
+        with self.condition:
+            return os.path.abspath(path) in self.pending
+
+    def status(self, path):
+        """
+        Returns (time of the last write, message of the last error) for a path; either may be None.
+        """
+        path = os.path.abspath(path)
+        with self.condition:
+            return self.saved.get(path), self.errors.get(path)
+
+    def flush(self):
+        """
+        Writes every pending document now.
+        """
+        with self.condition:
+            pending, self.pending = self.pending, {}
+        for path, (text, _, number) in pending.items():
+            self.try_write(path, text, number)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                path, (text, due, number) = min(self.pending.items(), key=lambda item: item[1][1])
+                wait = due - time.monotonic()
+                if wait > 0:
+                    # Woken up early by a new submission, or the write is due
+                    self.condition.wait(wait)
+                    continue
+                del self.pending[path]
+            self.try_write(path, text, number)
+
+    def write(self, path, text, number):
+        """
+        Writes submission `number` of a document, unless a later one was
+        already written or the file holds the same content. Returns True if
+        it was written.
+        """
+        with self.write_lock:
+            if self.written.get(path, 0) > number:
+                return False
+            self.written[path] = number
+            digest = content_hash(text)
+            if digest == self.digests.get(path):
+                return False
+            atomic_write(path, text)
+            self.digests.set(path, digest)
+            with self.condition:
+                self.saved[path] = time.time()
+                self.errors.pop(path, None)
+            return True
+
+    def try_write(self, path, text, number):
+        """
+        Writes like write(), keeping the error message for status() if it fails.
+        """
+        try:
+            self.write(path, text, number)
+        except OSError as e:
+            with self.condition:
+                self.errors[path] = str(e)
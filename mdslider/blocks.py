@@ -0,0 +1,503 @@
+"""
+Block-structure scanning and slide splitting.
+
+scan_lines() walks a document once and records every line's offsets and
+block-structure flags in a BlockIndex. The splitting stages then work out
+the pages for any combination of separators from that index alone, as a
+PageTable of offsets into the document.
+"""
+import itertools
+import operator
+import re
+from array import array
+
+# Per-line flags recorded by scan_lines().
+LINE_FENCE = 1       # Opens or closes a ``` code block
+LINE_TABLE = 2       # Starts with '|' or '+-'
+LINE_BLANK = 4       # Empty or whitespace only
+LINE_HR = 8          # Horizontal rule ('---')
+LINE_BOLD = 16       # Bold-only line ('**...**')
+LINE_IMAGE = 32      # Markdown image ('![alt](path)')
+LINE_HEADING = 64    # Any line starting with '#'
+LINE_LF = 128        # Ends with a single '\n' line break
+
+# Slide separators in the order they are applied to the document.
+SEPARATORS = (
+    "separator_page_length",
+    "separator_hr",
+    "separator_h1",
+    "separator_h2",
+    "separator_h3",
+    "separator_h4",
+    "separator_bold",
+    "separator_after_image",
+)
+
+HEADING_LEVELS = {"separator_h1": 1, "separator_h2": 2, "separator_h3": 3, "separator_h4": 4}
+
+IMAGE_LINE_RE = re.compile(r"!\[.*\]\(.*\)")
+LINE_BREAKS = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+
+# Marks a page boundary in a stream of line tokens.
+PAGE_BREAK = -1
+
+
+class BlockIndex:
+    """
+    Line index of a markdown document built in a single pass by scan_lines().
+    Stores the offsets of every line together with its block-structure flags,
+    so slides can be split with any combination of separators without
+    scanning the text again.
+    """
+    __slots__ = ("text", "starts", "ends", "flags", "levels")
+
+    def __init__(self, text, starts, ends, flags, levels):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.flags = flags
+        self.levels = levels
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line(self, token):
+        """
+        Returns the text of a line token (line number shifted left by one,
+        with the low bit set when the line is carried over stripped).
+        """
+        i = token >> 1
+        line = self.text[self.starts[i]:self.ends[i]]
+        return line.strip() if token & 1 else line
+
+
+class PageTable:
+    """
+    Pages of a split document as offsets into its text. Page i is made of
+    the (start, end) spans spans[2 * bounds[i]:2 * bounds[i + 1]], each a run
+    of whole lines joined by single '\n' line breaks. If carried[i] is set,
+    the first span is a heading carried over from the previous page and is
+    stripped.
+    """
+    __slots__ = ("spans", "bounds", "carried")
+
+    def __init__(self, spans=None, bounds=None, carried=None):
+        self.spans = array("q") if spans is None else spans
+        self.bounds = array("q", [0]) if bounds is None else bounds
+        self.carried = bytearray() if carried is None else carried
+
+    def __len__(self):
+        return len(self.carried)
+
+    def __eq__(self, other):
+        return (isinstance(other, PageTable) and self.spans == other.spans
+                and self.bounds == other.bounds and self.carried == other.carried)
+
+    def __getitem__(self, pages):
+        """
+        Returns the pages in a slice as a new PageTable.
+        """
+        start, stop, _ = pages.indices(len(self))
+        stop = max(start, stop)
+        first = self.bounds[start]
+        return PageTable(self.spans[2 * first:2 * self.bounds[stop]],
+                         array("q", [bound - first for bound in self.bounds[start:stop + 1]]),
+                         self.carried[start:stop])
+
+    def __add__(self, other):
+        offset = self.bounds[-1]
+        return PageTable(self.spans + other.spans,
+                         self.bounds + array("q", [bound + offset for bound in other.bounds[1:]]),
+                         self.carried + other.carried)
+
+    def start(self, i):
+        """
+        Returns the offset at which page i starts.
+        """
+        return self.spans[2 * self.bounds[i]]
+
+    def page_spans(self, i):
+        """
+        Returns the (start, end) spans of page i.
+        """
+        spans = self.spans
+        return [(spans[j], spans[j + 1]) for j in range(2 * self.bounds[i], 2 * self.bounds[i + 1], 2)]
+
+    def shift(self, delta):
+        """
+        Returns the pages with every offset moved by delta.
+        """
+        if not delta:
+            return self
+        return PageTable(array("q", [offset + delta for offset in self.spans]), self.bounds, self.carried)
+
+    def size(self):
+        """
+        Returns the memory used by the page offsets in bytes.
+        """
+        return (len(self.spans) + len(self.bounds)) * self.spans.itemsize + len(self.carried)
+
+
+def heading_level(line):
+    """
+    Returns the level (1-4) of a '# Title' style heading, or 0.
+    """
+    for level in range(1, 5):
+        if line.startswith("#" * level + " "):
+            return level
+    return 0
+
+
+def scan_lines(text, start=0, end=None):
+    """
+    Walks text[start:end] once and records the offsets and block-structure
+    flags (code fences, tables, headings, rules, bold lines, images) of every line.
+    Offsets are absolute positions in text.
+    """
+    starts = array("q")
+    ends = array("q")
+    flags = bytearray()
+    levels = bytearray()
+
+    pos = start
+    for raw in text[start:end].splitlines(True):
+        end = pos + len(raw)
+        f = 0
+        if raw[-1] in LINE_BREAKS:
+            if raw.endswith("\r\n"):
+                end -= 2
+            else:
+                end -= 1
+                if raw[-1] == "\n":
+                    f = LINE_LF
+        line = text[pos:end]
+        stripped = line.strip()
+
+        level = 0
+        if not stripped:
+            f |= LINE_BLANK
+        else:
+            first = stripped[0]
+            if stripped.startswith("```"):
+                f |= LINE_FENCE
+            if first == "|" or stripped.startswith("+-"):
+                f |= LINE_TABLE
+            elif first == "#":
+                f |= LINE_HEADING
+                # Low nibble: level of the line as written; high nibble: level
+                # once stripped (used when a heading is carried to the next page).
+                level = heading_level(line) | (heading_level(stripped) << 4)
+            elif first == "!" and IMAGE_LINE_RE.match(stripped):
+                f |= LINE_IMAGE
+            if line.startswith("---") and (len(line) == 3 or line[3:].isspace()):
+                f |= LINE_HR
+            elif len(line) >= 4 and line.startswith("**") and line.endswith("**"):
+                f |= LINE_BOLD
+
+        starts.append(pos)
+        ends.append(end)
+        flags.append(f)
+        levels.append(level)
+        pos += len(raw)
+
+    return BlockIndex(text, starts, ends, flags, levels)
+
+
+def line_starts(text, start=0, end=None):
+    """
+    Returns the offsets at which the lines of text[start:end] begin.
+    """
+    starts = array("q")
+    pos = start
+    for raw in text[start:end].splitlines(True):
+        starts.append(pos)
+        pos += len(raw)
+    return starts
+
+
+def line_bounds(text):
+    """
+    Returns the offsets at which the lines of text begin and end (before
+    their line breaks), as scan_lines() records them, without scanning them.
+    """
+    starts = array("q", itertools.accumulate(map(len, text.splitlines(True)), initial=0))
+    starts.pop()
+    ends = array("q", map(operator.add, starts, map(len, text.splitlines())))
+    return starts, ends
+
+
+def split_by_lines(tokens, num, index):
+    """
+    Splits a token stream into chunks of a specified number of lines.
+    Avoids splitting within code blocks, tables, or right before a heading.
+    """
+    flags = index.flags
+    count = 0
+    in_table = False
+    in_code_block = False
+
+    for token in tokens:
+        if token == PAGE_BREAK:
+            if count:
+                yield PAGE_BREAK
+            count = 0
+            in_table = in_code_block = False
+            continue
+
+        f = flags[token >> 1]
+        if f & LINE_FENCE:
+            in_code_block = not in_code_block
+        if f & LINE_TABLE:
+            in_table = True
+        elif in_table and f & LINE_BLANK:
+            in_table = False
+        count += 1
+
+        if count >= num and not in_table and not in_code_block:
+            if f & LINE_HEADING:
+                # Keep the heading with its content on the next page
+                if count > 1:
+                    yield PAGE_BREAK
+                yield token | 1
+                count = 1
+            else:
+                yield token
+                yield PAGE_BREAK
+                count = 0
+        else:
+            yield token
+
+    if count:
+        yield PAGE_BREAK
+
+
+def split_by_separator(tokens, is_separator, index, drop_separator=False):
+    """
+    Splits a token stream before every separator line, avoiding splits inside
+    code blocks or tables. The blank line closing a table is dropped and, if
+    drop_separator is set, so is the separator line itself.
+    """
+    flags = index.flags
+    has_content = False
+    in_table = False
+    in_code_block = False
+
+    for token in tokens:
+        if token == PAGE_BREAK:
+            if has_content:
+                yield PAGE_BREAK
+            has_content = in_table = in_code_block = False
+            continue
+
+        f = flags[token >> 1]
+        if f & LINE_FENCE:
+            in_code_block = not in_code_block
+
+        # Treat tables as a single block that ends at the next blank line
+        if f & LINE_TABLE:
+            in_table = True
+        elif in_table:
+            if f & LINE_BLANK:
+                in_table = False
+                continue
+        elif is_separator(token) and not in_code_block:
+            if has_content:
+                yield PAGE_BREAK
+                has_content = False
+            if drop_separator:
+                continue
+
+        yield token
+        has_content = True
+
+    if has_content:
+        yield PAGE_BREAK
+
+
+def split_after_image(tokens, index):
+    """
+    Splits a token stream into pages immediately after each image.
+    """
+    flags = index.flags
+    has_content = False
+    for token in tokens:
+        if token == PAGE_BREAK:
+            if has_content:
+                yield PAGE_BREAK
+            has_content = False
+            continue
+        yield token
+        has_content = True
+        if flags[token >> 1] & LINE_IMAGE:
+            yield PAGE_BREAK
+            has_content = False
+    if has_content:
+        yield PAGE_BREAK
+
+
+def heading_separator(level, index):
+    """
+    Returns a predicate matching headings of exactly the given level.
+    """
+    levels = index.levels
+    def is_heading(token):
+        packed = levels[token >> 1]
+        return ((packed >> 4) if token & 1 else (packed & 0x0F)) == level
+    return is_heading
+
+
+def flag_separator(flag, index):
+    """
+    Returns a predicate matching lines carrying the given flag.
+    """
+    flags = index.flags
+    return lambda token: flags[token >> 1] & flag
+
+
+def separator_stages(index, separators, page_lines):
+    """
+    Returns the splitting stages for the selected separators, in the order of SEPARATORS.
+    Each stage takes a token stream and returns a token stream.
+    """
+    stages = []
+    for separator in SEPARATORS:
+        if separator not in separators:
+            continue
+        if separator == "separator_page_length":
+            stages.append(lambda tokens: split_by_lines(tokens, page_lines, index))
+        elif separator == "separator_hr":
+            is_rule = flag_separator(LINE_HR, index)
+            stages.append(lambda tokens: split_by_separator(tokens, is_rule, index, drop_separator=True))
+        elif separator == "separator_bold":
+            is_bold = flag_separator(LINE_BOLD, index)
+            stages.append(lambda tokens: split_by_separator(tokens, is_bold, index))
+        elif separator == "separator_after_image":
+            stages.append(lambda tokens: split_after_image(tokens, index))
+        else:
+            is_heading = heading_separator(HEADING_LEVELS[separator], index)
+            stages.append(lambda tokens, is_heading=is_heading: split_by_separator(tokens, is_heading, index))
+    return stages
+
+
+def split_segments(index, separators, page_lines, start=0, stop_at=None):
+    """
+    Splits the document from line `start` onwards and returns (pages, segments, stop).
+
+    Segments are the lines at which the first splitting stage starts a fresh
+    page: splitting from any of them gives the same pages as splitting the
+    whole document. If stop_at is given, splitting stops at the first segment
+    start for which stop_at(line) is true, and that line is returned as stop.
+    Otherwise stop is the number of lines in the index.
+    """
+    segments = [start]
+    stop = len(index)
+
+    def mark_segments(tokens):
+        nonlocal stop
+        pending = False
+        for token in tokens:
+            if token == PAGE_BREAK:
+                pending = True
+                continue
+            if pending:
+                yield PAGE_BREAK
+                pending = False
+                # A carried (stripped) heading continues the previous stage state
+                if not token & 1:
+                    line = token >> 1
+                    if stop_at is not None and stop_at(line):
+                        stop = line
+                        return
+                    segments.append(line)
+            yield token
+        if pending:
+            yield PAGE_BREAK
+
+    tokens = iter(range(2 * start, 2 * len(index), 2))
+    stages = separator_stages(index, separators, page_lines)
+    if stages:
+        tokens = mark_segments(stages[0](tokens))
+        for stage in stages[1:]:
+            tokens = stage(tokens)
+
+    # Collect the pages as spans of lines joined by single '\n' line breaks
+    starts, ends, flags = index.starts, index.ends, index.flags
+    spans = array("q")
+    bounds = array("q", [0])
+    carried = bytearray()
+    in_page = False
+    first = -1  # First and last line of the open span
+    last = -2
+    extend = -3  # Token that extends the open span
+    page_break, lf = PAGE_BREAK, LINE_LF  # Locals are faster in this loop
+    for token in tokens:
+        if token == extend:
+            last += 1
+            extend = token + 2 if flags[last] & lf else -3
+            continue
+        if token == page_break:
+            if in_page:
+                if first >= 0:
+                    spans.append(starts[first])
+                    spans.append(ends[last])
+                bounds.append(len(spans) >> 1)
+                in_page = False
+                first, last, extend = -1, -2, -3
+            continue
+        if first >= 0:
+            spans.append(starts[first])
+            spans.append(ends[last])
+        if not in_page:
+            carried.append(token & 1)
+            in_page = True
+        line = token >> 1
+        if token & 1:
+            # A carried heading is stripped, so it is a span of its own
+            spans.append(starts[line])
+            spans.append(ends[line])
+            first, last, extend = -1, -2, -3
+        else:
+            first = last = line
+            extend = token + 2 if flags[line] & lf else -3
+    if in_page:
+        if first >= 0:
+            spans.append(starts[first])
+            spans.append(ends[last])
+        bounds.append(len(spans) >> 1)
+    return PageTable(spans, bounds, carried), segments, stop
+
+
+def resolve_pages(index, separators, page_lines):
+    """
+    Works out the pages for a combination of separators from a BlockIndex.
+    Separators are applied in the order of SEPARATORS, each one splitting the
+    pages produced by the previous ones, as a single stream over the line index.
+    Returns the pages as a PageTable.
+    """
+    return split_segments(index, separators, page_lines)[0]
+
+
+def page_text(index, pages, i):
+    """
+    Builds the markdown text of page i from the document.
+    """
+    text = index.text
+    lines = [text[start:end] for start, end in pages.page_spans(i)]
+    if pages.carried[i]:
+        lines[0] = lines[0].strip()
+    return "\n".join(lines) + "\n"
+
+
+def split_content(text, separators, page_lines):
+    """
+    Splits the markdown text into a list of pages based on the selected separators.
+    The document is scanned once; every separator combination is resolved from that scan.
+    """
+    if not separators:
+        return [text]
+
+    index = scan_lines(text)
+    pages = resolve_pages(index, separators, page_lines)
+    if len(pages) <= 1:
+        return [text]
+    return [page_text(index, pages, i) for i in range(len(pages))]
@@ -0,0 +1,181 @@
+"""
+Command line interface.
+
+    mdslider split deck.md [more.md ...] [--json | --stats]
+    mdslider export deck.md [-o deck.html | --folder]
+
+Files are split in parallel in a process pool and results are written as
+soon as they are ready, in the order the files were given. Exports are
+written slide by slide as static HTML (see export.py).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from functools import partial
+
+from .blocks import SEPARATORS
+from .deck import build_deck
+from .toc import page_label
+
+# Separator names accepted by --separators, e.g. 'hr' for 'separator_hr'
+SEPARATOR_NAMES = {key.removeprefix("separator_"): key for key in SEPARATORS}
+
+
+def split_file(path, separators, page_lines, image_server_url, stats):
+    """
+    Reads and splits one file the way the app does. Runs in worker processes.
+    Returns a JSON-serializable dict with the pages (or only statistics).
+    """
+    start = time.perf_counter()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return {"file": path, "error": str(e)}
+
+    deck = build_deck(source, (separators, page_lines, image_server_url, None))
+    pages = deck.page_texts()
+    labels = [page_label(page) for page in pages]
+    valid = [(label, page) for label, page in zip(labels, pages) if label is not None]
+    result = {"file": path}
+    if stats:
+        result.update(pages=len(valid), lines=len(deck.index), chars=len(source),
+                      seconds=round(time.perf_counter() - start, 6))
+    else:
+        result["pages"] = [{"number": i + 1, "title": label.strip(), "markdown": page}
+                           for i, (label, page) in enumerate(valid)]
+    return result
+
+
+def split_files(paths, separators, page_lines, image_server_url, stats, jobs):
+    """
+    Yields the result of split_file() for every path, in order, splitting
+    several files at a time in a process pool.
+    """
+    split = partial(split_file, separators=separators, page_lines=page_lines,
+                    image_server_url=image_server_url, stats=stats)
+    if jobs == 1 or len(paths) == 1:
+        yield from map(split, paths)
+        return
+
+    # Imported here so that single-file runs start without it
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(split, paths, chunksize=max(1, len(paths) // (workers * 4)))
+
+
+def write_result(result, args, out):
+    """
+    Writes the result for one file in the selected output format.
+    """
+    if args.json:
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    elif "error" in result:
+        pass
+    elif args.stats:
+        out.write(f"{result['file']}\t{result['pages']} pages\t{result['lines']} lines\t"
+                  f"{result['chars']} chars\t{result['seconds'] * 1000:.1f} ms\n")
+    else:
+        if len(args.files) > 1:
+            out.write(f"==> {result['file']} <==\n")
+        for page in result["pages"]:
+            out.write(f"{page['number']}. {page['title']}\n")
+    out.flush()
+
+
+def export_file(args):
+    """
+    Exports one file as a static HTML presentation. Returns the path written.
+    Raises OSError or UnicodeDecodeError if the file can't be read or the
+    output written.
+    """
+    # Imported here so that splitting starts without the thread pool and renderer
+    from .export import export_deck
+
+    with open(args.file, "r", encoding="utf-8") as f:
+        source = f.read()
+    deck = build_deck(source, (args.separators, args.page_lines, None, None))
+    image_directory = args.images or os.path.dirname(os.path.abspath(args.file))
+    stem = os.path.splitext(args.file)[0]
+    assets = None
+    if args.folder:
+        folder = args.output or stem
+        os.makedirs(folder, exist_ok=True)
+        output = os.path.join(folder, "index.html")
+        assets = os.path.join(folder, "images")
+    else:
+        output = args.output or stem + ".html"
+    if output == "-":
+        slides, images = export_deck(deck, sys.stdout, image_directory, title=args.title, jobs=args.jobs)
+    else:
+        with open(output, "w", encoding="utf-8") as out:
+            slides, images = export_deck(deck, out, image_directory, assets, args.title, args.jobs)
+    print(f"mdslider: wrote {slides} slides and {images} images to {output}", file=sys.stderr)
+    return output
+
+
+def parse_separators(value):
+    """
+    Parses a comma-separated list of separator names for argparse.
+    """
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SEPARATOR_NAMES]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown separator {', '.join(unknown)} (choose from {', '.join(SEPARATOR_NAMES)})")
+    return frozenset(SEPARATOR_NAMES[name] for name in names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="mdslider", description="Split markdown documents into slides.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    split = commands.add_parser("split", help="split files into slides and print their table of contents")
+    split.add_argument("files", nargs="+", metavar="FILE", help="markdown files to split")
+    split.add_argument("--image-url", help="rewrite local image paths to be served from this URL")
+    split.add_argument("--json", action="store_true", help="write one JSON object per file (JSON Lines)")
+    split.add_argument("--stats", action="store_true", help="write page counts and timings instead of pages")
+    split.add_argument("-j", "--jobs", type=int, default=0, help="worker processes (default: one per CPU)")
+
+    export = commands.add_parser("export", help="write a file as a static HTML presentation")
+    export.add_argument("file", metavar="FILE", help="markdown file to export")
+    export.add_argument("-o", "--output", help="HTML file to write, or - for standard output (default: FILE.html), "
+                                               "or the folder to write with --folder (default: FILE without .md)")
+    export.add_argument("--folder", action="store_true",
+                        help="write index.html and an images folder instead of embedding images in one file")
+    export.add_argument("--images", metavar="DIR", help="directory images are looked up in (default: the file's)")
+    export.add_argument("--title", help="title of the presentation (default: the first slide's)")
+    export.add_argument("-j", "--jobs", type=int, default=0, help="threads reading images (default: one per CPU)")
+
+    for command in (split, export):
+        command.add_argument("--separators", type=parse_separators, default=frozenset({"separator_hr"}),
+                             help=f"comma-separated slide separators: {', '.join(SEPARATOR_NAMES)} (default: hr)")
+        command.add_argument("--page-lines", type=int, default=20,
+                             help="lines per slide for the page_length separator (default: 20)")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        if args.folder and args.output == "-":
+            parser.error("--folder can't be written to standard output")
+        try:
+            export_file(args)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"mdslider: {args.file}: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    failed = False
+    try:
+        for result in split_files(args.files, args.separators, args.page_lines, args.image_url, args.stats, args.jobs):
+            if "error" in result:
+                failed = True
+                print(f"mdslider: {result['file']}: {result['error']}", file=sys.stderr)
+            write_result(result, args, sys.stdout)
+    except BrokenPipeError:
+        # Output piped into e.g. head was closed early
+        sys.stderr.close()
+    return 1 if failed else 0
@@ -0,0 +1,466 @@
+"""
+Split state of a document, updated incrementally as it is edited, and the
+per-session cache of split results.
+"""
+import bisect
+import hashlib
+import itertools
+import sys
+from array import array
+from collections import OrderedDict
+
+from .blocks import (LINE_BLANK, BlockIndex, PageTable, heading_level, line_starts, page_text, resolve_pages, scan_lines,
+                     split_segments)
+from .images import page_image_urls, rewrite_images
+from .metrics import timed
+from .toc import Outline, make_index, remove_decorators
+
+
+def common_prefix_length(a, b, chunk=65536):
+    """
+    Returns the length of the common prefix of two strings, comparing them in chunks.
+    """
+    n = min(len(a), len(b))
+    lo = 0
+    while lo < n:
+        hi = min(lo + chunk, n)
+        if a[lo:hi] != b[lo:hi]:
+            # Narrow down the first difference inside this chunk
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if a[lo:mid] == b[lo:mid]:
+                    lo = mid
+                else:
+                    hi = mid
+            return lo
+        lo = hi
+    return n
+
+
+def common_suffix_length(a, b, limit, chunk=65536):
+    """
+    Returns the length of the common suffix of two strings, up to limit characters.
+    """
+    la, lb = len(a), len(b)
+    lo = 0
+    while lo < limit:
+        hi = min(lo + chunk, limit)
+        if a[la - hi:la - lo] != b[lb - hi:lb - lo]:
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if a[la - mid:la - lo] == b[lb - mid:lb - lo]:
+                    lo = mid
+                else:
+                    hi = mid
+            return lo
+        lo = hi
+    return limit
+
+
+# Source of page ids, unique within the process
+PAGE_IDS = itertools.count()
+
+
+def new_page_ids(n):
+    """
+    Returns n new page ids.
+    """
+    return list(itertools.islice(PAGE_IDS, n))
+
+
+def shift_array(values, delta):
+    """
+    Returns a copy of an offset array with delta added to every value.
+    """
+    return array(values.typecode, [value + delta for value in values]) if delta else values[:]
+
+
+class Deck:
+    """
+    Split state of the loaded document: the source, the processed markdown,
+    its BlockIndex, the pages as a PageTable and the segment starts.
+    Kept in session state so edits can be re-split incrementally.
+    The config is (separators, page_lines, image_server_url, image_fit).
+    Every page has an id that stays the same while edits elsewhere in the
+    document move it around, so per-page results (such as the search index)
+    only need to be worked out again for pages that changed.
+    """
+    __slots__ = ("source", "source_starts", "text", "index", "config", "pages", "segments",
+                 "texts", "labels", "page_ids", "page_numbers", "digest", "section_offsets", "contents", "manifest")
+
+    def __init__(self, source, source_starts, text, index, config, pages, segments):
+        self.source = source
+        self.source_starts = source_starts
+        self.text = text
+        self.index = index
+        self.config = config
+        self.pages = pages
+        self.segments = segments
+        self.texts = [None] * len(pages)
+        # A deck of at most one page shows the whole document as its only page
+        self.labels = [None] * max(1, len(pages))
+        self.page_ids = new_page_ids(len(self.labels))
+        # Image URLs of each page, worked out when first asked for
+        self.manifest = [None] * len(self.labels)
+        self.page_numbers = None
+        self.digest = None
+        self.section_offsets = None
+        self.contents = None
+
+    def key(self):
+        """
+        Returns the split cache key of this deck: the hash of its source plus its split configuration.
+        """
+        if self.digest is None:
+            self.digest = content_hash(self.source)
+        return (self.digest, self.config)
+
+    def size(self):
+        """
+        Estimates the memory used by this deck in bytes, counting the page
+        texts as built.
+        """
+        index = self.index
+        size = sys.getsizeof(self.source) + 2 * sys.getsizeof(self.text)
+        size += (len(index.starts) + len(index.ends)) * index.starts.itemsize + len(index.flags) + len(index.levels)
+        if self.source_starts is not None:
+            size += len(self.source_starts) * self.source_starts.itemsize
+        size += self.pages.size() + 8 * len(self.segments) + 8 * len(self.page_ids)
+        return size
+
+    def page_texts(self):
+        """
+        Returns the markdown of every page, building only pages not built yet.
+        """
+        if len(self.pages) <= 1:
+            return [self.text]
+        texts = self.texts
+        for i, text in enumerate(texts):
+            if text is None:
+                texts[i] = page_text(self.index, self.pages, i)
+        return texts
+
+    def page(self, i):
+        """
+        Returns the markdown of page i, building it from the document only when asked for.
+        """
+        if len(self.pages) <= 1:
+            return self.text[:]
+        text = self.texts[i]
+        return text if text is not None else page_text(self.index, self.pages, i)
+
+    def page_number(self, page_id):
+        """
+        Returns the number of the page with the given id, or None if no page has it.
+        """
+        if self.page_numbers is None:
+            self.page_numbers = {page_id: i for i, page_id in enumerate(self.page_ids)}
+        return self.page_numbers.get(page_id)
+
+    def page_lines(self, i):
+        """
+        Yields the numbers of the lines page i is made of.
+        """
+        starts = self.index.starts
+        for start, end in self.pages.page_spans(i):
+            first = bisect.bisect_left(starts, start)
+            yield from range(first, bisect.bisect_right(starts, end, first))
+
+    def images(self, i):
+        """
+        Returns the URLs of the images on page i (see page_image_urls), so
+        they can be fetched before the page is shown.
+        """
+        manifest = self.manifest
+        if manifest[i] is None:
+            manifest[i] = page_image_urls(self.page(i))
+        return manifest[i]
+
+    def first_line(self, i):
+        """
+        Returns the first non-blank line of page i, stripped, reading only that
+        line and skipping the rest of the page by flags. Returns None for pages
+        that are empty or contain only a separator.
+        """
+        if len(self.pages) <= 1:
+            page = self.page(i).strip()
+            if not page or page in ("---", "----", "-----"):
+                return None
+            return page.split("\n", 1)[0].strip()
+        flags = self.index.flags
+        content = (line for line in self.page_lines(i) if not flags[line] & LINE_BLANK)
+        first = next(content, None)
+        if first is None:
+            return None
+        line = self.index.line(first << 1).strip()
+        if line in ("---", "----", "-----") and next(content, None) is None:
+            return None
+        return line
+
+    def label(self, i):
+        """
+        Returns the index entry of page i (see page_label): its first line
+        without decorators.
+        """
+        labels = self.labels
+        if labels[i] is None:
+            line = self.first_line(i)
+            if line is None:
+                return None
+            labels[i] = remove_decorators(line)
+        return labels[i]
+
+    def sections(self, lines):
+        """
+        Returns the (start, end) offsets of the sections the processed text is
+        rendered in on the One Page tab. Sections hold about the given number
+        of lines and never break code blocks or tables.
+        """
+        if self.section_offsets is None or self.section_offsets[0] != lines:
+            index = self.index
+            chunks = resolve_pages(index, {"separator_page_length"}, lines)
+            starts = [chunks.start(i) for i in range(1, len(chunks))]
+            self.section_offsets = (lines, list(zip([0] + starts, starts + [len(self.text)])))
+        return self.section_offsets[1]
+
+    def toc(self):
+        """
+        Returns the table of contents and the numbers of the valid pages
+        (see make_index); get their markdown with page().
+        """
+        numbers = range(len(self.labels))
+        return make_index(numbers, [self.label(i) for i in numbers])
+
+    def outline(self):
+        """
+        Returns the table of contents as a heading tree (see Outline),
+        worked out once per deck.
+        """
+        if self.contents is None:
+            labels = self.labels
+            numbers, page_ids, titles, levels = [], [], [], []
+            for i in range(len(labels)):
+                line = self.first_line(i)
+                if line is None:
+                    continue
+                if labels[i] is None:
+                    labels[i] = remove_decorators(line)
+                numbers.append(i)
+                page_ids.append(self.page_ids[i])
+                titles.append(labels[i])
+                levels.append(heading_level(line))
+            self.contents = Outline(numbers, page_ids, titles, levels)
+        return self.contents
+
+
+def content_hash(text):
+    """
+    Returns a hash of the document content.
+    """
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+class SplitCache:
+    """
+    LRU cache of split Decks keyed on content hash plus split configuration,
+    bounded by an estimate of the memory they use. One is kept per session,
+    so settings changed in one session never invalidate another's results.
+    It can be backed by a store shared by all sessions (a DiskSplitCache),
+    which build_deck() looks in before splitting and fills after.
+    """
+    __slots__ = ("max_bytes", "entries", "size", "hits", "misses", "store")
+
+    def __init__(self, max_bytes, store=None):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.store = store
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Returns the cached deck for key, or None.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, deck):
+        """
+        Stores a deck, evicting the least recently used ones to stay under the memory cap.
+        """
+        key = deck.key()
+        size = deck.size()
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (deck, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+    def clear(self):
+        """
+        Drops every cached deck.
+        """
+        self.entries.clear()
+        self.size = 0
+
+
+def build_deck(source, config, cache=None, timer=None):
+    """
+    Processes and splits a whole document, or takes it from the split cache
+    or its store. The phases are timed with timer (a RunTimer) if given.
+    """
+    digest = None
+    if cache is not None:
+        with timed(timer, "hash"):
+            digest = content_hash(source)
+        deck = cache.get((digest, config))
+        if deck is not None:
+            return deck
+        if cache.store is not None:
+            with timed(timer, "disk_cache"):
+                deck = cache.store.get(source, digest, config)
+            if deck is not None:
+                cache.put(deck)
+                return deck
+
+    separators, page_lines, image_server_url, image_fit = config
+    with timed(timer, "rewrite_images"):
+        text = rewrite_images(source, image_server_url, image_fit)
+    with timed(timer, "scan"):
+        index = scan_lines(text)
+        source_starts = line_starts(source)
+    if len(source_starts) != len(index):
+        # Lines of the source and the processed text don't line up; edits
+        # to this document are always processed in full.
+        source_starts = None
+    with timed(timer, "split"):
+        pages, segments, _ = split_segments(index, separators, page_lines)
+    deck = Deck(source, source_starts, text, index, config, pages, segments)
+    deck.digest = digest
+    if cache is not None:
+        cache.put(deck)
+        if cache.store is not None:
+            with timed(timer, "disk_cache"):
+                cache.store.put(deck)
+    return deck
+
+
+def update_deck(deck, source, config, cache=None, timer=None):
+    """
+    Brings a Deck up to date with the edited source. Only the changed lines
+    are rewritten and scanned, and only the pages from the last segment start
+    before the edit up to the point where the new pages fall back in step
+    with the old ones are re-split; all other pages are reused.
+    When the split configuration changes, the current deck is kept in the
+    split cache and the new one is looked up there before splitting.
+    The phases are timed with timer (a RunTimer) if given.
+    """
+    if deck is not None and deck.config != config:
+        # Mapped documents (without a source string) are never cached
+        if cache is not None and deck.source is not None:
+            cache.put(deck)
+        deck = None
+    if deck is None or deck.source_starts is None:
+        return build_deck(source, config, cache, timer)
+    old = deck.source
+    if old == source:
+        return deck
+    separators, page_lines, image_server_url, image_fit = config
+
+    # --- Changed line range ---
+    with timed(timer, "diff"):
+        prefix = common_prefix_length(old, source)
+        suffix = common_suffix_length(old, source, min(len(old), len(source)) - prefix)
+    starts = deck.source_starts
+    # Lines before `first` and their line breaks are unchanged, as is the first
+    # character of line `first`; lines from `last` on are unchanged, including
+    # the line break before them.
+    first = max(0, bisect.bisect_left(starts, prefix) - 1)
+    last = bisect.bisect_left(starts, len(old) - suffix + 1)
+    source_delta = len(source) - len(old)
+    region_start = starts[first] if first < len(starts) else len(old)
+    region_end = (starts[last] if last < len(starts) else len(old)) + source_delta
+
+    # --- Rewrite and scan the changed lines only ---
+    index = deck.index
+    with timed(timer, "rewrite_images"):
+        region_text = rewrite_images(source[region_start:region_end], image_server_url, image_fit)
+    with timed(timer, "scan"):
+        region_starts = line_starts(source, region_start, region_end)
+        text_start = index.starts[first] if first < len(index) else len(deck.text)
+        text_end = index.starts[last] if last < len(index) else len(deck.text)
+        text = deck.text[:text_start] + region_text + deck.text[text_end:]
+        region = scan_lines(text, text_start, text_start + len(region_text))
+    if len(region) != len(region_starts):
+        return build_deck(source, config, cache, timer)
+
+    line_delta = len(region) - (last - first)
+    text_delta = len(text) - len(deck.text)
+    with timed(timer, "scan"):
+        source_starts = starts[:first] + region_starts + shift_array(starts[last:], source_delta)
+        index = BlockIndex(
+            text,
+            index.starts[:first] + region.starts + shift_array(index.starts[last:], text_delta),
+            index.ends[:first] + region.ends + shift_array(index.ends[last:], text_delta),
+            index.flags[:first] + region.flags + index.flags[last:],
+            index.levels[:first] + region.levels + index.levels[last:],
+        )
+
+    # --- Re-split from the segment containing the edit ---
+    old_segments = deck.segments
+    # The page break at a segment start can depend on the line itself, so
+    # resume from the last one before the changed lines
+    resume = old_segments[max(0, bisect.bisect_left(old_segments, first) - 1)]
+    old_starts = set(old_segments[bisect.bisect_left(old_segments, last):])
+    changed_end = last + line_delta
+
+    def stop_at(line):
+        return line >= changed_end and line - line_delta in old_starts
+
+    with timed(timer, "split"):
+        pages, segments, stop = split_segments(index, separators, page_lines, resume, stop_at)
+
+    # Pages before the resume point and after the stop point are reused,
+    # found by the offsets they start at in the old text
+    old_pages = deck.pages
+    old_index = deck.index
+    page_numbers = range(len(old_pages))
+
+    def old_offset(line):
+        return old_index.starts[line] if line < len(old_index) else len(deck.text)
+
+    head = bisect.bisect_left(page_numbers, old_offset(resume), key=old_pages.start)
+    if stop < len(index):
+        old_stop = stop - line_delta
+        tail = bisect.bisect_left(page_numbers, old_offset(old_stop), key=old_pages.start)
+        tail_pages = old_pages[tail:].shift(text_delta)
+        tail_segments = [line + line_delta for line in old_segments[bisect.bisect_left(old_segments, old_stop):]]
+    else:
+        tail = len(old_pages)
+        tail_pages = PageTable()
+        tail_segments = []
+
+    updated = Deck(source, source_starts, text, index, config,
+                   old_pages[:head] + pages + tail_pages,
+                   old_segments[:bisect.bisect_left(old_segments, resume)] + segments + tail_segments)
+    # A single page is shown as the whole document, so only multi-page
+    # texts, labels, image manifests and ids carry over
+    if len(old_pages) > 1 and len(updated.pages) > 1:
+        updated.texts = deck.texts[:head] + [None] * len(pages) + deck.texts[tail:]
+        updated.labels = deck.labels[:head] + [None] * len(pages) + deck.labels[tail:]
+        updated.manifest = deck.manifest[:head] + [None] * len(pages) + deck.manifest[tail:]
+        updated.page_ids = deck.page_ids[:head] + updated.page_ids[head:head + len(pages)] + deck.page_ids[tail:]
+    return updated
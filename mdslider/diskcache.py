@@ -0,0 +1,207 @@
+"""
+On-disk cache of split results, shared by all sessions and kept across
+restarts.
+
+Entries don't depend on the image server: the line flags never do (see
+mapped.py) and pages are stored as line numbers rather than offsets, so an
+entry becomes a Deck for any image server URL by rewriting the source and
+finding its line offsets, without scanning or splitting it again.
+"""
+import bisect
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from .blocks import BlockIndex, PageTable, line_bounds, line_starts
+from .deck import Deck
+from .files import DiskLRU
+from .images import rewrite_images
+
+# Arrays are stored in the machine's byte order, which is part of the magic
+MAGIC = b"mdsplit" + sys.byteorder[0].encode()
+# Magic, lines, span line numbers, pages, segments, metadata bytes
+HEADER = struct.Struct("<8sqqqqq")
+
+
+def entry_name(digest, separators, page_lines):
+    """
+    Returns the path of the cache entry of a document, relative to the cache directory.
+    """
+    key = f"{digest}|{','.join(sorted(separators))}|{page_lines}"
+    name = hashlib.blake2b(key.encode("utf-8"), digest_size=20).hexdigest()
+    return os.path.join(name[:2], name + ".split")
+
+
+def deck_summary(deck):
+    """
+    Returns the number of valid pages of a deck and its title, the label of its first valid page.
+    """
+    labels = [deck.label(i) for i in range(len(deck.labels))]
+    valid = [label for label in labels if label is not None]
+    return {"pages": len(valid), "title": valid[0].strip() if valid else None}
+
+
+def deck_entry(deck):
+    """
+    Returns the cache entry of a deck as bytes. Its metadata holds the
+    labels of the pages (see Deck.label) and deck_summary().
+    """
+    index = deck.index
+    starts, ends = index.starts, index.ends
+    lines = array("q", deck.pages.spans)
+    for j in range(0, len(lines), 2):
+        lines[j] = bisect.bisect_left(starts, lines[j])
+        lines[j + 1] = bisect.bisect_left(ends, lines[j + 1])
+    summary = deck_summary(deck)
+    metadata = json.dumps({
+        # Labels of image lines hold the image server URL; they are worked out again when loaded
+        "labels": [label if label is None or "![" not in label else None for label in deck.labels],
+        **summary,
+    }, ensure_ascii=False).encode("utf-8")
+    segments = array("q", deck.segments)
+    return b"".join([
+        HEADER.pack(MAGIC, len(index), len(lines), len(deck.pages), len(segments), len(metadata)),
+        metadata, index.flags, index.levels, lines.tobytes(), deck.pages.bounds.tobytes(),
+        deck.pages.carried, segments.tobytes(),
+    ])
+
+
+def read_metadata(path):
+    """
+    Returns the metadata of a cache entry file (see deck_entry), or None if it can't be read.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) != HEADER.size or header[:8] != MAGIC:
+                return None
+            return json.loads(f.read(HEADER.unpack(header)[5]))
+    except (OSError, ValueError):
+        return None
+
+
+def entry_deck(data, source, digest, config):
+    """
+    Turns a cache entry back into the Deck of source for a split
+    configuration. Returns None if the entry doesn't fit the source.
+    """
+    if len(data) < HEADER.size:
+        return None
+    magic, count, span_count, page_count, segment_count, metadata_size = HEADER.unpack_from(data)
+    if magic != MAGIC or len(data) != HEADER.size + metadata_size + 2 * count + 8 * span_count + \
+            8 * (page_count + 1) + page_count + 8 * segment_count:
+        return None
+    pos = HEADER.size
+    metadata = json.loads(data[pos:pos + metadata_size])
+    pos += metadata_size
+    flags = bytearray(data[pos:pos + count])
+    levels = bytearray(data[pos + count:pos + 2 * count])
+    pos += 2 * count
+    lines = array("q", data[pos:pos + 8 * span_count])
+    pos += 8 * span_count
+    bounds = array("q", data[pos:pos + 8 * (page_count + 1)])
+    pos += 8 * (page_count + 1)
+    carried = bytearray(data[pos:pos + page_count])
+    pos += page_count
+    segments = list(array("q", data[pos:]))
+
+    _, _, image_server_url, image_fit = config
+    text = rewrite_images(source, image_server_url, image_fit)
+    starts, ends = line_bounds(text)
+    if len(starts) != count or (lines and max(lines) >= count):
+        return None
+    source_starts = starts[:] if text == source else line_starts(source)
+    if len(source_starts) != count:
+        source_starts = None
+    spans = array("q", bytes(8 * span_count))
+    spans[0::2] = array("q", map(starts.__getitem__, lines[0::2]))
+    spans[1::2] = array("q", map(ends.__getitem__, lines[1::2]))
+
+    deck = Deck(source, source_starts, text, BlockIndex(text, starts, ends, flags, levels), config,
+                PageTable(spans, bounds, carried), segments)
+    deck.digest = digest
+    if len(metadata["labels"]) == len(deck.labels):
+        deck.labels = metadata["labels"]
+    return deck
+
+
+def write_entry(directory, deck):
+    """
+    Writes the cache entry of a deck into a cache directory. Returns its
+    path and size. Entries are written to a temporary file first, so
+    readers never see a partial one.
+    """
+    separators, page_lines, _, _ = deck.config
+    path = os.path.join(directory, entry_name(deck.key()[0], separators, page_lines))
+    data = deck_entry(deck)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+    return path, len(data)
+
+
+class DiskSplitCache:
+    """
+    Split results on disk (see deck_entry), keyed on content hash plus
+    separators and page length, evicting the least recently used entries
+    once the cache grows past max_bytes. Entries can be written by other
+    processes (see write_entry) and accounted for with added().
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.files = DiskLRU(directory, max_bytes, ".split")
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def path(self, digest, separators, page_lines):
+        return os.path.join(self.directory, entry_name(digest, separators, page_lines))
+
+    def get(self, source, digest, config):
+        """
+        Returns the Deck of source for a split configuration from its cache entry, or None.
+        """
+        separators, page_lines, _, _ = config
+        path = self.path(digest, separators, page_lines)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            data = None
+        deck = entry_deck(data, source, digest, config) if data else None
+        with self.lock:
+            if deck is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.files.touch(path)
+        return deck
+
+    def put(self, deck):
+        """
+        Stores the entry of a deck. Write errors are ignored; the cache is only an optimization.
+        """
+        try:
+            path, size = write_entry(self.directory, deck)
+        except OSError:
+            return
+        self.added(path, size)
+
+    def metadata(self, digest, separators, page_lines):
+        """
+        Returns the metadata of a cached document (see deck_entry), or None if it isn't cached.
+        """
+        return read_metadata(self.path(digest, separators, page_lines))
+
+    def added(self, path, size):
+        """
+        Accounts for an entry written to the cache and evicts old ones past the size limit.
+        """
+        self.files.add(path, size)
@@ -0,0 +1,245 @@
+"""
+Static HTML export of a deck: a presentation that opens in any browser,
+with keyboard navigation and a table of contents.
+
+Slides are rendered and written one at a time, so the output is never
+held in memory. Images are read (and encoded or copied) in a thread pool
+a few at a time ahead of the slides that use them, and each image file is
+stored once however many slides show it: embedded in the HTML file as
+base64 after the first slide using it, or copied into an images folder.
+"""
+import base64
+import html
+import mimetypes
+import os
+import re
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import quote
+
+from .images import IMAGE_LINK_RE, ImageIndex, image_path, image_reference
+from .prerender import static_html
+
+# Image links of embedded images point here until the page script loads them
+EMBEDDED_IMAGE_PREFIX = "#image-"
+
+EXPORT_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+body {{ margin: 0; font-family: "Source Sans Pro", sans-serif; color: #31333f; background: #fff; }}
+nav {{ position: fixed; top: 0; left: 0; bottom: 0; width: 18rem; overflow-y: auto; padding: 1rem;
+       background: #f0f2f6; box-sizing: border-box; font-size: 0.95rem; display: none; }}
+body.toc nav {{ display: block; }}
+body.toc main {{ margin-left: 18rem; }}
+nav a {{ display: block; color: inherit; text-decoration: none; padding: 0.15rem 0; }}
+nav a.current {{ font-weight: bold; }}
+main {{ max-width: 1100px; margin: 0 auto; padding: 2rem 3rem 4rem; font-size: 1.25rem; line-height: 1.6; }}
+main section {{ display: none; }}
+main section.current {{ display: block; }}
+main img {{ max-width: 100%; }}
+main pre {{ background: #f0f2f6; padding: 1rem; overflow-x: auto; }}
+main table {{ border-collapse: collapse; }}
+main th, main td {{ border: 1px solid #d6d6d9; padding: 0.25rem 0.75rem; }}
+footer {{ position: fixed; bottom: 0; right: 0; padding: 0.5rem 1rem; color: #808495; font-size: 0.9rem; }}
+@media print {{ nav, footer {{ display: none !important; }} main section {{ display: block; break-after: page; }} }}
+</style>
+</head>
+<body>
+"""
+
+EXPORT_SCRIPT = """<footer id="status"></footer>
+<script>
+for (const data of document.querySelectorAll("script.image")) {
+  const src = `data:${data.dataset.type};base64,${data.textContent.trim()}`;
+  for (const img of document.querySelectorAll(`img[src="#${data.id}"]`)) img.src = src;
+}
+const slides = document.querySelectorAll("main section");
+const links = document.querySelectorAll("nav a");
+const status = document.getElementById("status");
+let current = -1;
+function show(i) {
+  i = Math.max(0, Math.min(slides.length - 1, i));
+  if (i === current || !slides.length) return;
+  if (current >= 0) { slides[current].classList.remove("current"); links[current].classList.remove("current"); }
+  current = i;
+  slides[i].classList.add("current");
+  links[i].classList.add("current");
+  status.textContent = `${i + 1} / ${slides.length}`;
+  history.replaceState(null, "", `#${i + 1}`);
+  window.scrollTo(0, 0);
+}
+function fromHash() { show((parseInt(location.hash.slice(1), 10) || 1) - 1); }
+document.addEventListener("keydown", (event) => {
+  if (event.altKey || event.ctrlKey || event.metaKey) return;
+  const keys = {ArrowRight: 1, ArrowDown: 1, PageDown: 1, " ": 1, ArrowLeft: -1, ArrowUp: -1, PageUp: -1};
+  if (event.key in keys) show(current + keys[event.key]);
+  else if (event.key === "Home") show(0);
+  else if (event.key === "End") show(slides.length - 1);
+  else if (event.key === "t") document.body.classList.toggle("toc");
+  else return;
+  event.preventDefault();
+});
+links.forEach((link, i) => link.addEventListener("click", (event) => { event.preventDefault(); show(i); }));
+window.addEventListener("hashchange", fromHash);
+fromHash();
+</script>
+</body>
+</html>
+"""
+
+
+def local_image(images, reference):
+    """
+    Returns the file of a local image reference in an ImageIndex, or None
+    for web images and files that don't exist.
+    """
+    if reference.startswith(("http://", "https://", "data:", EMBEDDED_IMAGE_PREFIX)):
+        return None
+    path = image_path(reference)
+    return images.resolve(path) if path != "." else None
+
+
+def page_images(markdown, images):
+    """
+    Yields the files of the local images of a page, in order.
+    """
+    for match in IMAGE_LINK_RE.finditer(markdown):
+        path = local_image(images, image_reference(match))
+        if path is not None:
+            yield path
+
+
+def link_images(markdown, images, urls):
+    """
+    Points the local image links of a page to their exported copies: urls
+    maps image files to the URLs they are stored at.
+    """
+    def replace(match):
+        path = local_image(images, image_reference(match))
+        if path is None:
+            return match.group(0)
+        if match.group("name") is not None:
+            return f"![]({urls[path]})"
+        return f"![{match.group('alt')}]({urls[path]}{match.group('title') or ''})"
+    return IMAGE_LINK_RE.sub(replace, markdown)
+
+
+def embed_image(path):
+    """
+    Returns the MIME type of an image file and its content as base64.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    return mimetypes.guess_type(path)[0] or "application/octet-stream", base64.b64encode(data).decode("ascii")
+
+
+def store_image(item, assets):
+    """
+    Stores image number n, given as (n, file): copied into the assets
+    folder if there is one (returning None), else encoded (see embed_image).
+    """
+    number, path = item
+    if assets is None:
+        return embed_image(path)
+    shutil.copyfile(path, os.path.join(assets, asset_name(number, path)))
+    return None
+
+
+def asset_name(number, path):
+    """
+    Returns the name an image is copied to in the images folder; numbered,
+    so images of the same name from different folders stay apart.
+    """
+    name = re.sub(r"[^\w.-]+", "_", os.path.basename(path))
+    return f"{number}-{name}"
+
+
+def ordered_results(pool, function, items, window):
+    """
+    Yields function(item) for every item, in order, running up to window
+    calls ahead in the pool, so finished results never pile up.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def export_deck(deck, out, image_directory=None, assets=None, title=None, jobs=0):
+    """
+    Writes a deck as a static HTML presentation to out, a text stream. Its
+    slides are the deck's valid pages, numbered and titled as in toc().
+    Local images are looked up in image_directory (as the image server
+    does) and embedded once each, or, with assets set to a folder, copied
+    there once each and linked relative to the HTML file's folder, which
+    holds the assets folder. Images are read in jobs threads (default:
+    one per CPU). Returns the number of slides and images written.
+    """
+    outline = deck.outline()
+    images = ImageIndex(image_directory) if image_directory else None
+    if title is None:
+        title = outline.titles[0].strip() if len(outline) else "Slides"
+
+    # First pass: the images in order of first use, and how many each slide adds
+    files = {}  # image file -> URL it is stored at
+    added = []
+    if images is not None:
+        for number in outline.numbers:
+            count = 0
+            for path in page_images(deck.page(number), images):
+                if path not in files:
+                    if assets is None:
+                        files[path] = f"{EMBEDDED_IMAGE_PREFIX}{len(files) + 1}"
+                    else:
+                        files[path] = f"{quote(os.path.basename(assets))}/{quote(asset_name(len(files) + 1, path))}"
+                    count += 1
+            added.append(count)
+    else:
+        added = [0] * len(outline)
+
+    if assets is not None and files:
+        os.makedirs(assets, exist_ok=True)
+
+    out.write(EXPORT_HEAD.format(title=html.escape(title)))
+    # Table of contents, indented by heading depth
+    out.write("<nav>\n")
+    depths = []
+    for entry, parent in enumerate(outline.parents):
+        depths.append(depths[parent] + 1 if parent != -1 else 0)
+        out.write(f'<a href="#{entry + 1}" style="padding-left: {depths[entry]}rem">'
+                  f'{entry + 1}. {html.escape(outline.titles[entry].strip())}</a>\n')
+    out.write("</nav>\n<main>\n")
+
+    workers = jobs or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        stored = ordered_results(pool, partial(store_image, assets=assets), enumerate(files, 1), workers * 4)
+        image_number = 0
+        for entry, number in enumerate(outline.numbers):
+            markdown = deck.page(number)
+            if images is not None:
+                markdown = link_images(markdown, images, files)
+            out.write(f'<section id="slide-{entry + 1}">\n{static_html(markdown)}</section>\n')
+            for _ in range(added[entry]):
+                result = next(stored)
+                image_number += 1
+                if assets is None:
+                    mime_type, data = result
+                    out.write(f'<script type="text/plain" class="image" id="image-{image_number}" '
+                              f'data-type="{mime_type}">\n')
+                    # Line-wrapped so editors and diff tools cope with the file
+                    for start in range(0, len(data), 76 * 1024):
+                        out.write(data[start:start + 76 * 1024])
+                        out.write("\n")
+                    out.write("</script>\n")
+    out.write("</main>\n")
+    out.write(EXPORT_SCRIPT)
+    return len(outline), len(files)
@@ -0,0 +1,137 @@
+"""
+File helpers: content hashes of files and on-disk caches evicted in least
+recently used order.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def file_hash(path, digest_size=16):
+    """
+    Returns a hash of the file's bytes, read in chunks, or None if it can't
+    be read. With the default size it equals content_hash() of the text
+    the file holds as UTF-8.
+    """
+    digest = hashlib.blake2b(digest_size=digest_size)
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def stat_key(stat):
+    """
+    Returns what identifies a version of a file in its stat: a file with the
+    same key is assumed to have the same content.
+    """
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class FileHashes:
+    """
+    Content hashes of files (see file_hash), read again only when a file's
+    modification time, size or inode changed.
+    """
+    __slots__ = ("hashes",)
+
+    def __init__(self):
+        self.hashes = {}  # path -> (stat_key, hash)
+
+    def get(self, path):
+        """
+        Returns the content hash of a file, or None if it can't be read.
+        """
+        try:
+            key = stat_key(os.stat(path))
+        except OSError:
+            return None
+        cached = self.hashes.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        digest = file_hash(path)
+        self.hashes[path] = (key, digest)
+        return digest
+
+    def set(self, path, digest):
+        """
+        Records the content hash of a file just written.
+        """
+        try:
+            self.hashes[path] = (stat_key(os.stat(path)), digest)
+        except OSError:
+            self.hashes.pop(path, None)
+
+
+class DiskLRU:
+    """
+    The files of an on-disk cache, kept in subdirectories of its directory,
+    in least recently used order. Files past max_bytes are deleted, the
+    least recently used first. Recency is kept in memory only; files on
+    disk start out in the order they were written.
+    """
+
+    def __init__(self, directory, max_bytes, suffix=""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.files = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.load()
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, path):
+        with self.lock:
+            return path in self.files
+
+    def load(self):
+        """
+        Picks up the files already on disk with the cache's suffix, oldest
+        first. Temporary files being written are skipped.
+        """
+        entries = []
+        if os.path.isdir(self.directory):
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.is_file() and entry.name.endswith(self.suffix) and not entry.name.endswith(".tmp"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.path, stat.st_size))
+        with self.lock:
+            for _, path, size in sorted(entries):
+                self.files[path] = size
+                self.size += size
+
+    def touch(self, path):
+        """
+        Marks a file as recently used.
+        """
+        with self.lock:
+            if path in self.files:
+                self.files.move_to_end(path)
+
+    def add(self, path, size):
+        """
+        Accounts for a file written to the cache and deletes the least
+        recently used files past the size limit, always keeping the most
+        recent one.
+        """
+        with self.lock:
+            self.size -= self.files.pop(path, 0)
+            self.files[path] = size
+            self.size += size
+            while self.size > self.max_bytes and len(self.files) > 1:
+                old, old_size = self.files.popitem(last=False)
+                self.size -= old_size
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
@@ -0,0 +1,243 @@
+"""
+Rewriting of image links so local images are served by the image server.
+"""
+import functools
+import html
+import os
+import posixpath
+import re
+import threading
+import time
+from urllib.parse import quote, unquote
+
+# Image links never span lines, so the document can be rewritten line by line.
+# One pass finds both ![[file_name]] links and ![alt](path "title") links
+# whose path is not a web URL. Paths may be written as <path>; titles, in
+# double or single quotes or in parentheses, are kept with their leading space.
+LINE_BREAK_CLASS = r"\n\r\v\f\x1c-\x1e\x85\u2028\u2029"
+IMAGE_TITLE = (rf"[ \t]+(?:\"[^\"{LINE_BREAK_CLASS}]*\"|'[^'{LINE_BREAK_CLASS}]*'"
+               rf"|\([^(){LINE_BREAK_CLASS}]*\))")
+IMAGE_LINK_RE = re.compile(
+    rf"!\[\[(?P<name>[^{LINE_BREAK_CLASS}]*?)\]\]"
+    rf"|!\[(?P<alt>[^{LINE_BREAK_CLASS}]*?)\]\((?!<?https?://)"
+    rf"(?P<path><[^<>{LINE_BREAK_CLASS}]*>|[^{LINE_BREAK_CLASS}]*?)(?P<title>{IMAGE_TITLE})?[ \t]*\)"
+)
+# Looks for images scaled down by the image server, with the rest of their
+# query and their fragment
+SCALED_IMAGE_RE = re.compile(
+    rf"!\[([^{LINE_BREAK_CLASS}]*?)\]\((https?://[^\s)?#]+)\?fit=(\d+x\d+)([&#][^\s)]*)?({IMAGE_TITLE})?\)")
+WEB_URL_RE = re.compile(r"https?://")
+# Images with a web address: served by the image server once rewritten, or from the web
+IMAGE_URL_RE = re.compile(rf"!\[[^{LINE_BREAK_CLASS}]*?\]\((https?://[^\s)]+)(?:{IMAGE_TITLE})?\)")
+
+# Image directories with more files than this are only partly indexed
+MAX_INDEXED_FILES = 100_000
+# Seconds after a scan of an image directory before a missing file triggers another
+INDEX_REFRESH_INTERVAL = 2.0
+
+def rewrite_images(text, image_server_url, fit=None):
+    """
+    Converts ![[file_name]] links to ![](file_name) and, if an image server is
+    running, rewrites local image paths to be served from it, scaled down to
+    fit if given. Both are done in a single pass.
+    """
+    if image_server_url:
+        base_url = image_server_url if image_server_url.endswith('/') else image_server_url + '/'
+        return IMAGE_LINK_RE.sub(lambda m: replace_image_link(m, base_url, fit), text)
+    return IMAGE_LINK_RE.sub(lambda m: m.group(0) if m.group("name") is None else f"![]({m.group('name')})", text)
+
+
+def page_image_urls(markdown):
+    """
+    Returns the web addresses of the images on a page (as rewritten by
+    rewrite_images), each once, in order.
+    """
+    return tuple(dict.fromkeys(IMAGE_URL_RE.findall(markdown)))
+
+
+def preload_hints(urls):
+    """
+    Returns HTML link tags asking the browser to fetch images ahead of showing them.
+    """
+    return "".join(f'<link rel="preload" as="image" href="{html.escape(url)}">' for url in urls)
+
+
+def link_originals(markdown):
+    """
+    Wraps scaled-down images in a link to the original, so clicking an image
+    opens it at full size.
+    """
+    def replace(match):
+        alt, url, fit, rest, title = match.groups()
+        rest = rest or ""
+        original = url + ("?" + rest[1:] if rest.startswith("&") else rest)
+        return f"[![{alt}]({url}?fit={fit}{rest}{title or ''})]({original})"
+    return SCALED_IMAGE_RE.sub(replace, markdown)
+
+
+@functools.lru_cache(maxsize=4096)
+def image_url(base_url, reference, fit=None):
+    """
+    Returns the image server URL of a local image reference. The path is kept
+    relative to the image directory, so images in subfolders and images with
+    the same name in different folders stay apart; paths leading outside it
+    are reduced to the file name, which the server looks up in its index.
+    The reference's query and fragment are kept, after the fit.
+    """
+    path, query, fragment = split_reference(reference)
+    path = image_path(path)
+    url = f"{base_url}{quote(path) if path != '.' else ''}"
+    params = [f"fit={fit}"] if fit else []
+    if query:
+        params.append(quote(query, safe="/:@!$&'*+,;=%"))
+    if params:
+        url += "?" + "&".join(params)
+    if fragment is not None:
+        url += "#" + quote(fragment, safe="/:@!$&'*+,;=%?")
+    return url
+
+
+def split_reference(reference):
+    """
+    Returns the path of a local image reference and its query and fragment,
+    or None for those it doesn't have. As in a URL, '?' and '#' end the
+    path; escaped ones ('%3F', '%23') are part of the file name.
+    """
+    rest, hash_mark, fragment = reference.partition("#")
+    path, question_mark, query = rest.partition("?")
+    return path, query if question_mark else None, fragment if hash_mark else None
+
+
+def image_path(reference):
+    """
+    Returns the '/'-separated path of a local image reference relative to
+    the image directory, without its query and fragment. Paths leading
+    outside it are reduced to the file name.
+    """
+    path = posixpath.normpath(unquote(split_reference(reference)[0]).replace("\\", "/"))
+    if path == ".." or path.startswith("../") or posixpath.isabs(path) or re.match(r"[A-Za-z]:", path):
+        path = posixpath.basename(path)
+    return path
+
+
+def image_reference(match):
+    """
+    Returns the image a match of IMAGE_LINK_RE refers to: the file name of
+    a ![[file_name]] link, or the path of a ![alt](path) link without its
+    angle brackets.
+    """
+    name = match.group("name")
+    if name is not None:
+        return name
+    path = match.group("path")
+    return path[1:-1] if path.startswith("<") else path
+
+
+def replace_image_link(match, base_url, fit=None):
+    """
+    Rewrites a match of IMAGE_LINK_RE to point to the image server at base_url.
+    Used as a callback for re.sub().
+    """
+    name = match.group("name")
+    if name is not None:
+        if WEB_URL_RE.match(name):
+            return f"![]({name})"
+        return f"![]({image_url(base_url, name, fit)})"
+    return f"![{match.group('alt')}]({image_url(base_url, image_reference(match), fit)}{match.group('title') or ''})"
+
+
+class ImageIndex:
+    """
+    Files under an image directory, found with os.scandir and keyed by their
+    path relative to the directory and by file name, so request paths are
+    looked up in O(1). References whose folder doesn't match (such as
+    ![[file_name]] links to a file in a subfolder) are resolved by file
+    name, preferring the shallowest file. The index is built on first use
+    and rebuilt when a lookup misses, at most every INDEX_REFRESH_INTERVAL
+    seconds. Hidden directories are not indexed; their files are only found
+    by their exact path.
+    """
+    __slots__ = ("directory", "paths", "names", "built", "complete", "lock")
+
+    def __init__(self, directory):
+        self.directory = os.path.realpath(directory)
+        self.paths = {}
+        self.names = {}
+        self.built = None
+        self.complete = False
+        self.lock = threading.Lock()
+
+    def contains(self, path):
+        """
+        Returns True if path, with symbolic links resolved, is inside the directory.
+        """
+        return os.path.commonpath([self.directory, os.path.realpath(path)]) == self.directory
+
+    def build(self):
+        """
+        Scans the directory tree and replaces the index. Stops after
+        MAX_INDEXED_FILES files, leaving the index incomplete.
+        """
+        paths = {}
+        names = {}
+        complete = True
+        pending = [("", self.directory)]
+        while pending and complete:
+            prefix, directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.startswith("."):
+                            continue
+                        relative = prefix + entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append((relative + "/", entry.path))
+                        elif entry.is_file(follow_symlinks=False) or (entry.is_symlink() and self.contains(entry.path)):
+                            paths[relative] = entry.path
+                            names.setdefault(entry.name, []).append(relative)
+                            if len(paths) >= MAX_INDEXED_FILES:
+                                complete = False
+                                break
+            except OSError:
+                continue
+        for candidates in names.values():
+            candidates.sort(key=lambda relative: (relative.count("/"), relative))
+        self.paths, self.names, self.complete = paths, names, complete
+        self.built = time.monotonic()
+
+    def find(self, relative):
+        """
+        Looks up a relative path in the index: the file at that path, else a
+        file of the same name whose path ends with it, else the shallowest
+        file of that name. Returns None if there is none.
+        """
+        path = self.paths.get(relative)
+        if path is not None:
+            return path
+        candidates = self.names.get(posixpath.basename(relative))
+        if not candidates:
+            return None
+        suffix = "/" + relative
+        for candidate in candidates:
+            if candidate.endswith(suffix):
+                return self.paths[candidate]
+        return self.paths[candidates[0]]
+
+    def resolve(self, relative):
+        """
+        Returns the file for a '/'-separated path relative to the directory, or None.
+        """
+        with self.lock:
+            if self.built is None:
+                self.build()
+            path = self.find(relative)
+            if (path is None or not os.path.isfile(path)) and time.monotonic() - self.built >= INDEX_REFRESH_INTERVAL:
+                # Files were added, moved or removed since the last scan
+                self.build()
+                path = self.find(relative)
+        if path is None:
+            # Files in hidden directories, or beyond MAX_INDEXED_FILES
+            path = os.path.join(self.directory, *relative.split("/"))
+            if not self.contains(path):
+                return None
+        return path if path is not None and os.path.isfile(path) else None
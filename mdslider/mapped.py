@@ -0,0 +1,182 @@
+"""
+Very large documents read through a memory map.
+
+The file is never loaded as a whole: it is decoded and scanned a chunk at a
+time to build the BlockIndex, whose offsets are byte offsets into the file,
+and the text of a page is only decoded when the page is shown.
+"""
+import codecs
+import mmap
+import os
+import shutil
+import tempfile
+from array import array
+
+from .blocks import LINE_BREAKS, LINE_FENCE, LINE_TABLE, BlockIndex, scan_lines, split_segments
+from .deck import Deck
+from .images import rewrite_images
+
+# Bytes decoded and scanned at a time
+CHUNK_SIZE = 4 * 1024 * 1024
+# Clears the code block and table flags of a line (see bytes.translate)
+PLAIN_FLAGS = bytes(flag & ~(LINE_FENCE | LINE_TABLE) for flag in range(256))
+
+
+class MappedText:
+    """
+    Read-only text of a UTF-8 file mapped into memory. Offsets are byte
+    offsets into the file; slicing decodes only the bytes asked for and
+    rewrites their image links for the image server.
+
+    Given the open file, reads check that it still has the mapped size:
+    touching mapped pages past the end of a file that was truncated or
+    rewritten in place raises SIGBUS, which would kill the process, so
+    bytes are then read from the file instead.
+    """
+    __slots__ = ("map", "file", "image_server_url", "image_fit")
+
+    def __init__(self, map, file=None, image_server_url=None, image_fit=None):
+        self.map = map
+        self.file = file
+        self.image_server_url = image_server_url
+        self.image_fit = image_fit
+
+    def __len__(self):
+        return len(self.map)
+
+    def __getitem__(self, key):
+        # The file was valid UTF-8 when scanned; bytes read after it changed may not be
+        return rewrite_images(self.read(key).decode("utf-8", "replace"), self.image_server_url, self.image_fit)
+
+    def read(self, key):
+        """
+        Returns the bytes of the file in a slice of the mapping.
+        """
+        if self.file is None or os.fstat(self.file.fileno()).st_size == len(self.map):
+            return self.map[key]
+        start, stop, _ = key.indices(len(self.map))
+        return os.pread(self.file.fileno(), max(0, stop - start), start)
+
+    def with_images(self, image_server_url, image_fit):
+        """
+        Returns a view of the same file with image links rewritten for another image server URL or size.
+        """
+        return MappedText(self.map, self.file, image_server_url, image_fit)
+
+
+def line_offsets(text, pos):
+    """
+    Returns the byte offsets of the start and end (before the line break)
+    of every line of text, which starts at byte offset pos of the file.
+    """
+    starts = array("q")
+    ends = array("q")
+    for raw in text.splitlines(True):
+        size = len(raw) if raw.isascii() else len(raw.encode("utf-8"))
+        end = pos + size
+        if raw[-1] in LINE_BREAKS:
+            end -= 2 if raw.endswith("\r\n") else len(raw[-1].encode("utf-8"))
+        starts.append(pos)
+        ends.append(end)
+        pos += size
+    return starts, ends
+
+
+def scan_mapped(text, chunk_size=CHUNK_SIZE):
+    """
+    Builds the BlockIndex of a MappedText, decoding and scanning the file a
+    chunk at a time. Raises UnicodeDecodeError if the file isn't valid UTF-8.
+    """
+    size = len(text)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    starts = array("q")
+    ends = array("q")
+    flags = bytearray()
+    levels = bytearray()
+
+    pos = 0  # Byte offset of the first line not scanned yet
+    carry = ""
+    for offset in range(0, size or 1, chunk_size):
+        final = offset + chunk_size >= size
+        chunk = carry + decoder.decode(text.read(slice(offset, offset + chunk_size)), final)
+        # Scan complete lines only; the rest is carried over to the next chunk.
+        # A line ending in '\r' may continue with '\n' in the next chunk.
+        cut = len(chunk) if final else chunk.rfind("\n") + 1
+        lines, carry = chunk[:cut], chunk[cut:]
+        if not lines:
+            continue
+
+        # Flags come from the text with ![[image]] links converted, as in
+        # the app, and never depend on the image server. The conversion
+        # keeps lines intact, so they line up with the file's lines.
+        region = scan_lines(rewrite_images(lines, None))
+        if lines.isascii() and "![[" not in lines:
+            starts.extend(start + pos for start in region.starts)
+            ends.extend(end + pos for end in region.ends)
+            pos += len(lines)
+        else:
+            line_starts, line_ends = line_offsets(lines, pos)
+            starts += line_starts
+            ends += line_ends
+            pos += len(lines.encode("utf-8"))
+        flags += region.flags
+        levels += region.levels
+
+    return BlockIndex(text, starts, ends, flags, levels)
+
+
+def map_file(path):
+    """
+    Maps a markdown file into memory and returns its BlockIndex.
+    """
+    f = open(path, "rb")
+    # Empty files can't be mapped
+    if not f.seek(0, 2):
+        f.close()
+        return scan_mapped(MappedText(b""))
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # Windows doesn't let mapped files shrink (and has no pread)
+    return scan_mapped(MappedText(data, f if hasattr(os, "pread") else None))
+
+
+def map_stream(stream):
+    """
+    Copies a binary stream (such as an uploaded file) to an anonymous
+    temporary file, maps it into memory and returns its BlockIndex.
+    """
+    with tempfile.TemporaryFile() as f:
+        shutil.copyfileobj(stream, f, 1024 * 1024)
+        f.flush()
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.tell() else b""
+    return scan_mapped(MappedText(data))
+
+
+def mapped_deck(deck, index, config):
+    """
+    Returns the Deck of a mapped document for a split configuration. The
+    scan is shared by every configuration, and pages are reused when only
+    the image server URL or size changed. Mapped documents always have
+    more than one page (unless they have a single line), since a deck's
+    only page is the whole document: if the separators leave one page,
+    pages are split by length too, and if that still leaves one (the file
+    is one code block or table), by length ignoring code blocks and tables.
+    """
+    if deck is not None and deck.index.starts is index.starts and deck.config == config:
+        return deck
+    separators, page_lines, image_server_url, image_fit = config
+    text = index.text.with_images(image_server_url, image_fit)
+    index = BlockIndex(text, index.starts, index.ends, index.flags, index.levels)
+    reuse = deck is not None and deck.index.starts is index.starts and deck.config[:2] == config[:2]
+    if reuse:
+        pages, segments = deck.pages, deck.segments
+    else:
+        pages, segments, _ = split_segments(index, separators, page_lines)
+        if len(pages) <= 1 and len(index) > 1:
+            pages, segments, _ = split_segments(index, separators | {"separator_page_length"}, page_lines)
+        if len(pages) <= 1 and len(index) > 1:
+            plain = BlockIndex(text, index.starts, index.ends, index.flags.translate(PLAIN_FLAGS), index.levels)
+            pages, segments, _ = split_segments(plain, {"separator_page_length"}, min(page_lines, len(index) - 1))
+    updated = Deck(None, None, text, index, config, pages, segments)
+    if reuse:
+        updated.page_ids = deck.page_ids
+    return updated
@@ -0,0 +1,156 @@
+"""
+Timing of the phases of app reruns and counts of cache lookups, exported
+as JSON lines and in the Prometheus text format.
+"""
+import contextlib
+import json
+import threading
+import time
+
+
+class RunTimer:
+    """
+    Phase timings and cache lookups of one rerun of the app. Phases are
+    timed with `with timer.phase(name):`; a phase entered more than once
+    adds up. Caches with hits and misses counters are watched from the
+    start of the run, and the lookups made during it are counted by finish().
+    """
+    __slots__ = ("session", "started", "start", "seconds", "phases", "caches", "watched")
+
+    def __init__(self, session=None):
+        self.session = session
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.phases = {}
+        self.caches = {}
+        self.watched = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def watch(self, name, cache):
+        """
+        Counts the lookups made in a cache (anything with hits and misses) from now until finish().
+        """
+        self.watched[name] = (cache, cache.hits, cache.misses)
+
+    def finish(self):
+        """
+        Stops the timer and counts the cache lookups. Returns the run as a dict (see as_dict).
+        """
+        self.seconds = time.perf_counter() - self.start
+        for name, (cache, hits, misses) in self.watched.items():
+            self.caches[name] = (cache.hits - hits, cache.misses - misses)
+        return self.as_dict()
+
+    def as_dict(self):
+        """
+        Returns the run as a JSON-serializable dict.
+        """
+        return {
+            "time": round(self.started, 3),
+            "session": self.session,
+            "seconds": round(self.seconds or 0.0, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "caches": {name: {"hits": hits, "misses": misses} for name, (hits, misses) in self.caches.items()},
+        }
+
+
+def timed(timer, name):
+    """
+    Returns timer.phase(name), or a context that does nothing if timer is None.
+    """
+    return timer.phase(name) if timer is not None else contextlib.nullcontext()
+
+
+def json_lines(runs):
+    """
+    Returns runs (dicts from RunTimer.finish) as JSON lines.
+    """
+    return "".join(json.dumps(run, ensure_ascii=False) + "\n" for run in runs)
+
+
+def prometheus_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Totals of the runs of all sessions of the process, for the Prometheus
+    endpoint of the image server. With a log path, every run is also
+    appended to that file as a JSON line.
+    """
+    __slots__ = ("runs", "run_seconds", "phases", "caches", "log_path", "lock")
+
+    def __init__(self, log_path=None):
+        self.runs = 0
+        self.run_seconds = 0.0
+        self.phases = {}  # name -> [count, total seconds, max seconds]
+        self.caches = {}  # name -> [hits, misses]
+        self.log_path = log_path
+        self.lock = threading.Lock()
+
+    def record(self, run):
+        """
+        Adds a finished run (a dict from RunTimer.finish) to the totals.
+        """
+        with self.lock:
+            self.runs += 1
+            self.run_seconds += run["seconds"]
+            for name, seconds in run["phases"].items():
+                totals = self.phases.setdefault(name, [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] = max(totals[2], seconds)
+            for name, counts in run["caches"].items():
+                totals = self.caches.setdefault(name, [0, 0])
+                totals[0] += counts["hits"]
+                totals[1] += counts["misses"]
+            if self.log_path:
+                try:
+                    with open(self.log_path, "a", encoding="utf-8") as f:
+                        f.write(json_lines([run]))
+                except OSError:
+                    # A log that can't be written never breaks the app
+                    self.log_path = None
+
+    def prometheus(self):
+        """
+        Returns the totals in the Prometheus text exposition format.
+        """
+        with self.lock:
+            lines = [
+                "# HELP mdslider_runs_total App reruns.",
+                "# TYPE mdslider_runs_total counter",
+                f"mdslider_runs_total {self.runs}",
+                "# HELP mdslider_run_seconds_total Time spent in app reruns.",
+                "# TYPE mdslider_run_seconds_total counter",
+                f"mdslider_run_seconds_total {self.run_seconds:.6f}",
+                "# HELP mdslider_phase_seconds Time spent in each phase of app reruns.",
+                "# TYPE mdslider_phase_seconds summary",
+            ]
+            for name, (count, total, _) in sorted(self.phases.items()):
+                label = prometheus_label(name)
+                lines.append(f'mdslider_phase_seconds_sum{{phase="{label}"}} {total:.6f}')
+                lines.append(f'mdslider_phase_seconds_count{{phase="{label}"}} {count}')
+            lines += [
+                "# HELP mdslider_phase_max_seconds Longest time spent in each phase in one rerun.",
+                "# TYPE mdslider_phase_max_seconds gauge",
+            ]
+            for name, (_, _, longest) in sorted(self.phases.items()):
+                lines.append(f'mdslider_phase_max_seconds{{phase="{prometheus_label(name)}"}} {longest:.6f}')
+            for kind, position in (("hits", 0), ("misses", 1)):
+                lines += [
+                    f"# HELP mdslider_cache_{kind}_total Cache {kind} made during app reruns.",
+                    f"# TYPE mdslider_cache_{kind}_total counter",
+                ]
+                for name, counts in sorted(self.caches.items()):
+                    lines.append(f'mdslider_cache_{kind}_total{{cache="{prometheus_label(name)}"}} {counts[position]}')
+        return "\n".join(lines) + "\n"
+
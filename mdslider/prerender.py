@@ -0,0 +1,161 @@
+"""
+Slides rendered to HTML ahead of time.
+"""
+import functools
+import hashlib
+import html
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Pages using Streamlit's own markdown extensions (math, colored text,
+# emoji shortcodes) are left for Streamlit to render.
+STREAMLIT_MARKDOWN_RE = re.compile(r"\$|:[a-z]+(?:-[a-z]+)*\[|:[a-z0-9_+-]+:")
+# So are pages using GitHub-flavoured markdown that CommonMark renders
+# differently: footnotes, task lists, bare links and e-mail addresses, and
+# single-tilde strikethrough
+GFM_MARKDOWN_RE = re.compile(r"\[\^|^[ \t]*(?:[-*+]|\d+[.)])[ \t]+\[[ xX]\]|(?<![(<\"'=\w])(?:https?://|www\.)"
+                             r"|[\w.+-]@[\w-]+\.\w|(?<!~)~(?!~)", re.MULTILINE)
+# st.markdown parses the HTML as markdown again, where a blank line ends an
+# HTML block (such as one opened by <p>), so HTML with blank lines in it
+# (code blocks, raw HTML) would be mangled
+BLANK_LINE_RE = re.compile(r"\n[ \t]*\n")
+# Line breaks as markdown-it sees them, for the line numbers of its tokens
+NEWLINE_RE = re.compile(r"\r\n?|\n")
+
+
+@functools.cache
+def markdown_parser():
+    """
+    Returns the markdown-it parser, imported on first use so the package
+    loads quickly, or None if markdown-it-py is not installed.
+    """
+    try:
+        from markdown_it import MarkdownIt
+    except ImportError:  # Slides are sent to the browser as markdown
+        return None
+    return MarkdownIt("commonmark", {"html": True}).enable(["table", "strikethrough"])
+
+
+def render_html(markdown):
+    """
+    Converts the markdown of a slide to HTML for st.markdown, or returns it
+    unchanged if it has to be rendered by Streamlit. Top-level headings are
+    kept as markdown, so Streamlit still gives them their anchors.
+    """
+    parser = markdown_parser()
+    if parser is None or STREAMLIT_MARKDOWN_RE.search(markdown) or GFM_MARKDOWN_RE.search(markdown):
+        return markdown
+    env = {}
+    tokens = parser.parse(markdown, env)
+    # Headings in block quotes or lists can't be kept as markdown, and headings
+    # kept as markdown would lose link reference definitions rendered to HTML
+    if env.get("references") or any(token.type == "heading_open" and token.level for token in tokens):
+        return markdown
+    lines = NEWLINE_RE.split(markdown)
+    parts = []
+    start = 0
+    for i, token in enumerate(tokens):
+        if token.type != "heading_open":
+            continue
+        if start < i:
+            parts.append(parser.renderer.render(tokens[start:i], parser.options, env))
+        first, last = token.map
+        parts.append("\n".join(lines[first:last]))
+        start = i + 3  # heading_open, inline, heading_close
+    if start < len(tokens):
+        parts.append(parser.renderer.render(tokens[start:], parser.options, env))
+    if any(BLANK_LINE_RE.search(part) for part in parts):
+        return markdown
+    return "\n\n".join(part.rstrip("\n") for part in parts) + "\n"
+
+
+def static_html(markdown):
+    """
+    Returns the HTML of a slide shown outside Streamlit (audience pages,
+    exports). Unlike render_html, slides using Streamlit's markdown
+    extensions are rendered too, showing those extensions as plain text.
+    """
+    parser = markdown_parser()
+    if parser is None:
+        return f"<pre>{html.escape(markdown)}</pre>"
+    return parser.render(markdown)
+
+
+class HtmlCache:
+    """
+    Slides of a deck rendered to HTML, keyed by a hash of the page markdown.
+    Neighbouring slides are rendered in the background so navigating can
+    display ready-made HTML. Counts hits, misses and render time.
+    """
+    __slots__ = ("max_entries", "entries", "pending", "lock", "hits", "misses", "renders", "render_time")
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.render_time = 0.0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, markdown):
+        """
+        Returns the HTML of a page, waiting for it if it is being rendered in
+        the background and rendering it now if it isn't cached.
+        """
+        key = hashlib.blake2b(markdown.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self.lock:
+            html = self.entries.get(key)
+            if html is not None:
+                self.entries.move_to_end(key)
+            job = self.pending.get(key)
+        if html is None and job is not None:
+            html = job.result()
+        if html is not None:
+            self.hits += 1
+            return html
+        self.misses += 1
+        return self.render(key, markdown)
+
+    def prefetch(self, pages, executor):
+        """
+        Renders pages not cached yet in the background.
+        """
+        for markdown in pages:
+            key = hashlib.blake2b(markdown.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+            with self.lock:
+                if key in self.entries or key in self.pending:
+                    continue
+                self.pending[key] = executor.submit(self.render, key, markdown)
+
+    def render(self, key, markdown):
+        """
+        Renders a page, stores its HTML and records the time taken.
+        """
+        start = time.perf_counter()
+        html = render_html(markdown)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.renders += 1
+            self.render_time += elapsed
+            self.entries[key] = html
+            self.entries.move_to_end(key)
+            self.pending.pop(key, None)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        """
+        Drops every rendered page, e.g. when another document is opened.
+        """
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,206 @@
+"""
+Presentations: the presenter's current slide, pushed to audience pages
+served by the image server as server-sent events. Viewers never run the
+Streamlit script; each slide is rendered once by the presenter's session
+and the same encoded event is written to every viewer.
+"""
+import json
+import secrets
+import threading
+import time
+
+
+# Seconds between keep-alive comments on idle event streams, which also
+# notice viewers that went away
+HEARTBEAT_INTERVAL = 15.0
+# Seconds without word from the presenter's session (see Presentation.touch)
+# after which its presentation is ended, as the session closed or lost its connection
+PRESENTER_TIMEOUT = 60.0
+
+AUDIENCE_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Markdown Slider</title>
+<style>
+body { margin: 0; font-family: "Source Sans Pro", sans-serif; color: #31333f; background: #fff; }
+main { max-width: 1100px; margin: 0 auto; padding: 2rem 3rem 4rem; font-size: 1.25rem; line-height: 1.6; }
+main img { max-width: 100%; }
+main pre { background: #f0f2f6; padding: 1rem; overflow-x: auto; }
+main table { border-collapse: collapse; }
+main th, main td { border: 1px solid #d6d6d9; padding: 0.25rem 0.75rem; }
+footer { position: fixed; bottom: 0; right: 0; padding: 0.5rem 1rem; color: #808495; font-size: 0.9rem; }
+</style>
+</head>
+<body>
+<main id="slide"><p>Waiting for the presenter…</p></main>
+<footer id="status"></footer>
+<script>
+const slide = document.getElementById("slide");
+const status = document.getElementById("status");
+// Images of the neighbouring slides, fetched ahead as blob URLs
+const preloaded = new Map();
+async function preload(urls) {
+  const missing = urls.filter((url) => !preloaded.has(url));
+  for (const url of missing) if (!url.startsWith("/")) new Image().src = url;
+  const local = missing.filter((url) => url.startsWith("/"));
+  if (!local.length) return;
+  try {
+    // One request for all the images served by this server
+    const response = await fetch("/bundle?" + local.map((url) => "src=" + encodeURIComponent(url)).join("&"));
+    for (const [name, file] of await response.formData()) preloaded.set(local[Number(name)], URL.createObjectURL(file));
+  } catch (error) {
+    return;
+  }
+  for (const url of [...preloaded.keys()].slice(0, Math.max(0, preloaded.size - 100))) {
+    URL.revokeObjectURL(preloaded.get(url));
+    preloaded.delete(url);
+  }
+}
+const events = new EventSource(location.pathname.replace(/\\/$/, "") + "/events");
+events.addEventListener("slide", (event) => {
+  const data = JSON.parse(event.data);
+  slide.innerHTML = data.html;
+  for (const img of slide.querySelectorAll("img")) {
+    const url = preloaded.get(img.getAttribute("src"));
+    if (url) img.src = url;
+  }
+  status.textContent = data.total ? `${data.page + 1} / ${data.total}` : "";
+  window.scrollTo(0, 0);
+  preload(data.preload || []);
+});
+events.addEventListener("end", () => {
+  events.close();
+  status.textContent = "The presentation has ended.";
+});
+events.onerror = () => { status.textContent = "Reconnecting…"; };
+</script>
+</body>
+</html>
+"""
+
+
+def server_sent_event(event, data):
+    """
+    Returns an event of an event stream as bytes, with its data as JSON.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+class Presentation:
+    """
+    The slide a presenter is showing. Each change is encoded once as a
+    server-sent event; viewers wait for the next version and write it.
+    """
+    __slots__ = ("room", "page", "total", "html", "preload", "event", "version", "ended", "viewers", "seen",
+                 "condition")
+
+    def __init__(self, room):
+        self.room = room
+        self.page = None
+        self.total = 0
+        self.html = None
+        self.preload = ()
+        self.event = None
+        self.version = 0
+        self.ended = False
+        self.viewers = 0
+        self.seen = time.monotonic()
+        self.condition = threading.Condition()
+
+    def touch(self):
+        """
+        Records that the presenter's session is still there.
+        """
+        self.seen = time.monotonic()
+
+    def stale(self, timeout=PRESENTER_TIMEOUT):
+        """
+        Returns True if the presenter's session hasn't been heard from for timeout seconds.
+        """
+        return time.monotonic() - self.seen > timeout
+
+    def publish(self, page, total, html, preload=()):
+        """
+        Shows a slide to the audience, whose pages fetch the images at the
+        preload URLs (those of the neighbouring slides) ahead of time.
+        Returns False if it is already shown.
+        """
+        preload = tuple(preload)
+        self.touch()
+        with self.condition:
+            if (page, total, html, preload) == (self.page, self.total, self.html, self.preload):
+                return False
+            self.page, self.total, self.html, self.preload = page, total, html, preload
+            self.event = server_sent_event("slide", {"page": page, "total": total, "html": html,
+                                                     "preload": list(preload)})
+            self.version += 1
+            self.condition.notify_all()
+            return True
+
+    def end(self):
+        """
+        Ends the presentation; viewers are told and their streams closed.
+        """
+        with self.condition:
+            self.ended = True
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, version, timeout=None):
+        """
+        Waits until the presentation is past version, or timeout seconds.
+        Returns the current version and its event (None before the first slide).
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version, self.event
+
+
+class PresentationHub:
+    """
+    Presentations of all sessions, under rooms with unguessable names.
+    Presentations whose presenter went away are ended (see end_stale).
+    """
+    __slots__ = ("rooms", "lock")
+
+    def __init__(self):
+        self.rooms = {}
+        self.lock = threading.Lock()
+
+    def get(self, room):
+        """
+        Returns the presentation of a room, or None if there is none or it was stale.
+        """
+        self.end_stale()
+        with self.lock:
+            return self.rooms.get(room)
+
+    def create(self):
+        """
+        Returns a new Presentation in a room of its own.
+        """
+        self.end_stale()
+        with self.lock:
+            room = secrets.token_urlsafe(9)
+            presentation = self.rooms[room] = Presentation(room)
+            return presentation
+
+    def end(self, room):
+        """
+        Ends and removes the presentation of a room, if there is one.
+        """
+        with self.lock:
+            presentation = self.rooms.pop(room, None)
+        if presentation is not None:
+            presentation.end()
+
+    def end_stale(self, timeout=PRESENTER_TIMEOUT):
+        """
+        Ends the presentations whose presenter hasn't been heard from for timeout seconds.
+        """
+        with self.lock:
+            stale = [room for room, presentation in self.rooms.items() if presentation.stale(timeout)]
+        for room in stale:
+            self.end(room)
@@ -0,0 +1,154 @@
+"""
+Full-text search over the pages of a deck.
+"""
+import heapq
+import math
+import re
+from collections import Counter
+
+WORD_RE = re.compile(r"\w+")
+# Link targets and HTML tags (such as rewritten image links) are not searched
+MARKUP_RE = re.compile(r"\]\([^)\n]*\)|<[^>\n]*>")
+# Images and markdown symbols left out of snippets
+SNIPPET_IMAGE_RE = re.compile(r"!\[[^\]\n]*\]\([^)\n]*\)")
+SNIPPET_SYMBOLS_RE = re.compile(r"[\\`*_#>|~\[\]<$]+")
+# BM25 ranking parameters
+K1 = 1.2
+B = 0.75
+
+
+def page_words(text):
+    """
+    Returns the lower-cased words of a page's markdown, leaving out link targets and HTML tags.
+    """
+    return WORD_RE.findall(MARKUP_RE.sub(" ", text).lower())
+
+
+def page_snippet(text, query, width=80):
+    """
+    Returns about width characters of a page's text around the first match
+    of a word of the query, on one line and without markdown symbols.
+    """
+    text = SNIPPET_IMAGE_RE.sub(" ", text)
+    text = " ".join(SNIPPET_SYMBOLS_RE.sub(" ", MARKUP_RE.sub(" ", text)).split())
+    words = sorted(set(page_words(query)), key=len, reverse=True)
+    match = re.search("|".join(map(re.escape, words)), text, re.IGNORECASE) if words else None
+    start = max(0, match.start() - width // 3) if match else 0
+    if start > 0:
+        # Start at a word boundary
+        space = text.find(" ", start, match.start())
+        start = space + 1 if space != -1 else start
+    end = start + width
+    return ("…" if start > 0 else "") + text[start:end].strip() + ("…" if end < len(text) else "")
+
+
+class SearchIndex:
+    """
+    Inverted index of the pages of a deck, ranking matches with BM25.
+    Pages are keyed by their page id (see Deck.page_ids), so after an edit
+    only the pages that changed are indexed again (see update).
+    """
+    __slots__ = ("postings", "page_counts", "lengths", "total_words")
+
+    def __init__(self):
+        self.postings = {}  # word -> {page id: occurrences}
+        self.page_counts = {}  # page id -> Counter of its words
+        self.lengths = {}  # page id -> number of words
+        self.total_words = 0
+
+    def __len__(self):
+        return len(self.page_counts)
+
+    def add(self, page_id, text):
+        """
+        Indexes the text of a page.
+        """
+        counts = Counter(page_words(text))
+        length = sum(counts.values())
+        self.page_counts[page_id] = counts
+        self.lengths[page_id] = length
+        self.total_words += length
+        postings = self.postings
+        for word, count in counts.items():
+            entry = postings.get(word)
+            if entry is None:
+                postings[word] = {page_id: count}
+            else:
+                entry[page_id] = count
+
+    def remove(self, page_id):
+        """
+        Removes a page from the index.
+        """
+        counts = self.page_counts.pop(page_id)
+        self.total_words -= self.lengths.pop(page_id)
+        postings = self.postings
+        for word in counts:
+            entry = postings[word]
+            del entry[page_id]
+            if not entry:
+                del postings[word]
+
+    def clear(self):
+        """
+        Removes every page.
+        """
+        self.postings.clear()
+        self.page_counts.clear()
+        self.lengths.clear()
+        self.total_words = 0
+
+    def update(self, deck):
+        """
+        Brings the index up to date with a deck: pages no longer in it are
+        removed and pages not indexed yet are added. Returns the number of
+        pages indexed.
+        """
+        page_ids = deck.page_ids
+        current = set(page_ids)
+        stale = [page_id for page_id in self.page_counts if page_id not in current]
+        if len(stale) > len(self.page_counts) // 2:
+            # Another document or split configuration; start over
+            self.clear()
+        else:
+            for page_id in stale:
+                self.remove(page_id)
+        added = 0
+        for i, page_id in enumerate(page_ids):
+            if page_id not in self.page_counts:
+                self.add(page_id, deck.page(i))
+                added += 1
+        return added
+
+    def expand(self, word):
+        """
+        Returns the indexed words a query word matches: itself and the longer words it starts.
+        """
+        return [term for term in self.postings if term.startswith(word)]
+
+    def search(self, query, limit=20):
+        """
+        Returns the (page id, score) of the pages matching every word of the
+        query, best matches first.
+        """
+        if not self.page_counts:
+            return []
+        pages = len(self.page_counts)
+        average = self.total_words / pages or 1
+        lengths = self.lengths
+        scores = None
+        for word in dict.fromkeys(page_words(query)):
+            matches = {}
+            for term in self.expand(word):
+                entry = self.postings[term]
+                idf = math.log(1 + (pages - len(entry) + 0.5) / (len(entry) + 0.5))
+                for page_id, count in entry.items():
+                    norm = K1 * (1 - B + B * lengths[page_id] / average)
+                    matches[page_id] = matches.get(page_id, 0.0) + idf * count * (K1 + 1) / (count + norm)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {page_id: score + matches[page_id] for page_id, score in scores.items() if page_id in matches}
+            if not scores:
+                return []
+        return heapq.nlargest(limit, (scores or {}).items(), key=lambda item: item[1])
@@ -0,0 +1,405 @@
+"""
+Threaded HTTP server for local images, shared by all sessions.
+"""
+import email.utils
+import hashlib
+import http.server
+import mimetypes
+import os
+import posixpath
+import secrets
+import threading
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .images import ImageIndex
+from .present import AUDIENCE_PAGE, HEARTBEAT_INTERVAL, PresentationHub
+from .thumbnails import parse_fit
+
+# Images sent in one bundle at most
+MAX_BUNDLE_IMAGES = 32
+
+def parse_byte_range(header, size):
+    """
+    Parses a single 'bytes=start-end' Range header into a (start, end) slice
+    of a file of the given size. Returns None if the header should be ignored
+    (not a single byte range) and raises ValueError if it can't be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else size
+        elif last:
+            start = max(0, size - int(last))
+            end = size
+        else:
+            return None
+    except ValueError:
+        return None
+    end = min(end, size)
+    if start >= end:
+        raise ValueError(header)
+    return start, end
+
+
+class ImageRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves files from the roots of an ImageServer. Responses carry ETag and
+    Last-Modified validators and a long-lived Cache-Control, conditional
+    requests get 304, byte ranges are supported and file bodies are sent
+    with sendfile where the platform allows it. '/metrics' answers with the
+    server's Metrics in the Prometheus text format, if it has any.
+    '/present/<room>' is the audience page of a presentation, which follows
+    the presenter's slides from '/present/<room>/events'. '/bundle' sends
+    several images in one response (see send_bundle).
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_image(head=False)
+
+    def do_HEAD(self):
+        self.send_image(head=True)
+
+    def send_metrics(self, head):
+        body = self.server.image_server.metrics.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def send_audience_page(self, head):
+        body = AUDIENCE_PAGE.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def send_events(self, presentation, head):
+        """
+        Streams the slides of a presentation as server-sent events, starting
+        with the current one, until it ends or the viewer goes away.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        if head:
+            return
+        with presentation.condition:
+            presentation.viewers += 1
+            version, event = presentation.version, presentation.event
+        try:
+            self.wfile.write(b"retry: 1000\n\n")
+            changed = True
+            while not presentation.ended:
+                # A keep-alive comment when nothing changed
+                self.wfile.write(event if changed and event else b":\n\n")
+                self.wfile.flush()
+                if self.server.image_server.httpd is not self.server:
+                    return
+                new_version, event = presentation.wait(version, HEARTBEAT_INTERVAL)
+                changed, version = new_version != version, new_version
+                if not changed:
+                    # Ends this presentation if its presenter went away
+                    self.server.image_server.presentations.end_stale()
+            self.wfile.write(b"event: end\ndata: {}\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with presentation.condition:
+                presentation.viewers -= 1
+
+    def send_bundle(self, query, head):
+        """
+        Sends the images named by the 'src' parameters of the query (paths on
+        this server, with their fit) as one multipart/form-data response,
+        which browsers read with fetch's formData(). Each part is named
+        after the position of its src; images that can't be found are left out.
+        """
+        boundary = secrets.token_hex(16)
+        parts = []
+        try:
+            for position, src in enumerate(parse_qs(query).get("src", [])[:MAX_BUNDLE_IMAGES]):
+                path = self.image_path(src)
+                if path is None:
+                    continue
+                try:
+                    f = open(path, "rb")
+                except OSError:
+                    continue
+                size = os.fstat(f.fileno()).st_size
+                name = posixpath.basename(path).replace('"', "_")
+                header = (f"--{boundary}\r\n"
+                          f'Content-Disposition: form-data; name="{position}"; filename="{name}"\r\n'
+                          f"Content-Type: {mimetypes.guess_type(path)[0] or 'application/octet-stream'}\r\n"
+                          f"Content-Length: {size}\r\n\r\n").encode("utf-8")
+                parts.append((header, f, size))
+            closing = f"--{boundary}--\r\n".encode("ascii")
+
+            self.send_response(200)
+            self.send_header("Content-Type", f"multipart/form-data; boundary={boundary}")
+            self.send_header("Content-Length", str(sum(len(header) + size + 2 for header, _, size in parts) + len(closing)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            if head:
+                return
+            for header, f, size in parts:
+                self.wfile.write(header)
+                if size:
+                    self.connection.sendfile(f, 0, size)
+                self.wfile.write(b"\r\n")
+            self.wfile.write(closing)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            for _, f, _ in parts:
+                f.close()
+
+    def image_path(self, src):
+        """
+        Returns the file to send for an image URL path with an optional fit
+        query, or None if there is none.
+        """
+        url = urlsplit(src)
+        path = self.server.image_server.resolve(url.path)
+        if path is None:
+            return None
+        # Serve the scaled-down variant for slides; the original otherwise
+        fit = parse_qs(url.query).get("fit")
+        if fit:
+            path = self.server.image_server.variant(path, fit[0])
+        return path
+
+    def send_image(self, head):
+        url = urlsplit(self.path)
+        if url.path == "/metrics" and self.server.image_server.metrics is not None:
+            self.send_metrics(head)
+            return
+        if url.path == "/bundle":
+            self.send_bundle(url.query, head)
+            return
+        if url.path.startswith("/present/"):
+            room, _, rest = url.path[len("/present/"):].partition("/")
+            presentation = self.server.image_server.presentations.get(room)
+            if presentation is None or rest not in ("", "events"):
+                self.send_error(404, "No such presentation")
+            elif rest == "events":
+                self.send_events(presentation, head)
+            else:
+                self.send_audience_page(head)
+            return
+        path = self.image_path(self.path)
+        if path is None:
+            self.send_error(404, "File not found")
+            return
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+
+        with f:
+            stat = os.fstat(f.fileno())
+            etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+
+            if self.not_modified(etag, stat.st_mtime):
+                self.send_response(304)
+                self.send_validators(etag, last_modified)
+                self.end_headers()
+                return
+
+            start, end = 0, stat.st_size
+            status = 200
+            range_header = self.headers.get("Range")
+            if range_header and self.headers.get("If-Range", etag) in (etag, last_modified):
+                try:
+                    byte_range = parse_byte_range(range_header, stat.st_size)
+                except ValueError:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{stat.st_size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if byte_range is not None:
+                    start, end = byte_range
+                    status = 206
+
+            self.send_response(status)
+            self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(end - start))
+            self.send_header("Accept-Ranges", "bytes")
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end - 1}/{stat.st_size}")
+            self.send_validators(etag, last_modified)
+            self.end_headers()
+
+            if not head and end > start:
+                try:
+                    self.connection.sendfile(f, start, end - start)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+    def send_validators(self, etag, last_modified):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Cache-Control", f"public, max-age={self.server.image_server.max_age}")
+
+    def not_modified(self, etag, mtime):
+        """
+        Checks the request's If-None-Match / If-Modified-Since headers against the file.
+        """
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+
+class ImageHTTPServer(http.server.ThreadingHTTPServer):
+    """
+    One thread per connection. The listen backlog is large enough for a
+    room full of audience pages connecting at once.
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class ImageServer:
+    """
+    Process-wide threaded HTTP server for local images, shared by all sessions.
+    Each image directory is registered as a root and served under its own
+    URL prefix, so sessions can serve different directories from one port.
+    Scaled-down variants of large images come from a VariantCache. Given
+    Metrics, the server also exports them at '/metrics'. Presentations
+    started by sessions are served to their audience (see present.py).
+    """
+
+    def __init__(self, variants=None, fit=None, max_age=86400, metrics=None):
+        self.variants = variants
+        self.fit = fit
+        self.max_age = max_age
+        self.metrics = metrics
+        self.roots = {}
+        self.users = {}  # root -> users it is registered for (see add_root)
+        self.presentations = PresentationHub()
+        self.httpd = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.httpd is not None
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1] if self.httpd else None
+
+    def start(self):
+        """
+        Starts serving on a free port. Returns False if already running.
+        """
+        with self.lock:
+            if self.httpd is not None:
+                return False
+            httpd = ImageHTTPServer(("", 0), ImageRequestHandler)
+            httpd.image_server = self
+            self.thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+            self.thread.start()
+            self.httpd = httpd
+            return True
+
+    def stop(self):
+        """
+        Stops the server and closes its socket. Registered roots are kept.
+        """
+        with self.lock:
+            httpd, self.httpd = self.httpd, None
+            if httpd is not None:
+                httpd.shutdown()
+                httpd.server_close()
+                self.thread.join()
+                self.thread = None
+            if self.variants is not None:
+                self.variants.shutdown()
+
+    def add_root(self, directory, user=None):
+        """
+        Registers an image directory for a user (such as a session) and returns its root id.
+        """
+        directory = os.path.realpath(directory)
+        root = hashlib.blake2b(directory.encode("utf-8", "surrogateescape"), digest_size=6).hexdigest()
+        with self.lock:
+            if root not in self.roots:
+                self.roots[root] = ImageIndex(directory)
+            self.users.setdefault(root, set()).add(user)
+        return root
+
+    def remove_root(self, root, user=None):
+        """
+        Stops serving a root for a user. The root is unregistered once no
+        user is left, so other sessions serving the same directory keep it.
+        """
+        with self.lock:
+            users = self.users.get(root)
+            if users is None:
+                return
+            users.discard(user)
+            if not users:
+                del self.users[root]
+                self.roots.pop(root, None)
+
+    @property
+    def origin(self):
+        return f"http://localhost:{self.port}"
+
+    def url(self, root):
+        """
+        Returns the base URL of a registered root.
+        """
+        return f"{self.origin}/{root}"
+
+    def resolve(self, url_path):
+        """
+        Maps a request path ('/<root>/<file path>') to a file inside that
+        root, looked up in the root's ImageIndex, or None.
+        """
+        root, _, relative = unquote(url_path).lstrip("/").partition("/")
+        index = self.roots.get(root)
+        if index is None or not relative:
+            return None
+        relative = posixpath.normpath(relative)
+        if relative == ".." or relative.startswith("../") or relative.startswith("/"):
+            relative = posixpath.basename(relative)
+        return index.resolve(relative)
+
+    def variant(self, path, fit):
+        """
+        Returns the file to serve for an image requested at the given fit:
+        its scaled-down variant if one applies, else the image itself.
+        Only the configured fit is made, so clients can't fill the cache.
+        """
+        if self.variants is None or fit != self.fit:
+            return path
+        return self.variants.get(path, parse_fit(fit)) or path
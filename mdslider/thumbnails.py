@@ -0,0 +1,158 @@
+"""
+Downscaled image variants for slides.
+
+Variants are generated in a background process pool and kept in a
+content-addressed on-disk cache, evicting the least recently used files
+once the cache grows past its size limit.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from .files import DiskLRU, file_hash
+
+# Formats a variant is written in, by source format
+VARIANT_FORMATS = {"JPEG": ("JPEG", ".jpg"), "PNG": ("PNG", ".png"), "WEBP": ("WEBP", ".webp")}
+
+
+def parse_fit(spec):
+    """
+    Parses a 'WIDTHxHEIGHT' size into a tuple of ints, or returns None.
+    """
+    width, _, height = (spec or "").lower().partition("x")
+    try:
+        size = (int(width), int(height))
+    except ValueError:
+        return None
+    return size if size[0] > 0 and size[1] > 0 else None
+
+
+def make_variant(path, cache_dir, width, height):
+    """
+    Writes a copy of the image at path scaled down to fit width x height into
+    the cache, named after the hash of the source content and the size.
+    Runs in a worker process. Returns the variant path, or None when the
+    original should be served (already small enough, animated or not a
+    format we scale).
+    """
+    from PIL import Image, ImageOps
+
+    digest = file_hash(path, digest_size=20)
+    if digest is None:
+        return None
+    with Image.open(path) as image:
+        if image.format not in VARIANT_FORMATS or getattr(image, "is_animated", False):
+            return None
+        if image.width <= width and image.height <= height:
+            return None
+        fmt, ext = VARIANT_FORMATS[image.format]
+        variant = os.path.join(cache_dir, digest[:2], f"{digest}-{width}x{height}{ext}")
+        if os.path.exists(variant):
+            return variant
+
+        # Let the JPEG decoder scale down while decoding
+        image.draft("RGB", (width, height))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, height), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(variant), exist_ok=True)
+        temp = f"{variant}.{os.getpid()}.tmp"
+        image.save(temp, fmt, **({"quality": 85} if fmt != "PNG" else {"optimize": True}))
+        os.replace(temp, variant)
+    return variant
+
+
+class VariantCache:
+    """
+    On-disk cache of downscaled image variants, filled by a process pool.
+    Requests for the same source and size while a variant is being made
+    wait for the same job. Variant files are never touched once written,
+    as the image server's validators come from their modification time.
+    """
+
+    def __init__(self, directory, max_bytes, workers=None):
+        self.directory = directory
+        self.workers = workers
+        self.pool = None
+        self.jobs = {}
+        self.files = DiskLRU(directory, max_bytes)
+        # Reentrant: done callbacks of finished jobs run in the submitting thread
+        self.lock = threading.RLock()
+
+    def get(self, path, size, timeout=60):
+        """
+        Returns the variant of the image at path for the given (width, height),
+        making it if needed, or None if the original should be served.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (path, stat.st_mtime_ns, stat.st_size, size)
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None or (job.done() and (job.cancelled() or job.exception() is not None)):
+                try:
+                    job = self.process_pool().submit(make_variant, path, self.directory, *size)
+                except BrokenProcessPool:
+                    # A worker died (e.g. out of memory); later variants go to a new pool
+                    self.pool = None
+                    job = self.process_pool().submit(make_variant, path, self.directory, *size)
+                job.add_done_callback(self.added)
+                self.jobs[key] = job
+        try:
+            variant = job.result(timeout)
+        except TimeoutError:
+            return None
+        except Exception:
+            # Failed or cancelled by shutdown(); the next request makes it again
+            with self.lock:
+                if self.jobs.get(key) is job:
+                    del self.jobs[key]
+            return None
+        if variant is not None:
+            self.files.touch(variant)
+        return variant
+
+    def process_pool(self):
+        """
+        Returns the process pool variants are made in, started on first use.
+        """
+        with self.lock:
+            if self.pool is None:
+                # Workers are spawned rather than forked from the server's threads
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            return self.pool
+
+    def added(self, job):
+        """
+        Accounts for a finished variant and evicts old ones past the size limit.
+        """
+        if job.cancelled() or job.exception() is not None or job.result() is None:
+            return
+        variant = job.result()
+        try:
+            size = os.path.getsize(variant)
+        except OSError:
+            return
+        self.files.add(variant, size)
+        # Jobs for evicted variants have to run again
+        with self.lock:
+            for key, job in list(self.jobs.items()):
+                if job.done() and (job.cancelled() or job.exception() is not None
+                                   or (job.result() and job.result() not in self.files)):
+                    del self.jobs[key]
+
+    def shutdown(self):
+        """
+        Stops the worker processes. Variants being made are cancelled and
+        made again when next requested.
+        """
+        with self.lock:
+            pool, self.pool = self.pool, None
+            self.jobs.clear()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
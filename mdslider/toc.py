@@ -0,0 +1,120 @@
+"""
+Table of contents of a split deck.
+"""
+import re
+
+def remove_decorators(text):
+    """
+    Removes markdown decorators (like #, **) from a line for a cleaner index display.
+    """
+    text = text.lstrip('#')
+    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
+    if text.endswith(':'):
+        text = text[:-1]
+    return text
+
+def page_label(page):
+    """
+    Returns the index entry for a page: its first non-empty line without decorators.
+    Returns None for pages that are empty or contain only separators.
+    """
+    page_content = page.strip()
+    if not page_content or page_content in ['---', '----', '-----']:
+        return None
+    for line in page.split('\n'):
+        if line.strip():
+            return remove_decorators(line.strip())
+    return None
+
+def make_index(pages, labels=None):
+    """
+    Creates a table of contents from the list of pages.
+    The first line of each page is used as the index entry.
+    Skips pages that are empty or contain only separators.
+    Labels already worked out with page_label() can be passed in.
+    """
+    index = []
+    valid_pages = []
+    
+    for i, page in enumerate(pages):
+        label = labels[i] if labels is not None else page_label(page)
+        if label is None:
+            continue
+        index.append(f"{len(valid_pages)+1}. {label}")
+        valid_pages.append(page)
+            
+    return index, valid_pages
+
+
+class Outline:
+    """
+    Table of contents as a heading tree. There is one entry per valid page,
+    in page order, numbered like make_index(); pages starting with a
+    heading (H1-H4) hold the pages after them up to the next heading of the
+    same or a higher level. Entries are found by page id in constant time.
+    """
+    __slots__ = ("numbers", "page_ids", "titles", "levels", "parents", "children", "positions", "folded")
+
+    def __init__(self, numbers, page_ids, titles, levels):
+        self.numbers = numbers  # entry -> page number
+        self.page_ids = page_ids  # entry -> page id
+        self.titles = titles
+        self.levels = levels  # entry -> heading level, 0 for pages not starting with a heading
+        self.parents = []  # entry -> parent entry, -1 at the top
+        self.children = {-1: []}  # entry -> child entries, -1 for the top
+        stack = []
+        for entry, level in enumerate(levels):
+            if level:
+                while stack and levels[stack[-1]] >= level:
+                    stack.pop()
+            parent = stack[-1] if stack else -1
+            self.parents.append(parent)
+            self.children[parent].append(entry)
+            if level:
+                self.children[entry] = []
+                stack.append(entry)
+        self.positions = {page_id: entry for entry, page_id in enumerate(page_ids)}
+        self.folded = None
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def entry(self, page_id):
+        """
+        Returns the entry of the page with the given id, or None if it has none.
+        """
+        return self.positions.get(page_id)
+
+    def ancestors(self, entry):
+        """
+        Returns the entries an entry is nested in, innermost first.
+        """
+        ancestors = []
+        entry = self.parents[entry]
+        while entry != -1:
+            ancestors.append(entry)
+            entry = self.parents[entry]
+        return ancestors
+
+    def visible(self, expanded):
+        """
+        Returns (entry, depth) for the entries shown when only the entries
+        whose page ids are in expanded are expanded, in order.
+        """
+        rows = []
+        stack = [(entry, 0) for entry in reversed(self.children[-1])]
+        while stack:
+            entry, depth = stack.pop()
+            rows.append((entry, depth))
+            if self.page_ids[entry] in expanded:
+                stack.extend((child, depth + 1) for child in reversed(self.children.get(entry, ())))
+        return rows
+
+    def filter(self, query):
+        """
+        Returns the entries whose titles contain query, ignoring case.
+        """
+        if self.folded is None:
+            self.folded = [title.casefold() for title in self.titles]
+        query = query.casefold()
+        return [entry for entry, title in enumerate(self.folded) if query in title]
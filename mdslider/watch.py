@@ -0,0 +1,175 @@
+"""
+Watching the opened file for changes made outside the app.
+"""
+import ctypes
+import os
+import select
+import struct
+import sys
+import threading
+
+from .files import file_hash
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+# The directory is watched, so editors that save by writing a new file and
+# renaming it over the old one are noticed too
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def inotify_watch(directory):
+    """
+    Returns a non-blocking inotify file descriptor watching a directory, or
+    None where inotify is not available.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def event_names(data):
+    """
+    Yields the (mask, file name) of every inotify event in data.
+    """
+    offset = 0
+    while offset + EVENT_HEADER.size <= len(data):
+        _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+        offset += EVENT_HEADER.size
+        yield mask, data[offset:offset + length].rstrip(b"\0")
+        offset += length
+
+
+class FileWatcher:
+    """
+    Watches a file in a background thread, with inotify on Linux and by
+    polling its size and modification time elsewhere. A burst of writes is
+    handled once it has been quiet for `debounce` seconds, and version is
+    only bumped when the content hash of the file changed.
+    """
+
+    def __init__(self, path, debounce=0.3, interval=1.0):
+        self.path = os.path.abspath(path)
+        self.debounce = debounce
+        self.interval = interval
+        self.digest = file_hash(self.path)
+        self.version = 0
+        self.fd = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def uses_inotify(self):
+        return self.fd is not None
+
+    def start(self):
+        """
+        Starts watching. Returns False if already running.
+        """
+        if self.running:
+            return False
+        self.stopped.clear()
+        self.fd = inotify_watch(os.path.dirname(self.path))
+        target = self.watch_inotify if self.fd is not None else self.watch_polling
+        self.thread = threading.Thread(target=target, daemon=True, name="mdslider-watch")
+        self.thread.start()
+        return True
+
+    def stop(self, wait=True):
+        """
+        Stops watching and, unless wait is False, waits for the thread to
+        finish. The thread closes the inotify file descriptor as it exits.
+        """
+        self.stopped.set()
+        if wait and self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def check(self):
+        """
+        Hashes the file and bumps version if its content changed.
+        Returns True if it did.
+        """
+        digest = file_hash(self.path)
+        # A missing file is usually an editor halfway through saving it
+        if digest is None or digest == self.digest:
+            return False
+        self.digest = digest
+        self.version += 1
+        return True
+
+    def read_events(self):
+        """
+        Reads pending inotify events and returns True if any concern the file.
+        """
+        name = os.fsencode(os.path.basename(self.path))
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return relevant
+            if not data:
+                return relevant
+            for mask, event_name in event_names(data):
+                if event_name == name or mask & IN_Q_OVERFLOW:
+                    relevant = True
+
+    def watch_inotify(self):
+        try:
+            # Changes made before the watch was set up
+            self.check()
+            while not self.stopped.is_set():
+                # Wake up now and then to notice stop()
+                ready, _, _ = select.select([self.fd], [], [], self.interval)
+                if not ready or not self.read_events():
+                    continue
+                # Wait for the burst of writes to end
+                while select.select([self.fd], [], [], self.debounce)[0]:
+                    self.read_events()
+                self.check()
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+    def watch_polling(self):
+        def stat():
+            try:
+                result = os.stat(self.path)
+                return (result.st_mtime_ns, result.st_size, result.st_ino)
+            except OSError:
+                return None
+
+        last = stat()
+        # Changes made before the first stat
+        self.check()
+        while not self.stopped.wait(self.interval):
+            current = stat()
+            if current == last:
+                continue
+            # Wait until the file stops changing
+            while not self.stopped.wait(self.debounce):
+                latest = stat()
+                if latest == current:
+                    break
+                current = latest
+            last = current
+            self.check()
@@ -0,0 +1,195 @@
+"""
+Workspaces: every markdown file under a directory, split in the background.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from .deck import build_deck, content_hash
+from .diskcache import deck_summary, entry_name, read_metadata, write_entry
+
+
+def index_file(path, cache_dir, separators, page_lines, max_size):
+    """
+    Splits a markdown file and writes the result to the on-disk split cache
+    in cache_dir (if given), unless it is there already. Runs in worker
+    processes. Returns the file's summary (see deck_summary) with "entry"
+    set to the (path, size) of a new cache entry, or with "error" set.
+    Files of max_size bytes or more are memory-mapped by the app and not split.
+    """
+    try:
+        if os.path.getsize(path) >= max_size:
+            return {"pages": None, "title": None, "large": True}
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return {"error": str(e)}
+
+    digest = content_hash(source)
+    if cache_dir:
+        metadata = read_metadata(os.path.join(cache_dir, entry_name(digest, separators, page_lines)))
+        if metadata is not None:
+            return {"pages": metadata["pages"], "title": metadata["title"]}
+    deck = build_deck(source, (separators, page_lines, None, None))
+    deck.digest = digest
+    result = deck_summary(deck)
+    if cache_dir:
+        try:
+            result["entry"] = write_entry(cache_dir, deck)
+        except OSError:
+            pass
+    return result
+
+
+class Workspace:
+    """
+    The markdown files under a directory, listed with their titles and
+    slide counts. Files are split in a background process pool and the
+    results stored in a DiskSplitCache, so that any of them opens without
+    being split again. Hidden files and directories are skipped.
+
+    Summaries are kept for each split configuration (separators and page
+    length) they were made for, so sessions with different settings share
+    a workspace without re-indexing each other's files.
+    """
+
+    def __init__(self, directory, store=None, max_size=32 * 1024 * 1024, workers=None):
+        self.directory = os.path.realpath(directory)
+        self.store = store
+        self.max_size = max_size
+        self.workers = workers
+        self.pool = None
+        self.files = {}  # config -> {relative path -> summary, or None while it is split}
+        self.stats = {}  # config -> {relative path -> (mtime, size) when it was indexed}
+        self.pending = {}  # config -> files queued and not split yet
+        self.versions = {}  # config -> number bumped when indexing finishes
+        self.lock = threading.Lock()
+
+    def scan(self):
+        """
+        Returns the paths of the markdown files under the directory, relative to it, sorted.
+        """
+        paths = []
+        for root, directories, names in os.walk(self.directory):
+            directories[:] = [name for name in directories if not name.startswith(".")]
+            for name in names:
+                if name.lower().endswith(".md") and not name.startswith("."):
+                    paths.append(os.path.relpath(os.path.join(root, name), self.directory))
+        return sorted(paths)
+
+    def index(self, separators, page_lines):
+        """
+        Lists the files again and splits the new and changed ones for a
+        split configuration in the background. Returns the number of files queued.
+        """
+        config = (frozenset(separators), page_lines)
+        paths = self.scan()
+        queued = []
+        with self.lock:
+            old_files = self.files.get(config, {})
+            stats = self.stats.setdefault(config, {})
+            files = {}
+            for path in paths:
+                try:
+                    stat = os.stat(os.path.join(self.directory, path))
+                except OSError:
+                    continue
+                key = (stat.st_mtime_ns, stat.st_size)
+                files[path] = old_files.get(path)
+                if stats.get(path) != key:
+                    stats[path] = key
+                    files[path] = None
+                    queued.append(path)
+            self.files[config] = files
+            self.pending[config] = self.pending.get(config, 0) + len(queued)
+            self.versions.setdefault(config, 0)
+        if not queued:
+            return 0
+
+        cache_dir = self.store.directory if self.store is not None else None
+        split = partial(index_file, cache_dir=cache_dir, separators=config[0], page_lines=page_lines,
+                        max_size=self.max_size)
+        pool = self.process_pool()
+        for path in queued:
+            try:
+                job = pool.submit(split, os.path.join(self.directory, path))
+            except BrokenProcessPool:
+                # A worker died; later files go to a new pool
+                with self.lock:
+                    self.pool = None
+                pool = self.process_pool()
+                job = pool.submit(split, os.path.join(self.directory, path))
+            job.add_done_callback(partial(self.indexed, path, config))
+        return len(queued)
+
+    def process_pool(self):
+        """
+        Returns the process pool files are split in, started on first use
+        and reused by every index().
+        """
+        with self.lock:
+            if self.pool is None:
+                # Workers are spawned rather than forked from the app's threads
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+            return self.pool
+
+    def indexed(self, path, config, job):
+        """
+        Records the summary of a file split in the background.
+        """
+        try:
+            result = job.result()
+        except Exception as e:
+            result = {"error": str(e)}
+        entry = result.pop("entry", None)
+        if entry is not None and self.store is not None:
+            self.store.added(*entry)
+        with self.lock:
+            files = self.files[config]
+            if path in files:
+                files[path] = result
+            self.pending[config] -= 1
+            if not self.pending[config]:
+                self.versions[config] += 1
+
+    def indexing(self, separators, page_lines):
+        """
+        Returns True while files are being split for a split configuration.
+        """
+        with self.lock:
+            return self.pending.get((frozenset(separators), page_lines), 0) > 0
+
+    def version(self, separators, page_lines):
+        """
+        Returns a number bumped whenever indexing for a split configuration finishes.
+        """
+        with self.lock:
+            return self.versions.get((frozenset(separators), page_lines), 0)
+
+    def progress(self, separators, page_lines):
+        """
+        Returns the number of files indexed for a split configuration and the number of files.
+        """
+        with self.lock:
+            files = self.files.get((frozenset(separators), page_lines), {})
+            return sum(summary is not None for summary in files.values()), len(files)
+
+    def entries(self, separators, page_lines):
+        """
+        Returns (relative path, summary or None) for every file, in order, for a split configuration.
+        """
+        with self.lock:
+            return list(self.files.get((frozenset(separators), page_lines), {}).items())
+
+    def shutdown(self):
+        """
+        Stops the worker processes.
+        """
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -1,30 +1,163 @@
 import streamlit as st
-import re
 import os
+import re
 import sys
-import threading
-import http.server
-import socketserver
-from urllib.parse import quote
+import time
+import uuid
+from urllib.parse import urlsplit
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from mdslider import (PRESENTER_TIMEOUT, SEPARATORS, AutoSaver, DiskSplitCache, FileWatcher, HtmlCache, ImageServer, Metrics, RunTimer,
+                      SearchIndex, SplitCache, VariantCache, Workspace, content_hash, json_lines, link_originals,
+                      map_file, map_stream, mapped_deck, page_snippet, page_words, parse_fit, preload_hints,
+                      static_html, timed, update_deck)
 
 # --- Streamlit Page Configuration ---
 st.set_page_config(page_title="Markdown Slider", page_icon="📄", layout="wide")
 
-def find_free_port():
-    with socketserver.TCPServer(("localhost", 0), None) as s:
-        return s.server_address[1]
+# Memory cap of each session's split cache, in megabytes
+SPLIT_CACHE_MB = int(os.environ.get("MDSLIDER_SPLIT_CACHE_MB", "64"))
+# On-disk cache of the split results of workspace files, shared by all sessions (off if empty), and its
+# size limit, in megabytes. Other documents are never written to it.
+SPLIT_CACHE_DIR = os.environ.get("MDSLIDER_SPLIT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mdslider", "splits"))
+SPLIT_CACHE_DISK_MB = int(os.environ.get("MDSLIDER_SPLIT_CACHE_DISK_MB", "256"))
+# Directory whose markdown files are listed in the sidebar (also given as the command-line argument)
+WORKSPACE = os.environ.get("MDSLIDER_WORKSPACE", "")
+# Files of at least this many megabytes are memory-mapped and shown read-only
+MAP_FILE_MB = float(os.environ.get("MDSLIDER_MAP_FILE_MB", "32"))
+# The One Page tab renders the document in sections of about this many lines,
+# ONE_PAGE_WINDOW sections at a time
+ONE_PAGE_SECTION_LINES = 100
+ONE_PAGE_WINDOW = 10
+# Matching slides listed by the search dialog
+SEARCH_RESULTS = 20
+# Entries of the page index shown at a time
+TOC_PAGE_SIZE = 50
+# Slides on each side of the current one rendered to HTML ahead of time
+PREFETCH_PAGES = int(os.environ.get("MDSLIDER_PREFETCH_PAGES", "2"))
+# Reload a file opened from disk (command line or workspace) when it changes, once
+# writes to it have been quiet for WATCH_DEBOUNCE seconds
+WATCH_FILE = os.environ.get("MDSLIDER_WATCH", "1") != "0"
+WATCH_DEBOUNCE = float(os.environ.get("MDSLIDER_WATCH_DEBOUNCE", "0.3"))
+# Seconds between checks of the file watcher (and between polls without inotify)
+WATCH_INTERVAL = 1.0
+# Save edits in the background, once they have been left alone for AUTOSAVE_DELAY seconds
+AUTOSAVE = os.environ.get("MDSLIDER_AUTOSAVE", "0") != "0"
+AUTOSAVE_DELAY = float(os.environ.get("MDSLIDER_AUTOSAVE_DELAY", "2"))
+
+# Lifetime of images in the browser cache, in seconds
+IMAGE_CACHE_MAX_AGE = int(os.environ.get("MDSLIDER_IMAGE_MAX_AGE", "86400"))
+# Size slides show images at ('WIDTHxHEIGHT'); larger images are scaled down. Empty to disable.
+IMAGE_FIT = os.environ.get("MDSLIDER_IMAGE_FIT", "1920x1080")
+# On-disk cache of scaled-down images and its size limit, in megabytes
+IMAGE_CACHE_DIR = os.environ.get("MDSLIDER_IMAGE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mdslider", "images"))
+IMAGE_CACHE_MB = int(os.environ.get("MDSLIDER_IMAGE_CACHE_MB", "1024"))
+# Host name or address viewers reach this machine at, for the audience link of presentations
+# (default: the host the presenter's browser reached the app at)
+PUBLIC_HOST = os.environ.get("MDSLIDER_PUBLIC_HOST", "")
+
+# Show the timings panel in the sidebar by default
+DEBUG_PANEL = os.environ.get("MDSLIDER_DEBUG", "0") != "0"
+# File every rerun's timings are appended to as a JSON line (off if empty)
+METRICS_LOG = os.environ.get("MDSLIDER_METRICS_LOG", "")
+# Reruns of each session kept for the timings panel and its export
+RUN_HISTORY = 100
+
+
+@st.cache_resource
+def app_metrics():
+    """
+    Returns the rerun timings of all sessions of this process, which the image server exports.
+    """
+    return Metrics(METRICS_LOG or None)
+
+
+@st.cache_resource
+def split_store():
+    """
+    Returns the on-disk split cache shared by all sessions, or None if it is turned off.
+    """
+    if not SPLIT_CACHE_DIR:
+        return None
+    return DiskSplitCache(SPLIT_CACHE_DIR, SPLIT_CACHE_DISK_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def workspace(directory):
+    """
+    Returns the markdown files of a directory, split in the background, shared by all sessions.
+    """
+    return Workspace(directory, split_store(), MAP_FILE_MB * 1024 * 1024)
 
-def start_server(path, port):
-    class Handler(http.server.SimpleHTTPRequestHandler):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, directory=path, **kwargs)
 
-        def translate_path(self, path):
-            # Decode URL-encoded paths
-            return super().translate_path(quote(path))
+@st.cache_resource
+def image_server():
+    """
+    Returns the image server shared by all sessions of this process.
+    """
+    if parse_fit(IMAGE_FIT):
+        return ImageServer(VariantCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MB * 1024 * 1024), IMAGE_FIT,
+                           IMAGE_CACHE_MAX_AGE, app_metrics())
+    return ImageServer(max_age=IMAGE_CACHE_MAX_AGE, metrics=app_metrics())
+
+
+@st.cache_resource
+def render_pool():
+    """
+    Returns the worker threads that render slides ahead of time, shared by all sessions.
+    """
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="mdslider-render")
 
-    with socketserver.TCPServer(("", port), Handler) as httpd:
-        httpd.serve_forever()
+
+def file_watcher(path):
+    """
+    Returns this session's watcher of a file. A session watches one file at
+    a time: the watcher of the file it opened before is stopped.
+    """
+    watcher = st.session_state.file_watcher
+    if watcher is not None and watcher.path == os.path.abspath(path):
+        return watcher
+    stop_file_watcher()
+    watcher = FileWatcher(path, WATCH_DEBOUNCE, WATCH_INTERVAL)
+    watcher.start()
+    st.session_state.file_watcher = watcher
+    return watcher
+
+
+def stop_file_watcher():
+    """
+    Stops this session's file watcher, if any, without waiting for its thread.
+    """
+    if st.session_state.file_watcher is not None:
+        st.session_state.file_watcher.stop(wait=False)
+        st.session_state.file_watcher = None
+
+
+@st.cache_resource
+def autosaver():
+    """
+    Returns the background writer of documents, shared by all sessions.
+    """
+    saver = AutoSaver(AUTOSAVE_DELAY)
+    saver.start()
+    return saver
+
+
+def serve_images(directory):
+    """
+    Serves the images of a directory for this session from the shared image
+    server, starting the server if it isn't running.
+    """
+    server = image_server()
+    started = server.start()
+    root = server.add_root(directory, st.session_state.session_id)
+    if st.session_state.image_root not in (None, root):
+        server.remove_root(st.session_state.image_root, st.session_state.session_id)
+    st.session_state.image_root = root
+    if started:
+        st.toast(f"Image server started on port {server.port}.")
+    else:
+        st.toast(f"Serving images from {directory}.")
 
 def main():
     """
@@ -48,45 +181,62 @@ def main():
     st.session_state.separator_page_length = st.session_state.get("separator_page_length", False)
     # Core content and file info
     st.session_state.markdown_content = st.session_state.get("markdown_content", "")
+    # BlockIndex of a memory-mapped file, used instead of markdown_content
+    st.session_state.mapped_index = st.session_state.get("mapped_index", None)
+    # File opened from disk, watched for changes: the version of
+    # it last loaded and the hash of its content, to detect unsaved edits
+    st.session_state.watch_path = st.session_state.get("watch_path", None)
+    st.session_state.file_watcher = st.session_state.get("file_watcher", None)
+    st.session_state.file_version = st.session_state.get("file_version", 0)
+    st.session_state.loaded_digest = st.session_state.get("loaded_digest", None)
+    st.session_state.reload_on_change = st.session_state.get("reload_on_change", WATCH_FILE)
+    # Autosave, and the text last queued for it
+    st.session_state.autosave = st.session_state.get("autosave", AUTOSAVE)
+    st.session_state.autosave_text = st.session_state.get("autosave_text", None)
     st.session_state.last_uploaded_file_id = st.session_state.get("last_uploaded_file_id", None)
     st.session_state.file_name = st.session_state.get("file_name", None)
     st.session_state.file_save_path = st.session_state.get("file_save_path", os.getcwd())
     st.session_state.image_directory = st.session_state.get("image_directory", os.getcwd())
+    # Workspace directory, and the directory and split settings its files were last indexed for
+    st.session_state.workspace_directory = st.session_state.get("workspace_directory", WORKSPACE)
+    st.session_state.workspace_indexed = st.session_state.get("workspace_indexed", None)
+    st.session_state.workspace_version = st.session_state.get("workspace_version", 0)
+    # Sections of the One Page tab currently rendered
+    st.session_state.one_page_window = st.session_state.get("one_page_window", (0, ONE_PAGE_WINDOW))
+    # Split results of this session, keyed on content and split configuration
+    if 'split_cache' not in st.session_state:
+        st.session_state.split_cache = SplitCache(SPLIT_CACHE_MB * 1024 * 1024)
+    # Slides of the current document rendered to HTML
+    if 'html_cache' not in st.session_state:
+        st.session_state.html_cache = HtmlCache()
+    # Full-text index of the current deck's slides, updated as it is edited
+    if 'search_index' not in st.session_state:
+        st.session_state.search_index = SearchIndex()
+    # Timings of this session's last reruns, for the timings panel
+    if 'run_history' not in st.session_state:
+        st.session_state.run_history = deque(maxlen=RUN_HISTORY)
+    st.session_state.debug_panel = st.session_state.get("debug_panel", DEBUG_PANEL)
+    # Presenting to an audience, and the room of this session's presentation on the image server
+    st.session_state.presenting = st.session_state.get("presenting", False)
+    st.session_state.presentation_room = st.session_state.get("presentation_room", None)
+    timer = run_timer()
+    if timer is not None:
+        timer.watch("split", st.session_state.split_cache)
+        timer.watch("html", st.session_state.html_cache)
 
     # --- Server Management ---
-    if 'server_thread' not in st.session_state:
-        st.session_state.server_thread = None
-    if 'server_port' not in st.session_state:
-        st.session_state.server_port = None
+    # Root of this session's image directory on the shared image server
+    if 'image_root' not in st.session_state:
+        st.session_state.image_root = None
 
     # --- Load file from command line argument ---
     if 'cli_file_loaded' not in st.session_state:
         if len(sys.argv) > 1:
             file_path = sys.argv[1]
             if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        st.session_state.markdown_content = f.read()
-                    st.session_state.file_name = os.path.basename(file_path)
-                    st.session_state.last_uploaded_file_id = file_path
-                    file_dir = os.path.dirname(file_path)
-                    if file_dir:
-                        st.session_state.file_save_path = file_dir
-                        st.session_state.image_directory = file_dir
-
-                    # Start image server automatically
-                    if os.path.isdir(st.session_state.image_directory):
-                        if st.session_state.server_thread is None:
-                            port = find_free_port()
-                            st.session_state.server_port = port
-                            thread = threading.Thread(target=start_server, args=(st.session_state.image_directory, port), daemon=True)
-                            thread.start()
-                            st.session_state.server_thread = thread
-                            st.toast(f"Image server started on port {port}.")
-                    
-                    resplit()
-                except Exception as e:
-                    st.error(f"Error loading file: {e}")
+                open_file(file_path)
+            elif os.path.isdir(file_path):
+                st.session_state.workspace_directory = file_path
             else:
                 st.warning(f"File not found: {file_path}")
         st.session_state.cli_file_loaded = True
@@ -98,10 +248,21 @@ def main():
         # Button to create a new, empty file
         if st.button("New File", use_container_width=True):
             st.session_state.markdown_content = ""
+            st.session_state.autosave_text = ""
+            st.session_state.mapped_index = None
             st.session_state.last_uploaded_file_id = "new_file"
             st.session_state.file_name = "untitled.md"
+            st.session_state.html_cache.clear()
             resplit()
 
+        # Markdown files of the workspace directory
+        st.text_input("Workspace Directory", key="workspace_directory")
+        if st.session_state.workspace_directory:
+            if os.path.isdir(st.session_state.workspace_directory):
+                show_workspace(workspace(os.path.abspath(st.session_state.workspace_directory)))
+            else:
+                st.error("The workspace directory does not exist.")
+
         # File uploader for markdown files
         uploaded_md_file = st.file_uploader(
             "Open Markdown file",
@@ -112,23 +273,38 @@ def main():
         if uploaded_md_file:
             # Check if a new file has been uploaded
             if st.session_state.get('last_uploaded_file_id') != uploaded_md_file.file_id:
-                st.session_state.markdown_content = uploaded_md_file.getvalue().decode("utf-8")
+                if uploaded_md_file.size >= MAP_FILE_MB * 1024 * 1024:
+                    open_mapped(map_stream(uploaded_md_file))
+                else:
+                    with timed(run_timer(), "read_file"):
+                        st.session_state.markdown_content = uploaded_md_file.getvalue().decode("utf-8")
+                    st.session_state.autosave_text = st.session_state.markdown_content
+                    st.session_state.mapped_index = None
                 st.session_state.last_uploaded_file_id = uploaded_md_file.file_id
                 st.session_state.file_name = uploaded_md_file.name
+                st.session_state.html_cache.clear()
                 resplit()
     
         # File operations (Save) appear only if a file is loaded or new
         if st.session_state.last_uploaded_file_id:
             st.text_input("Filename", key="file_name")
-            if st.button("Save File", use_container_width=True):
+            # Mapped files can't be edited, so there is nothing to save
+            if st.button("Save File", use_container_width=True, disabled=st.session_state.mapped_index is not None):
                 try:
-                    save_path = os.path.join(st.session_state.file_save_path, st.session_state.file_name)
+                    save_path = document_path()
                     os.makedirs(st.session_state.file_save_path, exist_ok=True)
-                    with open(save_path, "w", encoding="utf-8") as f:
-                        f.write(st.session_state.markdown_content)
+                    # Written atomically, replacing any autosave still pending
+                    autosaver().save(save_path, st.session_state.markdown_content)
+                    st.session_state.autosave_text = st.session_state.markdown_content
+                    if os.path.abspath(save_path) == st.session_state.watch_path:
+                        st.session_state.loaded_digest = content_hash(st.session_state.markdown_content)
                     st.success(f"Saved to {save_path}")
                 except Exception as e:
                     st.error(f"Failed to save file: {e}")
+            st.checkbox("Autosave", key="autosave", disabled=st.session_state.mapped_index is not None)
+            if st.session_state.autosave and st.session_state.mapped_index is None:
+                autosave(document_path(), st.session_state.markdown_content)
+                show_autosave_status(document_path())
     
         # Input for setting the file save path
         st.text_input(
@@ -142,48 +318,75 @@ def main():
             key="image_directory"
         )
 
-        if st.button("Start/Restart Image Server"):
-            if os.path.isdir(st.session_state.image_directory):
-                if st.session_state.server_thread is None:
-                    port = find_free_port()
-                    st.session_state.server_port = port
-                    thread = threading.Thread(target=start_server, args=(st.session_state.image_directory, port), daemon=True)
-                    thread.start()
-                    st.session_state.server_thread = thread
-                    st.toast(f"Image server started on port {port}.")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Start/Restart Image Server"):
+                if os.path.isdir(st.session_state.image_directory):
+                    serve_images(st.session_state.image_directory)
                 else:
-                    st.warning("Server is already running. Restart the app to change the directory.")
-            else:
-                st.error("The specified directory does not exist.")
-
-    image_server_url = f"http://localhost:{st.session_state.server_port}" if st.session_state.server_port else None
+                    st.error("The specified directory does not exist.")
+        with col2:
+            # The server is shared by all sessions: only this session's images stop being served
+            if st.button("Stop Image Server", disabled=st.session_state.image_root is None):
+                image_server().remove_root(st.session_state.image_root, st.session_state.session_id)
+                st.session_state.image_root = None
+                st.toast("Stopped serving images for this session.")
+
+        if watching_file() is not None:
+            st.checkbox("Reload on change", key="reload_on_change")
+
+        st.checkbox("Show timings", key="debug_panel")
+
+        st.checkbox("Present", key="presenting", help="Show the current slide to an audience in their browsers")
+        if st.session_state.presenting:
+            show_presentation()
+        elif st.session_state.presentation_room is not None:
+            image_server().presentations.end(st.session_state.presentation_room)
+            st.session_state.presentation_room = None
+
+    # --- Reload the file opened from disk when it changes ---
+    if watching_file() is not None and st.session_state.reload_on_change:
+        watcher = file_watcher(watching_file())
+        if watcher.version != st.session_state.file_version:
+            reload_file(watcher)
+        check_file_watcher(watcher)
+    elif watching_file() is None:
+        # Another document replaced the file
+        stop_file_watcher()
+
+    server = image_server()
+    image_server_url = server.url(st.session_state.image_root) if server.running and st.session_state.image_root else None
 
     # --- Main Content Area ---
     if st.session_state.last_uploaded_file_id:
-        # First convert ![[file_name]] format to ![](file_name)
-        processed_markdown = re.sub(r'!\[\[(.*?)\]\]', r'![](\1)', st.session_state.markdown_content)
-        
-        # Then process local image paths to be served from the specified URL
-        # Regex looks for ![alt](path) where path is not a web URL
-        if image_server_url:
-            processed_markdown = re.sub(r"!\[(.*?)\]\(((?!https?://).*?)\)", lambda m: replace_image_path(m, image_server_url), processed_markdown)
-    
-        # Main display tabs
-        tab1, tab2, tab3 = st.tabs(["Source", "One Page", "Slides"])
+        # Main display tabs; only the selected tab is rendered
+        tab1, tab2, tab3 = st.tabs(["Source", "One Page", "Slides"], key="view", on_change="rerun")
 
 
         # Tab 1: Raw Markdown Editor
         with tab1:
-            st.text_area("Edit", key="markdown_content", height=600, label_visibility="collapsed")
+            if tab1.open:
+                if st.session_state.mapped_index is not None:
+                    size = len(st.session_state.mapped_index.text) / (1024 * 1024)
+                    st.info(f"This file is {size:.0f} MB, so it is shown read-only and is not loaded into the editor.")
+                else:
+                    st.text_area("Edit", key="markdown_content", height=600, label_visibility="collapsed")
     
-        # Tab 2: Rendered view of the entire markdown file
+        # Tab 2: Rendered view of the entire markdown file, a window of sections at a time
         with tab2:
-            st.markdown(processed_markdown, unsafe_allow_html=True)
+            if tab2.open:
+                deck = load_deck(image_server_url)
+                with timed(run_timer(), "one_page"):
+                    show_one_page(deck)
     
         # Tab 3: Slideshow view
         with tab3:
-            all_pages = split_content(processed_markdown)
-            index, pages = make_index(all_pages)  # Now returns both index and valid pages
+            if not tab3.open:
+                return
+            deck = load_deck(image_server_url)
+            with timed(run_timer(), "toc"):
+                outline = deck.outline()  # One entry per valid page, as a heading tree
+                pages = outline.numbers
             
             if not pages:  # Check if there are any valid pages
                 st.warning("No valid content pages found.")
@@ -194,10 +397,10 @@ def main():
             
             # Ensure current_page is within valid range
             if st.session_state.current_page >= len(pages):
-                st.session_state.current_page = 0
+                st.session_state.current_page = len(pages) - 1
                 
             # --- Slide Navigation Controls ---
-            col1, col2, col3, col4, col5 = st.columns([1, 1, 8, 1, 1])
+            col1, col2, col3, col4, col5, col6 = st.columns([1, 1, 7, 1, 1, 1])
     
             with col1: # Previous button
                 if st.button("◀", use_container_width=True):
@@ -218,9 +421,14 @@ def main():
     
             with col4: # Jump to page (index) button
                 if st.button("📌", use_container_width=True):
-                    show_index(index)
+                    open_index(outline)
+                    show_index(outline)
     
-            with col5: # Splitting options popover
+            with col5: # Search button; the text of mapped files is not indexed
+                if st.button("🔍", use_container_width=True, disabled=st.session_state.mapped_index is not None):
+                    show_search(deck)
+    
+            with col6: # Splitting options popover
                 with st.popover("✂️"):
                     st.checkbox(r"\---", key="separator_hr", on_change=resplit)
                     st.checkbox(r"\#", key="separator_h1", on_change=resplit)
@@ -240,163 +448,346 @@ def main():
                                 on_change=update_slider,
                                 label_visibility="collapsed")
     
-            # Display the content of the current slide
-            slide_content = pages[st.session_state.current_page]
-            placeholder.markdown(slide_content, unsafe_allow_html=True)
+            # Display the content of the current slide, pre-rendered to HTML,
+            # then render the neighbouring slides in the background
+            html_cache = st.session_state.html_cache
+            with timed(run_timer(), "render"):
+                slide_content = link_originals(deck.page(pages[st.session_state.current_page]))
+                slide_html = html_cache.get(slide_content)
+                placeholder.markdown(slide_html, unsafe_allow_html=True)
+            # Have the browser fetch the images of the previous and next slides
+            with timed(run_timer(), "preload"):
+                preload = neighbour_images(deck, pages, st.session_state.current_page)
+                if preload:
+                    st.markdown(preload_hints(preload), unsafe_allow_html=True)
+            if st.session_state.presenting:
+                with timed(run_timer(), "present"):
+                    present_slide(slide_content, len(pages), preload)
+            with timed(run_timer(), "prefetch"):
+                neighbours = [pages[(st.session_state.current_page + offset) % len(pages)]
+                              for offset in range(-PREFETCH_PAGES, PREFETCH_PAGES + 1) if offset]
+                html_cache.prefetch([link_originals(deck.page(page)) for page in neighbours], render_pool())
+
+
+def neighbour_images(deck, pages, current):
+    """
+    Returns the image URLs of the slides before and after the current one
+    that the current slide doesn't show itself.
+    """
+    shown = set(deck.images(pages[current]))
+    urls = {}
+    for offset in (1, -1):
+        for url in deck.images(pages[(current + offset) % len(pages)]):
+            if url not in shown:
+                urls[url] = None
+    return list(urls)
+
+def audience_origin():
+    """
+    Returns the origin of the image server as seen by the audience: on
+    PUBLIC_HOST if set, else on the host the presenter's browser reached
+    the app at, so the link works on other machines unless that was localhost.
+    """
+    host = PUBLIC_HOST or urlsplit("//" + (st.context.headers.get("Host") or "")).hostname or "localhost"
+    if ":" in host:  # IPv6 address
+        host = f"[{host}]"
+    return f"http://{host}:{image_server().port}"
 
+def current_presentation():
+    """
+    Returns this session's presentation, starting it (and the image server,
+    which serves it to the audience) if needed.
+    """
+    server = image_server()
+    if server.start():
+        st.toast(f"Image server started on port {server.port}.")
+    presentation = None
+    if st.session_state.presentation_room is not None:
+        presentation = server.presentations.get(st.session_state.presentation_room)
+    if presentation is None:
+        presentation = server.presentations.create()
+        st.session_state.presentation_room = presentation.room
+    return presentation
+
+@st.fragment(run_every=PRESENTER_TIMEOUT / 4)
+def show_presentation():
+    """
+    Shows the audience link of this session's presentation and how many
+    are watching. Rerunning every so often while the session is connected
+    keeps the presentation from being ended as stale.
+    """
+    presentation = current_presentation()
+    presentation.touch()
+    audience_url = f"{audience_origin()}/present/{presentation.room}"
+    st.caption(f"Audience: [{audience_url}]({audience_url}) · {presentation.viewers} watching")
 
-def split_by_regex(regex: str, text: str) -> list[str]:
+def present_slide(markdown, total, preload=()):
     """
-    Splits a text by a given regex pattern, avoiding splits inside code blocks or tables.
-    If splitting by horizontal rule ('---'), excludes the separator from the output.
+    Shows the current slide to the audience of this session's presentation,
+    whose pages fetch the images at the preload URLs ahead of time.
     """
-    parts = []
-    current_part = ""
-    in_code_block = False
-    in_table = False
-    table_content = ""
-    
-    for line in text.splitlines():
-        # Toggle code block state
-        if line.strip().startswith('```'):
-            in_code_block = not in_code_block
-        
-        # Detect table content to treat it as a single block
-        if line.strip().startswith('|') or line.strip().startswith('+-'):
-            if not in_table:
-                in_table = True
-            table_content += line + "\n"
-            continue  # Skip adding table line to current_part
-        elif in_table and not line.strip():
-            in_table = False
-            current_part += table_content  # Add complete table at once
-            table_content = ""
-            continue  # Skip adding empty line after table
-        
-        # Skip if still collecting table content
-        if in_table:
-            table_content += line + "\n"
-            continue
-        
-        # Split if the line matches the regex and is not inside a code block
-        if re.match(regex, line) and not in_code_block:
-            if current_part:
-                parts.append(current_part)
-                current_part = ""
-            # Only add the separator line if it's not a horizontal rule
-            if not re.match(r'---\s*$', line):
-                current_part += line + "\n"
-        else:
-            current_part += line + "\n"
-    
-    # Add any remaining table content
-    if table_content:
-        current_part += table_content
-    
-    # Add the last remaining part
-    if current_part:
-        parts.append(current_part)
-    
-    return parts
+    # Pre-rendered slides may keep markdown for Streamlit, which the audience page can't render
+    html = static_html(markdown)
+    # Audience pages are served by the image server, so its links can be relative
+    origin = image_server().origin + "/"
+    html = html.replace(origin, "/")
+    preload = ["/" + url[len(origin):] if url.startswith(origin) else url for url in preload]
+    current_presentation().publish(st.session_state.current_page, total, html, preload)
 
-def split_by_lines(num: int, text: str) -> list[str]:
+def resplit():
     """
-    Splits a text into chunks of a specified number of lines.
-    Avoids splitting within code blocks, tables, or right before a heading.
+    Callback function to reset the page when the document or splitting options change.
     """
-    parts = []
-    lines = text.splitlines()
-    
-    current_chunk = []
-    in_table = False
-    in_code_block = False
-    chunk_line_count = 0
-    
-    for line in lines:
-        # Toggle code block state
-        if line.strip().startswith('```'):
-            in_code_block = not in_code_block
-        
-        # Detect table content
-        if line.strip().startswith('|') or line.strip().startswith('+-'):
-            in_table = True
-        elif in_table and not line.strip():
-            in_table = False
-        
-        current_chunk.append(line)
-        chunk_line_count += 1
-        
-        # Split if line limit is reached and not inside a special block
-        if chunk_line_count >= num and not in_table and not in_code_block:
-            chunk_text = '\n'.join(current_chunk) + '\n'
-            
-            # If the last line is a heading, split before it to keep it with its content
-            if is_markdown_heading(current_chunk[-1]):
-                split_chunks = split_at_last_heading(chunk_text)
-                parts.extend(split_chunks[:-1])
-                current_chunk = [split_chunks[-1].strip()]
-            else:
-                parts.append(chunk_text)
-                current_chunk = []
-            
-            chunk_line_count = len(current_chunk)
-    
-    # Add any remaining lines as the last part
-    if current_chunk:
-        parts.append('\n'.join(current_chunk) + '\n')
-    
-    return parts
+    st.session_state.current_page = 0
+    st.session_state.one_page_window = (0, ONE_PAGE_WINDOW)
 
-def split_after_image(text: str) -> list[str]:
+def selected_separators():
     """
-    Splits the text into pages immediately after each image.
+    Returns the separators selected in the splitting options.
     """
-    parts = []
-    current_part = ""
-    for line in text.splitlines():
-        current_part += line + "\n"
-        # Split after a line containing markdown image syntax
-        if re.match(r"!\[.*\]\(.*\)", line.strip()):
-            parts.append(current_part)
-            current_part = ""
-    # Add any remaining content
-    if current_part:
-        parts.append(current_part)
-    return parts
+    return frozenset(key for key in SEPARATORS if st.session_state.get(key, False))
 
-@st.cache_data
-def split_content(text):
+def document_path():
     """
-    Splits the markdown text into a list of pages based on selected criteria.
-    Uses caching to improve performance.
+    Returns the path the current document is saved to.
     """
-    parts = [text]
-    
-    # Dictionary mapping session state keys to splitting functions
-    split_conditions = {
-        "separator_page_length": (lambda x: split_by_lines(st.session_state.page_lines, x)),
-        "separator_hr": (lambda x: split_by_regex(r'---\s*$', x)),
-        "separator_h1": (lambda x: split_by_regex(r'^# .*$', x)),
-        "separator_h2": (lambda x: split_by_regex(r'^## .*$', x)),
-        "separator_h3": (lambda x: split_by_regex(r'^### .*$', x)),
-        "separator_bold": (lambda x: split_by_regex(r'^\*\*(.*?)\*\*$', x)),
-        "separator_after_image": (split_after_image)
-    }
-    
-    # Apply each selected splitting function sequentially
-    for separator, split_func in split_conditions.items():
-        if st.session_state.get(separator, False):
-            # Flatten the list of parts after each split
-            parts = [part for page in parts for part in split_func(page)]
-    
-    return parts if len(parts) > 1 else [text]
+    return os.path.join(st.session_state.file_save_path, st.session_state.file_name)
 
-def resplit():
+def autosave(path, text):
     """
-    Callback function to reset the page and clear caches when splitting options change.
+    Queues the document for the background writer if it was edited since
+    it was loaded or last queued.
     """
-    st.session_state.current_page = 0
-    split_content.clear()
+    if text == st.session_state.autosave_text:
+        return
+    st.session_state.autosave_text = text
+    autosaver().submit(path, text)
+
+@st.fragment(run_every=WATCH_INTERVAL)
+def show_autosave_status(path):
+    """
+    Shows when the document was last autosaved, or why it couldn't be.
+    """
+    saver = autosaver()
+    saved, error = saver.status(path)
+    if error:
+        st.error(f"Autosave failed: {error}")
+    elif saver.is_pending(path):
+        st.caption(f"Autosaving to {path}…")
+    elif saved:
+        st.caption(f"Autosaved to {path} at {time.strftime('%H:%M:%S', time.localtime(saved))}")
+
+def open_file(file_path):
+    """
+    Opens a file from disk as the current document, watching it for
+    changes and serving the images of its directory.
+    """
+    try:
+        # Start watching before reading, so no change is missed
+        st.session_state.watch_path = os.path.abspath(file_path)
+        st.session_state.file_version = file_watcher(st.session_state.watch_path).version
+        read_file(file_path)
+        st.session_state.file_name = os.path.basename(file_path)
+        st.session_state.last_uploaded_file_id = st.session_state.watch_path
+        file_dir = os.path.dirname(file_path)
+        if file_dir:
+            st.session_state.file_save_path = file_dir
+            st.session_state.image_directory = file_dir
+
+        # Start image server automatically
+        if os.path.isdir(st.session_state.image_directory):
+            serve_images(st.session_state.image_directory)
+
+        st.session_state.html_cache.clear()
+        resplit()
+    except Exception as e:
+        st.error(f"Error loading file: {e}")
+
+def show_workspace(ws):
+    """
+    Lists the markdown files of a workspace, indexing them for the current
+    split settings first if needed. Picking one opens it.
+    """
+    separators, page_lines = selected_separators(), st.session_state.page_lines
+    indexed = (ws.directory, separators, page_lines)
+    if st.session_state.workspace_indexed != indexed:
+        ws.index(separators, page_lines)
+        st.session_state.workspace_indexed = indexed
+        st.session_state.workspace_version = ws.version(separators, page_lines)
+    summaries = dict(ws.entries(separators, page_lines))
+
+    def format_func(path):
+        summary = summaries.get(path)
+        if summary is None:
+            return f"{path} (indexing…)"
+        if "error" in summary:
+            return f"{path} (unreadable)"
+        if summary.get("large"):
+            return f"{path} (large file)"
+        title = f"{summary['title']} · " if summary["title"] else ""
+        return f"{title}{path} ({summary['pages']} slides)"
+
+    st.selectbox("Workspace", list(summaries), index=None, format_func=format_func, placeholder="Open a file of the workspace", key="workspace_file",
+                 on_change=open_workspace_file, args=(ws.directory,))
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        if st.button("↻", help="Look for new and changed files", use_container_width=True):
+            ws.index(separators, page_lines)
+    with col1:
+        check_workspace(ws, separators, page_lines)
+
+def open_workspace_file(directory):
+    """
+    Callback function to open the file picked in the workspace list.
+    """
+    if st.session_state.workspace_file is not None:
+        open_file(os.path.join(directory, st.session_state.workspace_file))
+
+@st.fragment(run_every=WATCH_INTERVAL)
+def check_workspace(ws, separators, page_lines):
+    """
+    Shows the progress of indexing the workspace for this session's split
+    settings and reruns the app when it is done.
+    """
+    version = ws.version(separators, page_lines)
+    if version != st.session_state.workspace_version:
+        st.session_state.workspace_version = version
+        st.rerun()
+    if ws.indexing(separators, page_lines):
+        done, total = ws.progress(separators, page_lines)
+        st.caption(f"Indexing {done}/{total} files…")
+
+def read_file(file_path):
+    """
+    Reads a file into session state as the current document. Large files
+    are memory-mapped instead (see open_mapped).
+    """
+    if os.path.getsize(file_path) >= MAP_FILE_MB * 1024 * 1024:
+        with timed(run_timer(), "map_file"):
+            open_mapped(map_file(file_path))
+    else:
+        with timed(run_timer(), "read_file"), open(file_path, "r", encoding="utf-8") as f:
+            st.session_state.markdown_content = f.read()
+        st.session_state.autosave_text = st.session_state.markdown_content
+        st.session_state.mapped_index = None
+        st.session_state.loaded_digest = content_hash(st.session_state.markdown_content)
+
+def watching_file():
+    """
+    Returns the path of the file opened from disk (from the command line or
+    the workspace) if it is still the current document, else None.
+    """
+    path = st.session_state.watch_path
+    if path is not None and st.session_state.last_uploaded_file_id == path:
+        return path
+    return None
+
+def workspace_document():
+    """
+    Returns True if the current document is a file of the workspace directory, opened from disk.
+    """
+    path = watching_file()
+    directory = st.session_state.workspace_directory
+    if path is None or not directory or not os.path.isdir(directory):
+        return False
+    directory = os.path.realpath(directory)
+    return os.path.commonpath([directory, os.path.realpath(path)]) == directory
+
+def reload_file(watcher):
+    """
+    Reloads the watched file after it changed on disk. The current slide is
+    kept and only the changed part is re-split. Unsaved edits in the editor
+    are never overwritten.
+    """
+    st.session_state.file_version = watcher.version
+    name = os.path.basename(watcher.path)
+    if st.session_state.mapped_index is None and watcher.digest == content_hash(st.session_state.markdown_content):
+        # The file now holds the document as shown, e.g. after an autosave
+        st.session_state.loaded_digest = watcher.digest
+        return
+    if (st.session_state.mapped_index is None
+            and content_hash(st.session_state.markdown_content) != st.session_state.loaded_digest):
+        st.toast(f"{name} changed on disk. Your unsaved edits were kept.")
+        return
+    try:
+        read_file(watcher.path)
+        st.toast(f"Reloaded {name}.")
+    except Exception as e:
+        st.error(f"Error reloading file: {e}")
+
+@st.fragment(run_every=WATCH_INTERVAL)
+def check_file_watcher(watcher):
+    """
+    Reruns the app when the watched file has changed on disk.
+    """
+    if watcher.version != st.session_state.file_version:
+        st.rerun()
+
+def open_mapped(index):
+    """
+    Makes a memory-mapped file the current document. Its text is not kept
+    in session state; pages are read from the file as they are shown.
+    """
+    st.session_state.mapped_index = index
+    st.session_state.markdown_content = ""
+    st.session_state.pop("deck", None)
+
+def load_deck(image_server_url):
+    """
+    Returns the Deck of the current document, re-splitting only the part
+    that changed since the last run.
+    """
+    # Convert ![[file_name]] links and serve local images from the image server
+    config = (
+        selected_separators(),
+        st.session_state.page_lines,
+        image_server_url,
+        IMAGE_FIT if parse_fit(IMAGE_FIT) else None,
+    )
+    if st.session_state.mapped_index is not None:
+        with timed(run_timer(), "split"):
+            deck = mapped_deck(st.session_state.get("deck"), st.session_state.mapped_index, config)
+    else:
+        # Only workspace files are kept in the on-disk cache
+        st.session_state.split_cache.store = split_store() if workspace_document() else None
+        deck = update_deck(st.session_state.get("deck"), st.session_state.markdown_content, config,
+                           st.session_state.split_cache, run_timer())
+    st.session_state.deck = deck
+    return deck
+
+def move_one_page_window(step):
+    """
+    Callback function to show earlier (step < 0) or more (step > 0) sections in the One Page tab.
+    The window slides: at most 2 * ONE_PAGE_WINDOW sections are shown, dropping those at the other end.
+    """
+    start, end = st.session_state.one_page_window
+    if step < 0:
+        start = max(0, start + step)
+        end = min(end, start + 2 * ONE_PAGE_WINDOW)
+    else:
+        end += step
+        start = max(start, end - 2 * ONE_PAGE_WINDOW)
+    st.session_state.one_page_window = (start, end)
+
+@st.fragment
+def show_one_page(deck):
+    """
+    Renders the One Page tab. Only a window of sections is sent to the
+    browser; more are loaded on demand and just this fragment reruns.
+    """
+    sections = deck.sections(ONE_PAGE_SECTION_LINES)
+    start, end = st.session_state.one_page_window
+    start = min(start, max(0, len(sections) - 1))
+    end = min(max(end, start + 1), len(sections))
+
+    if start > 0:
+        st.button(f"▲ Show earlier ({start} more)", key="one_page_earlier", use_container_width=True,
+                  on_click=move_one_page_window, args=(-ONE_PAGE_WINDOW,))
+    for section_start, section_end in sections[start:end]:
+        st.markdown(link_originals(deck.text[section_start:section_end]), unsafe_allow_html=True)
+    if end < len(sections):
+        st.button(f"▼ Show more ({len(sections) - end} more)", key="one_page_more", use_container_width=True,
+                  on_click=move_one_page_window, args=(ONE_PAGE_WINDOW,))
 
 def update_slider():
     """
@@ -406,128 +797,184 @@ def update_slider():
     if page != st.session_state.current_page:
         st.session_state.current_page = page
 
-@st.cache_data
-def is_markdown_heading(line):
+def open_index(outline):
+    """
+    Prepares the page index to open on the current slide: its headings
+    expanded, on the page of entries that holds it, and no filter.
     """
-    Checks if a line is a markdown heading (levels 1-4).
+    current = st.session_state.current_page
+    st.session_state.toc_expanded = {outline.page_ids[entry] for entry in outline.ancestors(current)}
+    rows = outline.visible(st.session_state.toc_expanded)
+    row = next((i for i, (entry, _) in enumerate(rows) if entry == current), 0)
+    st.session_state.toc_page = row // TOC_PAGE_SIZE
+    st.session_state.toc_filter = ""
+
+def toggle_entry(page_id):
     """
-    stripped_line = line.strip()
-    return (
-            stripped_line.startswith('#') or 
-            stripped_line.startswith('##') or 
-            stripped_line.startswith('###') or 
-            stripped_line.startswith('####'))
+    Callback function to expand or collapse a heading of the page index.
+    """
+    expanded = st.session_state.toc_expanded
+    if page_id in expanded:
+        expanded.discard(page_id)
+    else:
+        expanded.add(page_id)
 
-def split_at_last_heading(text):
+def move_toc_page(step):
     """
-    Finds the last heading in a chunk of text and splits the text before it.
-    This prevents a heading from being the last line of a page.
+    Callback function to show the previous (step < 0) or next (step > 0) entries of the page index.
     """
-    lines = text.splitlines()
-    last_heading_index = -1
-    
-    # Find the index of the last heading
-    for i, line in enumerate(lines):
-        if is_markdown_heading(line):
-            last_heading_index = i
-    
-    # If a heading is found and it's not the first line, split the text
-    if last_heading_index > 0:
-        part1 = '\n'.join(lines[:last_heading_index]) + '\n'
-        part2 = '\n'.join(lines[last_heading_index:]) + '\n'
-        return [part1, part2]
-    
-    return ['\n'.join(lines) + '\n']
+    st.session_state.toc_page = max(0, st.session_state.toc_page + step)
 
-@st.cache_data
-def remove_decorators(text):
+def jump_to_page(page_id):
     """
-    Removes markdown decorators (like #, **) from a line for a cleaner index display.
+    Goes to the slide with the given page id, wherever edits have moved it.
     """
-    text = text.lstrip('#')
-    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-    if text.endswith(':'):
-        text = text[:-1]
-    return text
+    entry = st.session_state.deck.outline().entry(page_id)
+    if entry is not None:
+        st.session_state.current_page = entry
+    st.rerun()
 
-def find_index(lst, target):
+@st.dialog("Page Index", width="large")
+def show_index(outline):
+    """
+    Displays a dialog with the table of contents for jumping to specific
+    pages: a tree of headings that can be expanded and collapsed, or the
+    entries matching a filter, TOC_PAGE_SIZE entries at a time.
+    """
+    query = st.text_input("Filter", key="toc_filter", placeholder="Filter by title", label_visibility="collapsed")
+    query = query.strip()
+    if query:
+        rows = [(entry, 0) for entry in outline.filter(query)]
+    else:
+        rows = outline.visible(st.session_state.toc_expanded)
+    if not rows:
+        st.info("No matching slides.")
+        return
+    page_count = (len(rows) + TOC_PAGE_SIZE - 1) // TOC_PAGE_SIZE
+    st.session_state.toc_page = min(st.session_state.toc_page, page_count - 1)
+    start = st.session_state.toc_page * TOC_PAGE_SIZE
+
+    for entry, depth in rows[start:start + TOC_PAGE_SIZE]:
+        page_id = outline.page_ids[entry]
+        col1, col2 = st.columns([1, 15], vertical_alignment="center")
+        with col1:
+            if not query and outline.children.get(entry):
+                expanded = page_id in st.session_state.toc_expanded
+                st.button("▾" if expanded else "▸", key=f"toc_fold_{page_id}", type="tertiary",
+                          on_click=toggle_entry, args=(page_id,))
+        with col2:
+            label = f"{entry + 1}. {outline.titles[entry].strip()}"
+            if entry == st.session_state.current_page:
+                label = f"**{label}**"
+            # Nesting is shown by indenting with em spaces
+            if st.button("\u2003" * depth + label, key=f"toc_{page_id}", type="tertiary"):
+                jump_to_page(page_id)
+
+    if page_count > 1:
+        col1, col2, col3 = st.columns([1, 6, 1], vertical_alignment="center")
+        with col1:
+            st.button("◀", key="toc_previous", disabled=st.session_state.toc_page == 0,
+                      on_click=move_toc_page, args=(-1,), use_container_width=True)
+        with col2:
+            st.caption(f"{start + 1}–{min(start + TOC_PAGE_SIZE, len(rows))} of {len(rows)}")
+        with col3:
+            st.button("▶", key="toc_next", disabled=st.session_state.toc_page == page_count - 1,
+                      on_click=move_toc_page, args=(1,), use_container_width=True)
+
+@st.dialog("Search", width="large")
+def show_search(deck):
     """
-    Finds the index of a target item in a list.
+    Displays a dialog for searching the text of the slides. Matching slides
+    are listed best first with a snippet; clicking one jumps to it.
     """
-    for i, str_item in enumerate(lst):
-        if str_item == target:
-            return i
-    return -1
+    query = st.text_input("Search", key="search_query", placeholder="Search slides", label_visibility="collapsed")
+    if not page_words(query):
+        return
+    # Only slides added or changed since the last search are indexed
+    search_index = st.session_state.search_index
+    with timed(run_timer(), "search"):
+        search_index.update(deck)
+        results = search_index.search(query, SEARCH_RESULTS)
+    if not results:
+        st.info("No matching slides.")
+        return
+    words = sorted(set(page_words(query)), key=len, reverse=True)
+    highlight = re.compile("|".join(map(re.escape, words)), re.IGNORECASE)
+    outline = deck.outline()
+    for page_id, _ in results:
+        # Position of the slide among the valid pages
+        idx = outline.entry(page_id)
+        if idx is None:
+            continue
+        number = outline.numbers[idx]
+        if st.button(f"{idx + 1}. {outline.titles[idx].strip()}", key=f"search_{page_id}", use_container_width=True):
+            jump_to_page(page_id)
+        st.caption(highlight.sub(r"**\g<0>**", page_snippet(deck.page(number), query)))
 
-def replace_image_path(match, base_url):
+def start_run():
     """
-    Rewrites local image paths to point to the specified image server URL.
-    Used as a callback for re.sub().
+    Starts timing this rerun of the app.
     """
-    alt_text = match.group(1)
-    original_path = match.group(2)
-    try:
-        image_filename = os.path.basename(original_path)
-        base_url = base_url if base_url.endswith('/') else base_url + '/'
-        new_url = f"{base_url}{image_filename}"
-        return f"![{alt_text}]({new_url})"
-    except Exception as e:
-        st.error(f"Error processing image path {original_path}: {e}")
-        return match.group(0)  # Return original string on error
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex[:12]
+    st.session_state.run_timer = RunTimer(st.session_state.session_id)
 
-@st.dialog("Page Index", width="large")
-def show_index(toc):
+def run_timer():
     """
-    Displays a dialog with a table of contents (TOC) for jumping to specific pages.
+    Returns the RunTimer of the current rerun, or None when only a fragment
+    or dialog is rerunning.
     """
-    idx = st.session_state.current_page
-    
-    # Function to format TOC items for better display
-    def format_func(item):
-        return item[:60] + ("..." if len(item) > 60 else "")
-
-    # Radio button list for page selection
-    selected = st.radio(
-        "Contents:",
-        toc,
-        index=idx,
-        format_func=format_func,
-        label_visibility="collapsed"
-    )
-    # If a new page is selected, update the state and rerun
-    if selected is not None:
-        idx = find_index(toc, selected)
-        if idx != -1 and st.session_state.current_page != idx:
-            st.session_state.current_page = idx
-            st.rerun()
-
-@st.cache_data
-def make_index(pages):
-    """
-    Creates a table of contents from the list of pages.
-    The first line of each page is used as the index entry.
-    Skips pages that are empty or contain only separators.
-    """
-    index = []
-    valid_pages = []
-    
-    for page in pages:
-        # Skip if page is empty or contains only whitespace/separators
-        page_content = page.strip()
-        if not page_content or page_content in ['---', '----', '-----']:
-            continue
-            
-        # Get the first non-empty line and clean it up for the index
-        lines = [line for line in page.split('\n') if line.strip()]
-        if lines:
-            first_line = remove_decorators(lines[0].strip())
-            first_line = f"{len(valid_pages)+1}. {first_line}"
-            index.append(first_line)
-            valid_pages.append(page)
-            
-    return index, valid_pages
+    timer = st.session_state.get("run_timer")
+    return timer if timer is not None and timer.seconds is None else None
 
+def finish_run():
+    """
+    Stops timing this rerun, adds it to the session's history and the
+    process-wide metrics, and shows the timings panel if it is enabled.
+    """
+    run = st.session_state.run_timer.finish()
+    st.session_state.run_history.append(run)
+    app_metrics().record(run)
+    if st.session_state.debug_panel:
+        with st.sidebar:
+            show_timings()
+
+def show_timings():
+    """
+    Displays the timings panel: the time of each phase in the last rerun and
+    on average over the session's recent reruns, and the cache lookups.
+    """
+    history = st.session_state.run_history
+    last = history[-1]
+
+    # Time not spent in any timed phase
+    def other(run):
+        return max(0.0, run["seconds"] - sum(run["phases"].values()))
+
+    phases = {}
+    for run in history:
+        for name, seconds in [*run["phases"].items(), ("other", other(run))]:
+            phases.setdefault(name, []).append(seconds)
+    last_phases = dict(last["phases"], other=other(last))
+    rows = [{"Phase": name, "Last (ms)": round(last_phases.get(name, 0.0) * 1000, 2),
+             "Mean (ms)": round(sum(times) / len(times) * 1000, 2), "Reruns": len(times)}
+            for name, times in phases.items()]
+
+    with st.expander("Timings", expanded=True):
+        st.caption(f"Last rerun: {last['seconds'] * 1000:.1f} ms, {len(history)} reruns recorded")
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        for name in last["caches"]:
+            hits = sum(run["caches"].get(name, {}).get("hits", 0) for run in history)
+            misses = sum(run["caches"].get(name, {}).get("misses", 0) for run in history)
+            st.caption(f"{name.capitalize()} cache: {hits} hits, {misses} misses")
+        st.download_button("Export JSON lines", json_lines(history), file_name="mdslider-timings.jsonl",
+                           mime="application/jsonl", on_click="ignore", use_container_width=True)
+        server = image_server()
+        if server.running:
+            st.caption(f"Prometheus metrics of all sessions: http://localhost:{server.port}/metrics")
 
 # --- Main Execution ---
 if __name__ == "__main__":
+    start_run()
     main()
+    finish_run()
@@ -0,0 +1,101 @@
+"""
+Tests of atomic writes and the background autosaver.
+"""
+import os
+import stat
+import time
+
+import pytest
+
+from mdslider import AutoSaver, atomic_write, content_hash
+
+
+def test_atomic_write(tmp_path):
+    path = tmp_path / "deck.md"
+    assert atomic_write(str(path), "# Slide ü\n") == content_hash("# Slide ü\n")
+    assert path.read_text(encoding="utf-8") == "# Slide ü\n"
+    assert os.listdir(tmp_path) == ["deck.md"]
+
+
+def test_new_file_gets_umask(tmp_path):
+    old = os.umask(0o027)
+    try:
+        atomic_write(str(tmp_path / "deck.md"), "text")
+    finally:
+        os.umask(old)
+    assert stat.S_IMODE(os.stat(tmp_path / "deck.md").st_mode) == 0o640
+
+
+def test_mode_kept(tmp_path):
+    path = tmp_path / "deck.md"
+    path.write_text("old")
+    os.chmod(path, 0o600)
+    atomic_write(str(path), "new")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert path.read_text() == "new"
+
+
+def test_failed_write_leaves_nothing(tmp_path, monkeypatch):
+    path = tmp_path / "deck.md"
+    path.write_text("old")
+
+    def fail(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        atomic_write(str(path), "new")
+    assert path.read_text() == "old"
+    assert os.listdir(tmp_path) == ["deck.md"]
+
+
+@pytest.fixture
+def saver():
+    saver = AutoSaver(delay=0.1)
+    saver.start()
+    yield saver
+    saver.flush()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_debounced(saver, tmp_path, monkeypatch):
+    path = str(tmp_path / "deck.md")
+    writes = []
+    monkeypatch.setattr("mdslider.autosave.atomic_write", lambda p, text: writes.append(text))
+    for i in range(5):
+        saver.submit(path, f"version {i}")
+    assert saver.is_pending(path)
+    assert wait_for(lambda: not saver.is_pending(path))
+    assert writes == ["version 4"]
+
+
+def test_unchanged_not_written(saver, tmp_path):
+    path = str(tmp_path / "deck.md")
+    assert saver.save(path, "text")
+    mtime = os.stat(path).st_mtime_ns
+    assert not saver.save(path, "text")
+    assert os.stat(path).st_mtime_ns == mtime
+    assert saver.status(path)[0] is not None
+
+
+def test_error_reported(saver, tmp_path):
+    path = str(tmp_path / "missing" / "deck.md")
+    saver.submit(path, "text", delay=0)
+    assert wait_for(lambda: saver.status(path)[1] is not None)
+    assert saver.status(path)[0] is None
+
+
+def test_flush(tmp_path):
+    saver = AutoSaver(delay=60)
+    path = tmp_path / "deck.md"
+    saver.submit(str(path), "text")
+    saver.flush()
+    assert path.read_text() == "text"
+    assert not saver.is_pending(str(path))
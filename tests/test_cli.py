@@ -0,0 +1,74 @@
+"""
+Tests of the command line interface and of the package's lazy imports.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import mdslider
+from mdslider.cli import main
+
+DECK = "# One\n\nintro\n\n---\n\n## Two\n\nmore\n\n---\n\n**Three**\n"
+
+
+@pytest.fixture
+def deck(tmp_path):
+    path = tmp_path / "deck.md"
+    path.write_text(DECK, encoding="utf-8")
+    return path
+
+
+def test_split(deck, capsys):
+    assert main(["split", str(deck)]) == 0
+    assert capsys.readouterr().out == "1. One\n2. Two\n3. Three\n"
+
+
+def test_split_json(deck, capsys):
+    assert main(["split", str(deck), "--json", "--separators", "h1,h2"]) == 0
+    result = json.loads(capsys.readouterr().out)
+    assert result["file"] == str(deck)
+    assert [page["title"] for page in result["pages"]] == ["One", "Two"]
+    assert result["pages"][1]["markdown"].startswith("## Two")
+
+
+def test_split_several_files(deck, tmp_path, capsys):
+    other = tmp_path / "other.md"
+    other.write_text("# Other\n", encoding="utf-8")
+    assert main(["split", str(deck), str(other), "--stats", "-j", "2"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split("\t")[:2] for line in lines] == [[str(deck), "3 pages"], [str(other), "1 pages"]]
+
+
+def test_split_missing_file(deck, tmp_path, capsys):
+    assert main(["split", str(tmp_path / "missing.md"), str(deck), "-j", "1"]) == 1
+    out, err = capsys.readouterr()
+    assert "missing.md" in err
+    assert "3. Three" in out
+
+
+def test_unknown_separator(deck, capsys):
+    with pytest.raises(SystemExit):
+        main(["split", str(deck), "--separators", "h9"])
+    assert "unknown separator h9" in capsys.readouterr().err
+
+
+def test_export(deck, tmp_path, capsys):
+    output = tmp_path / "out.html"
+    assert main(["export", str(deck), "-o", str(output)]) == 0
+    html = output.read_text(encoding="utf-8")
+    assert html.count("<section") == 3
+    assert "wrote 3 slides" in capsys.readouterr().err
+
+
+def test_lazy_imports():
+    code = "import sys, mdslider.cli; print(sorted(m for m in sys.modules if m.startswith('mdslider')))"
+    modules = json.loads(subprocess.check_output([sys.executable, "-c", code], text=True,
+                                                 cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).replace("'", '"'))
+    assert "mdslider.server" not in modules and "mdslider.export" not in modules
+    assert mdslider.split_content is mdslider.blocks.split_content
+    assert "render_html" in dir(mdslider)
+    with pytest.raises(AttributeError):
+        mdslider.no_such_name
@@ -0,0 +1,62 @@
+"""
+Tests of the per-session split cache.
+"""
+from mdslider import SplitCache, build_deck, content_hash, update_deck
+
+CONFIG = (frozenset({"separator_h1"}), 20, None, None)
+
+
+def document(n):
+    return "".join(f"# Slide {n}.{i}\n\ntext\n\n" for i in range(20))
+
+
+def test_content_hash():
+    assert content_hash("abc") == content_hash("abc") != content_hash("abd")
+    assert len(content_hash("")) == 32
+
+
+def test_hits_and_misses():
+    cache = SplitCache(10 * 1024 * 1024)
+    deck = build_deck(document(0), CONFIG, cache)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 1, 1)
+    assert build_deck(document(0), CONFIG, cache) is deck
+    assert cache.hits == 1
+    other = build_deck(document(0), (frozenset({"separator_hr"}), 20, None, None), cache)
+    assert other is not deck and len(cache) == 2
+
+
+def test_bounded_by_size():
+    deck_size = build_deck(document(0), CONFIG).size()
+    cache = SplitCache(3 * deck_size + deck_size // 2)
+    decks = [build_deck(document(n), CONFIG, cache) for n in range(5)]
+    assert len(cache) == 3 and cache.size <= cache.max_bytes
+    # The least recently used decks were evicted
+    assert cache.get(decks[0].key()) is None
+    assert cache.get(decks[4].key()) is decks[4]
+    cache.get(decks[2].key())
+    build_deck(document(5), CONFIG, cache)
+    assert cache.get(decks[2].key()) is decks[2]
+    assert cache.get(decks[3].key()) is None
+
+
+def test_too_large_not_cached():
+    cache = SplitCache(100)
+    build_deck(document(0), CONFIG, cache)
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_clear():
+    cache = SplitCache(10 * 1024 * 1024)
+    build_deck(document(0), CONFIG, cache)
+    cache.clear()
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_config_change_keeps_deck():
+    cache = SplitCache(10 * 1024 * 1024)
+    deck = update_deck(None, document(0), CONFIG, cache)
+    other_config = (frozenset({"separator_hr"}), 20, None, None)
+    other = update_deck(deck, document(0), other_config, cache)
+    assert other is not deck
+    # Switching back finds the first deck in the cache instead of splitting again
+    assert update_deck(other, document(0), CONFIG, cache) is deck
@@ -0,0 +1,136 @@
+"""
+Tests of the on-disk split cache and of workspaces.
+"""
+import os
+import random
+import time
+
+import pytest
+
+from mdslider import DiskSplitCache, SplitCache, Workspace, build_deck, content_hash, entry_deck, deck_entry
+from mdslider.files import DiskLRU
+
+PIECES = ["# Title", "## Sub", "text line", "", "---", "```", "| a | b |", "![[pic.png]]", "![x](y.png \"T\")",
+          "**bold**", "ü ✓"]
+
+
+def random_document(rnd):
+    return "\n".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 40)))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_entry_round_trip(seed):
+    rnd = random.Random(seed)
+    for _ in range(200):
+        source = random_document(rnd)
+        separators = frozenset(rnd.sample(["separator_h1", "separator_h2", "separator_hr", "separator_bold"], 2))
+        deck = build_deck(source, (separators, rnd.randint(1, 6), None, None))
+        deck.toc()
+        # Entries don't depend on the image server
+        config = (separators, deck.config[1], rnd.choice([None, "http://localhost:1/abc"]), None)
+        loaded = entry_deck(deck_entry(deck), source, content_hash(source), config)
+        full = build_deck(source, config)
+        assert loaded.text == full.text
+        assert loaded.pages == full.pages
+        assert loaded.segments == full.segments
+        assert loaded.page_texts() == full.page_texts()
+        assert loaded.toc() == full.toc()
+
+
+def test_entry_must_fit_source():
+    deck = build_deck("# One\n\n# Two\n", (frozenset({"separator_h1"}), 20, None, None))
+    data = deck_entry(deck)
+    assert entry_deck(data, "# One\n", content_hash("# One\n"), deck.config) is None
+    assert entry_deck(data[:-1], "# One\n\n# Two\n", deck.key()[0], deck.config) is None
+    assert entry_deck(b"", "# One\n\n# Two\n", deck.key()[0], deck.config) is None
+
+
+def test_store(tmp_path):
+    store = DiskSplitCache(str(tmp_path), 10 * 1024 * 1024)
+    config = (frozenset({"separator_h1"}), 20, None, None)
+    source = "# One\n\ntext\n\n# Two\n"
+    deck = build_deck(source, config, SplitCache(1024 * 1024, store))
+    assert (store.hits, store.misses) == (0, 1)
+    # Another session finds it on disk
+    loaded = build_deck(source, config, SplitCache(1024 * 1024, store))
+    assert loaded is not deck and loaded.pages == deck.pages
+    assert store.hits == 1
+    metadata = store.metadata(deck.key()[0], config[0], 20)
+    assert (metadata["pages"], metadata["title"]) == (2, "One")
+    # And so does a store opened after a restart
+    assert len(DiskSplitCache(str(tmp_path), 10 * 1024 * 1024).files) == 1
+
+
+def test_store_evicts(tmp_path):
+    config = (frozenset({"separator_h1"}), 20, None, None)
+    sources = [f"# Deck {n}\n\n" + "text\n" * 200 for n in range(4)]
+    size = len(deck_entry(build_deck(sources[0], config)))
+    store = DiskSplitCache(str(tmp_path), 2 * size + size // 2)
+    for source in sources:
+        store.put(build_deck(source, config))
+    assert len(store.files) == 2
+    assert store.get(sources[0], content_hash(sources[0]), config) is None
+    assert store.get(sources[3], content_hash(sources[3]), config) is not None
+
+
+def test_disk_lru(tmp_path):
+    lru = DiskLRU(str(tmp_path), 10)
+    paths = []
+    for name in "abc":
+        path = tmp_path / "00" / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"1234")
+        paths.append(str(path))
+    lru.add(paths[0], 4)
+    lru.add(paths[1], 4)
+    lru.touch(paths[0])
+    lru.add(paths[2], 4)
+    assert paths[1] not in lru and not os.path.exists(paths[1])
+    assert paths[0] in lru and paths[2] in lru and lru.size == 8
+
+
+def wait_indexed(workspace, separators, page_lines, timeout=60):
+    deadline = time.monotonic() + timeout
+    while workspace.indexing(separators, page_lines):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_workspace(tmp_path):
+    files = tmp_path / "files"
+    (files / "sub").mkdir(parents=True)
+    (files / ".hidden").mkdir()
+    (files / "a.md").write_text("# Alpha\n\n# Second\n", encoding="utf-8")
+    (files / "sub" / "b.md").write_text("**Beta**\n", encoding="utf-8")
+    (files / "bad.md").write_bytes(b"\xff\xfe")
+    (files / ".hidden" / "c.md").write_text("# Hidden\n")
+    (files / "notes.txt").write_text("# Not markdown\n")
+    store = DiskSplitCache(str(tmp_path / "cache"), 10 * 1024 * 1024)
+    workspace = Workspace(str(files), store, workers=1)
+    try:
+        h1 = {"separator_h1"}
+        assert workspace.index(h1, 20) == 3
+        wait_indexed(workspace, h1, 20)
+        entries = dict(workspace.entries(h1, 20))
+        assert list(entries) == ["a.md", "bad.md", os.path.join("sub", "b.md")]
+        assert entries["a.md"] == {"pages": 2, "title": "Alpha"}
+        assert entries[os.path.join("sub", "b.md")] == {"pages": 1, "title": "Beta"}
+        assert "error" in entries["bad.md"]
+        assert workspace.progress(h1, 20) == (3, 3)
+        assert len(store.files) == 2
+
+        # Nothing changed; another split configuration is indexed on its own
+        assert workspace.index(h1, 20) == 0
+        version = workspace.version(h1, 20)
+        assert workspace.index({"separator_bold"}, 20) == 3
+        wait_indexed(workspace, {"separator_bold"}, 20)
+        assert workspace.version(h1, 20) == version
+        assert dict(workspace.entries(h1, 20))["a.md"] == {"pages": 2, "title": "Alpha"}
+
+        (files / "a.md").write_text("# Changed\n", encoding="utf-8")
+        os.utime(files / "a.md", ns=(0, 0))
+        assert workspace.index(h1, 20) == 1
+        wait_indexed(workspace, h1, 20)
+        assert dict(workspace.entries(h1, 20))["a.md"] == {"pages": 1, "title": "Changed"}
+    finally:
+        workspace.shutdown()
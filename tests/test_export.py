@@ -0,0 +1,105 @@
+"""
+Tests of the static HTML export.
+"""
+import base64
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mdslider import build_deck
+from mdslider.export import asset_name, export_deck, link_images, ordered_results, page_images
+from mdslider.images import ImageIndex
+
+CONFIG = (frozenset({"separator_hr"}), 20, None, None)
+DOCUMENT = """# Intro
+
+![logo](logo.png "Logo") and ![web](https://example.com/web.png)
+
+---
+
+## Details
+
+![[photo.jpg]] ![again](logo.png) ![missing](missing.png)
+
+---
+
+---
+
+## End <tag> & co
+"""
+
+
+@pytest.fixture
+def directory(tmp_path):
+    (tmp_path / "logo.png").write_bytes(b"logo bytes")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "photo.jpg").write_bytes(b"photo bytes")
+    return tmp_path
+
+
+def export(directory, **kwargs):
+    out = io.StringIO()
+    result = export_deck(build_deck(DOCUMENT, CONFIG), out, str(directory), **kwargs)
+    return result, out.getvalue()
+
+
+def test_page_images(directory):
+    images = ImageIndex(str(directory))
+    markdown = "![a](logo.png) ![b](https://example.com/b.png) ![c](missing.png) ![](photo.jpg) ![d](logo.png)"
+    assert [os.path.basename(path) for path in page_images(markdown, images)] == ["logo.png", "photo.jpg", "logo.png"]
+
+
+def test_link_images(directory):
+    images = ImageIndex(str(directory))
+    urls = {os.path.join(images.directory, "logo.png"): "#image-1"}
+    markdown = '![a](logo.png "T") ![b](https://example.com/b.png) ![c](missing.png)'
+    assert link_images(markdown, images, urls) == '![a](#image-1 "T") ![b](https://example.com/b.png) ![c](missing.png)'
+
+
+def test_embedded(directory):
+    (slides, images), page = export(directory, title="Deck & co", jobs=2)
+    assert (slides, images) == (3, 2)
+    assert "<title>Deck &amp; co</title>" in page
+    assert page.count("<section") == 3
+    assert "End &lt;tag&gt; &amp; co" in page
+    # Each image is embedded once, after the first slide showing it
+    data = dict(re.findall(r'id="(image-\d+)" data-type="[^"]+">\n(.*?)\n</script>', page, re.S))
+    assert base64.b64decode(data["image-1"]) == b"logo bytes"
+    assert base64.b64decode(data["image-2"]) == b"photo bytes"
+    assert page.index('id="image-1"') < page.index('id="slide-2"') < page.index('id="image-2"')
+    assert page.count('src="#image-1"') == 2
+    assert 'src="https://example.com/web.png"' in page and 'src="missing.png"' in page
+
+
+def test_assets_folder(directory, tmp_path_factory):
+    assets = tmp_path_factory.mktemp("out") / "images"
+    (slides, images), page = export(directory, assets=str(assets))
+    assert (slides, images) == (3, 2)
+    assert sorted(os.listdir(assets)) == ["1-logo.png", "2-photo.jpg"]
+    assert (assets / "2-photo.jpg").read_bytes() == b"photo bytes"
+    assert 'src="images/1-logo.png"' in page and 'class="image"' not in page
+
+
+def test_without_images(directory):
+    (slides, images), page = export(None)
+    assert (slides, images) == (3, 0)
+    assert "<title>Intro</title>" in page
+    assert 'src="logo.png"' in page
+
+
+def test_empty_deck():
+    out = io.StringIO()
+    assert export_deck(build_deck("", CONFIG), out) == (0, 0)
+    assert "<title>Slides</title>" in out.getvalue()
+
+
+def test_asset_name():
+    assert asset_name(3, "/some/where/my image (1).png") == "3-my_image_1_.png"
+
+
+def test_ordered_results():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert list(ordered_results(pool, lambda n: n * n, range(50), 8)) == [n * n for n in range(50)]
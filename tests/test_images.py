@@ -0,0 +1,122 @@
+"""
+Tests of image link rewriting and of the image directory index.
+"""
+import os
+
+import pytest
+
+from mdslider import image_path, image_url, link_originals, page_image_urls, rewrite_images
+from mdslider.images import ImageIndex
+
+BASE = "http://localhost:8000/abc/"
+
+
+@pytest.mark.parametrize("reference, path", [
+    ("img.png", "img.png"),
+    ("./sub/img.png", "sub/img.png"),
+    ("sub\\deep\\img.png", "sub/deep/img.png"),
+    ("sub/../img.png", "img.png"),
+    ("../outside/img.png", "img.png"),
+    ("/etc/img.png", "img.png"),
+    ("C:/pictures/img.png", "img.png"),
+    ("my%20image.png", "my image.png"),
+    ("img.png?v=2", "img.png"),
+    ("img.png#x", "img.png"),
+    ("a%23b%3F.png", "a#b?.png"),
+])
+def test_image_path(reference, path):
+    assert image_path(reference) == path
+
+
+@pytest.mark.parametrize("reference, fit, url", [
+    ("img.png", None, BASE + "img.png"),
+    ("img.png", "800x600", BASE + "img.png?fit=800x600"),
+    ("sub/my image.png", None, BASE + "sub/my%20image.png"),
+    ("img.png?v=2", None, BASE + "img.png?v=2"),
+    ("img.png?v=2", "800x600", BASE + "img.png?fit=800x600&v=2"),
+    ("img.png#x", "800x600", BASE + "img.png?fit=800x600#x"),
+    ("a%23b.png", None, BASE + "a%23b.png"),
+])
+def test_image_url(reference, fit, url):
+    assert image_url(BASE, reference, fit) == url
+
+
+@pytest.mark.parametrize("markdown, rewritten", [
+    ("![[img.png]]", f"![]({BASE}img.png)"),
+    ("![[https://example.org/a.png]]", "![](https://example.org/a.png)"),
+    ("![alt](img.png)", f"![alt]({BASE}img.png)"),
+    ("![alt](sub/img.png \"Title\")", f"![alt]({BASE}sub/img.png \"Title\")"),
+    ("![alt](img.png 'Title')", f"![alt]({BASE}img.png 'Title')"),
+    ("![alt](<my image.png> (Title))", f"![alt]({BASE}my%20image.png (Title))"),
+    ("![alt](https://example.org/a.png)", "![alt](https://example.org/a.png)"),
+    ("![a](x.png) and ![b](x.png)", f"![a]({BASE}x.png) and ![b]({BASE}x.png)"),
+    ("`text` ![a](img.png?v=2#x)", f"`text` ![a]({BASE}img.png?v=2#x)"),
+])
+def test_rewrite_images(markdown, rewritten):
+    assert rewrite_images(markdown, BASE) == rewritten
+
+
+def test_rewrite_without_server():
+    assert rewrite_images("![[a b.png]] ![x](y.png)", None) == "![](a b.png) ![x](y.png)"
+
+
+def test_rewrite_keeps_lines():
+    markdown = "# Title\n![[a.png]]\r\n\n![b](b.png)\n"
+    assert rewrite_images(markdown, BASE).splitlines() == [
+        "# Title", f"![]({BASE}a.png)", "", f"![b]({BASE}b.png)"]
+
+
+def test_link_originals():
+    markdown = rewrite_images('![a](img.png?v=2#x "T") ![b](c.png)', BASE, "100x80")
+    assert link_originals(markdown) == (
+        f'[![a]({BASE}img.png?fit=100x80&v=2#x "T")]({BASE}img.png?v=2#x) '
+        f'[![b]({BASE}c.png?fit=100x80)]({BASE}c.png)')
+
+
+def test_page_image_urls():
+    markdown = f"![a]({BASE}a.png) ![b]({BASE}b.png \"T\") ![a]({BASE}a.png) ![c](local.png)"
+    assert page_image_urls(markdown) == (BASE + "a.png", BASE + "b.png")
+
+
+@pytest.fixture
+def images(tmp_path):
+    for relative in ["top.png", "sub/top.png", "sub/nested.png", "a/deep/nested.png", "b/deep/nested.png",
+                     ".hidden/secret.png", "my image.png"]:
+        path = tmp_path / "images" / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"png")
+    (tmp_path / "outside.png").write_bytes(b"png")
+    return ImageIndex(str(tmp_path / "images"))
+
+
+def resolved(index, relative):
+    path = index.resolve(relative)
+    return None if path is None else os.path.relpath(path, index.directory).replace(os.sep, "/")
+
+
+def test_index_exact_path(images):
+    assert resolved(images, "top.png") == "top.png"
+    assert resolved(images, "sub/top.png") == "sub/top.png"
+    assert resolved(images, "my image.png") == "my image.png"
+
+
+def test_index_by_name(images):
+    # ![[nested.png]] finds the shallowest file of that name
+    assert resolved(images, "nested.png") == "sub/nested.png"
+    assert resolved(images, "b/deep/nested.png") == "b/deep/nested.png"
+    assert resolved(images, "deep/nested.png") == "a/deep/nested.png"
+    assert resolved(images, "elsewhere/top.png") == "top.png"
+
+
+def test_index_hidden_and_outside(images):
+    assert resolved(images, ".hidden/secret.png") == ".hidden/secret.png"
+    assert images.resolve("../outside.png") is None
+    assert images.resolve("missing.png") is None
+
+
+def test_index_picks_up_new_files(images, monkeypatch):
+    assert images.resolve("new.png") is None
+    with open(os.path.join(images.directory, "new.png"), "wb") as f:
+        f.write(b"png")
+    monkeypatch.setattr("mdslider.images.INDEX_REFRESH_INTERVAL", 0)
+    assert resolved(images, "new.png") == "new.png"
@@ -0,0 +1,96 @@
+"""
+Tests of memory-mapped documents.
+"""
+import io
+import random
+
+import pytest
+
+from mdslider import build_deck, map_file, map_stream, mapped_deck, scan_lines, scan_mapped
+from mdslider.images import rewrite_images
+from mdslider.mapped import MappedText
+
+PIECES = ["# Title", "## Sub é", "text line", "ünïcode ✓ 😀", "", "---", "```", "| a | b |", "![[pic.png]]",
+          "![x](y.png)", "**bold**", "\r", "a\r\nb", "x y"]
+
+
+def random_document(rnd, lines):
+    return "\n".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, lines)))
+
+
+def mapped(text):
+    return MappedText(text.encode("utf-8"))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_scan_matches_scan_lines(seed):
+    rnd = random.Random(seed)
+    for _ in range(300):
+        text = random_document(rnd, 30)
+        data = text.encode("utf-8")
+        expected = scan_lines(rewrite_images(text, None))
+        index = scan_mapped(mapped(text), chunk_size=rnd.randint(1, 40))
+        assert bytes(index.flags) == bytes(expected.flags), text
+        assert bytes(index.levels) == bytes(expected.levels), text
+        assert [data[s:e].decode("utf-8") for s, e in zip(index.starts, index.ends)] == \
+            [text[s:e] for s, e in zip(expected.starts, expected.ends)], text
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_pages_match_build_deck(seed):
+    rnd = random.Random(seed)
+    for _ in range(100):
+        text = random_document(rnd, 30)
+        config = (frozenset({"separator_h1", "separator_hr"}), 5, None, None)
+        full = build_deck(text, config)
+        if len(full.pages) <= 1:
+            continue
+        deck = mapped_deck(None, scan_mapped(mapped(text), chunk_size=16), config)
+        assert [deck.page(i) for i in range(len(deck.pages))] == [full.page(i) for i in range(len(full.pages))]
+
+
+def test_image_links_rewritten():
+    config = (frozenset({"separator_hr"}), 5, "http://localhost:1/abc", None)
+    deck = mapped_deck(None, scan_mapped(mapped("![[pic.png]]\n\n---\n\nend\n")), config)
+    assert deck.page(0).strip() == "![](http://localhost:1/abc/pic.png)"
+    other = mapped_deck(deck, deck.index, (config[0], 5, "http://localhost:2/def", None))
+    assert other.pages is deck.pages
+    assert other.page(0).strip() == "![](http://localhost:2/def/pic.png)"
+
+
+def test_never_a_single_page():
+    text = "```\n" + "".join(f"code {i}\n" for i in range(50))
+    deck = mapped_deck(None, scan_mapped(mapped(text)), (frozenset({"separator_h1"}), 20, None, None))
+    assert len(deck.pages) > 1
+    assert "".join(deck.page(i) for i in range(len(deck.pages))).split() == text.split()
+
+
+def test_map_file_and_stream(tmp_path):
+    path = tmp_path / "deck.md"
+    path.write_text("# One\n\n# Two é\n", encoding="utf-8")
+    for index in (map_file(str(path)), map_stream(io.BytesIO(path.read_bytes()))):
+        assert len(index) == 3
+        assert index.text[index.starts[2]:index.ends[2]] == "# Two é"
+    (tmp_path / "empty.md").write_bytes(b"")
+    assert len(map_file(str(tmp_path / "empty.md")).text) == 0
+
+
+def test_invalid_utf8(tmp_path):
+    path = tmp_path / "deck.md"
+    path.write_bytes(b"# One\n\xff\n")
+    with pytest.raises(UnicodeDecodeError):
+        map_file(str(path))
+
+
+def test_file_truncated_while_mapped(tmp_path):
+    path = tmp_path / "deck.md"
+    path.write_text("# Title é\n\ntext\n\n" * 2000, encoding="utf-8")
+    index = map_file(str(path))
+    with open(path, "r+b") as f:
+        f.truncate(11)
+    # Read from the file instead of the mapping, which would raise SIGBUS
+    assert index.text[0:10] == "# Title é"
+    assert index.text[5000:5100] == ""
+    path.write_text("rewritten")
+    assert index.text[0:9] == "rewritten"
+    assert len(scan_mapped(index.text)) == 1
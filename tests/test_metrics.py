@@ -0,0 +1,66 @@
+"""
+Tests of rerun timings and their export.
+"""
+import json
+import time
+
+from mdslider import Metrics, RunTimer, SplitCache, build_deck, json_lines, timed
+
+
+def finished_run(session="s1"):
+    timer = RunTimer(session)
+    cache = SplitCache(1024 * 1024)
+    timer.watch("split", cache)
+    with timed(timer, "split"):
+        build_deck("# One\n", (frozenset(), 20, None, None), cache, timer)
+    with timer.phase("render"):
+        time.sleep(0.01)
+    with timer.phase("render"):
+        pass
+    return timer.finish()
+
+
+def test_run_timer():
+    run = finished_run()
+    assert run["session"] == "s1"
+    assert run["seconds"] >= run["phases"]["render"] >= 0.01
+    assert {"split", "render", "hash", "scan"} <= set(run["phases"])
+    assert run["caches"] == {"split": {"hits": 0, "misses": 1}}
+
+
+def test_timed_without_timer():
+    with timed(None, "phase"):
+        pass
+
+
+def test_json_lines():
+    runs = [finished_run("a"), finished_run("b")]
+    lines = json_lines(runs).splitlines()
+    assert [json.loads(line) for line in lines] == runs
+
+
+def test_prometheus():
+    metrics = Metrics()
+    metrics.record(finished_run())
+    metrics.record(finished_run('quote"d'))
+    text = metrics.prometheus()
+    assert "mdslider_runs_total 2\n" in text
+    assert 'mdslider_phase_seconds_count{phase="render"} 2\n' in text
+    assert 'mdslider_cache_misses_total{cache="split"} 2\n' in text
+    for line in text.splitlines():
+        assert line.startswith("#") or len(line.rsplit(" ", 1)) == 2
+
+
+def test_log(tmp_path):
+    path = tmp_path / "runs.jsonl"
+    metrics = Metrics(str(path))
+    run = finished_run()
+    metrics.record(run)
+    metrics.record(run)
+    assert [json.loads(line) for line in path.read_text().splitlines()] == [run, run]
+
+
+def test_unwritable_log(tmp_path):
+    metrics = Metrics(str(tmp_path / "missing" / "runs.jsonl"))
+    metrics.record(finished_run())
+    assert metrics.log_path is None and metrics.runs == 1
@@ -0,0 +1,38 @@
+"""
+Tests of the per-page image manifests used to preload neighbouring slides.
+"""
+from mdslider import build_deck, preload_hints, update_deck
+
+SERVER = "http://localhost:8000/abc"
+CONFIG = (frozenset({"separator_hr"}), 20, SERVER, None)
+
+
+def document(images):
+    return "\n---\n".join(f"# Slide {i}\n\n{image}\n" for i, image in enumerate(images))
+
+
+def test_page_images():
+    deck = build_deck(document(["![a](a.png) ![[b.png]] ![a](a.png)", "no images",
+                                "![web](https://example.com/w.png)"]), CONFIG)
+    assert deck.images(0) == (f"{SERVER}/a.png", f"{SERVER}/b.png")
+    assert deck.images(1) == ()
+    assert deck.images(2) == ("https://example.com/w.png",)
+    assert deck.images(0) is deck.images(0)
+
+
+def test_manifest_carried_over():
+    images = [f"![{i}]({i}.png)" for i in range(6)]
+    deck = build_deck(document(images), CONFIG)
+    manifests = [deck.images(i) for i in range(6)]
+    images[3] = "![new](new.png)"
+    updated = update_deck(deck, document(images), CONFIG)
+    assert updated.manifest[:3] == manifests[:3] and updated.manifest[4:] == manifests[4:]
+    assert updated.manifest[3] is None
+    assert updated.images(3) == (f"{SERVER}/new.png",)
+
+
+def test_preload_hints():
+    assert preload_hints([]) == ""
+    assert preload_hints(["http://h/a.png?fit=1x1&v=2", 'http://h/"b".png']) == (
+        '<link rel="preload" as="image" href="http://h/a.png?fit=1x1&amp;v=2">'
+        '<link rel="preload" as="image" href="http://h/&quot;b&quot;.png">')
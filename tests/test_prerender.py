@@ -0,0 +1,64 @@
+"""
+Tests of slides pre-rendered to HTML.
+
+st.markdown parses the HTML it is given as markdown again, so pre-rendered
+slides must come out of a second parse as they would from the markdown
+itself; slides CommonMark renders differently from Streamlit's GitHub-
+flavoured markdown must be handed to Streamlit unchanged.
+"""
+import random
+
+import pytest
+
+pytest.importorskip("markdown_it")
+
+from mdslider import render_html
+from mdslider.prerender import markdown_parser
+
+PIECES = [
+    "# Title", "## Sub", "Setext", "===", "text line", "**bold** and *it*", "", "   ", "```", "```python", "    code",
+    "| a | b |", "|---|---|", "- item", "1. first", "> quote", "> # quoted", "<div>", "</div>", "<b>raw</b>", "---",
+    "![alt](http://localhost:8000/img.png)", "[link](http://example.org)", "<http://example.org>", "a & b < c",
+    "~~gone~~", "line  ", "\\*", "[ref]", "[ref]: /url",
+]
+
+
+def random_slide(rng):
+    return "\n".join(rng.choice(PIECES) for _ in range(rng.randrange(1, 12)))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_html_parses_as_the_markdown(seed):
+    parser = markdown_parser()
+    rng = random.Random(seed)
+    for _ in range(2000):
+        markdown = random_slide(rng)
+        # Raw HTML ending the slide may lose its final line break
+        assert parser.render(render_html(markdown)).rstrip("\n") == parser.render(markdown).rstrip("\n"), markdown
+
+
+@pytest.mark.parametrize("markdown", [
+    "Text[^1]\n\n[^1]: note",
+    "See https://example.org for more",
+    "Or www.example.org",
+    "Mail me@example.org",
+    "- [ ] todo\n- [x] done",
+    "1. [ ] first",
+    "~one tilde~",
+    "Cost $x$",
+    ":red[colored]",
+    "> # Quoted heading",
+    "# [Title][ref]\n\n[ref]: /url",
+])
+def test_gfm_left_to_streamlit(markdown):
+    assert render_html(markdown) == markdown
+
+
+def test_headings_kept_as_markdown():
+    html = render_html("# Title\n\nSome **text**\n\nSub\n---\n\n- item")
+    assert html == "# Title\n\n<p>Some <strong>text</strong></p>\n\nSub\n---\n\n<ul>\n<li>item</li>\n</ul>\n"
+
+
+def test_links_and_images_rendered():
+    html = render_html("![alt](http://localhost:8000/img.png) [link](http://example.org) <http://example.org>")
+    assert html.startswith("<p><img src=\"http://localhost:8000/img.png\" alt=\"alt\" />")
@@ -0,0 +1,94 @@
+"""
+Tests of presentations and of their event streams on the image server.
+"""
+import http.client
+import json
+import time
+
+import pytest
+
+from mdslider import ImageServer, Presentation, PresentationHub
+
+
+def test_publish():
+    presentation = Presentation("room")
+    assert presentation.publish(0, 3, "<h1>One</h1>")
+    assert not presentation.publish(0, 3, "<h1>One</h1>")
+    version, event = presentation.wait(0, timeout=0)
+    assert version == 1
+    assert event.startswith(b"event: slide\ndata: ")
+    data = json.loads(event.decode("utf-8").split("data: ", 1)[1])
+    assert data == {"page": 0, "total": 3, "html": "<h1>One</h1>", "preload": []}
+
+
+def test_wait_times_out():
+    presentation = Presentation("room")
+    start = time.monotonic()
+    assert presentation.wait(0, timeout=0.1) == (0, None)
+    assert time.monotonic() - start >= 0.1
+
+
+def test_hub():
+    hub = PresentationHub()
+    first, second = hub.create(), hub.create()
+    assert first.room != second.room
+    assert hub.get(first.room) is first
+    hub.end(first.room)
+    assert first.ended
+    assert hub.get(first.room) is None
+    assert hub.get(second.room) is second
+    hub.end("no such room")
+
+
+def test_stale_presentations_ended():
+    hub = PresentationHub()
+    stale, live = hub.create(), hub.create()
+    stale.seen -= 120
+    live.publish(0, 1, "<p>x</p>")
+    hub.end_stale(timeout=60)
+    assert stale.ended and hub.get(stale.room) is None
+    assert not live.ended and hub.get(live.room) is live
+
+
+@pytest.fixture
+def server():
+    server = ImageServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+def events(server, room):
+    connection = http.client.HTTPConnection("localhost", server.port, timeout=10)
+    connection.request("GET", f"/present/{room}/events")
+    return connection.getresponse()
+
+
+def test_audience_page(server):
+    presentation = server.presentations.create()
+    connection = http.client.HTTPConnection("localhost", server.port, timeout=10)
+    connection.request("GET", f"/present/{presentation.room}")
+    response = connection.getresponse()
+    assert response.status == 200
+    assert b"EventSource" in response.read()
+    connection.request("GET", "/present/nope/events")
+    assert connection.getresponse().status == 404
+
+
+def test_event_stream(server, monkeypatch):
+    monkeypatch.setattr("mdslider.server.HEARTBEAT_INTERVAL", 0.1)
+    presentation = server.presentations.create()
+    presentation.publish(1, 5, "<h2>Two</h2>", ["/root/img.png"])
+    response = events(server, presentation.room)
+    assert response.getheader("Content-Type") == "text/event-stream"
+    assert response.readline() == b"retry: 1000\n"
+    response.readline()
+    assert response.readline() == b"event: slide\n"
+    data = json.loads(response.readline()[len(b"data: "):])
+    assert data["html"] == "<h2>Two</h2>" and data["preload"] == ["/root/img.png"]
+    assert presentation.viewers == 1
+
+    # The presenter went away: the stream ends with an 'end' event
+    presentation.seen -= 3600
+    assert b"event: end\n" in response.read()
+    assert server.presentations.get(presentation.room) is None
@@ -0,0 +1,71 @@
+"""
+Tests of full-text slide search.
+"""
+from mdslider import SearchIndex, build_deck, page_snippet, page_words, update_deck
+
+CONFIG = (frozenset({"separator_hr"}), 20, "http://localhost:1/abc", None)
+DOCUMENT = ("# Apples\n\nRed apples and green apples.\n\n---\n\n# Pears\n\nPears are sweet.\n\n---\n\n"
+            "# Fruit salad\n\nApples, pears and ![grapes](grapes.png).\n")
+
+
+def test_page_words():
+    assert page_words("# Title ![pic](http://host/image_name.png) <b>Bold</b> ünï") == ["title", "pic", "bold", "ünï"]
+
+
+def test_page_snippet():
+    text = "# Title\n\n" + "filler " * 30 + "the **needle** here " + "more " * 30
+    snippet = page_snippet(text, "needle", width=40)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "needle" in snippet and "*" not in snippet
+    assert page_snippet("Short ![img](x.png) text", "nothing") == "Short text"
+
+
+def test_search_ranks_and_requires_every_word():
+    deck = build_deck(DOCUMENT, CONFIG)
+    index = SearchIndex()
+    assert index.update(deck) == 3
+    ranked = [deck.page_number(page_id) for page_id, _ in index.search("apples")]
+    assert ranked == [0, 2]
+    assert [deck.page_number(page_id) for page_id, _ in index.search("apples pears")] == [2]
+    assert index.search("apples bananas") == []
+    assert index.search("") == []
+
+
+def test_prefix_matches():
+    deck = build_deck(DOCUMENT, CONFIG)
+    index = SearchIndex()
+    index.update(deck)
+    assert {deck.page_number(page_id) for page_id, _ in index.search("pea")} == {1, 2}
+
+
+def test_link_targets_not_searched():
+    deck = build_deck(DOCUMENT, CONFIG)
+    index = SearchIndex()
+    index.update(deck)
+    assert index.search("localhost") == []
+    assert [deck.page_number(page_id) for page_id, _ in index.search("grapes")] == [2]
+
+
+def test_update_after_edit():
+    deck = build_deck(DOCUMENT, CONFIG)
+    index = SearchIndex()
+    index.update(deck)
+    edited = update_deck(deck, DOCUMENT.replace("Pears are sweet.", "Pears are juicy."), CONFIG)
+    # Only the edited page is indexed again
+    assert index.update(edited) == 1
+    assert len(index) == 3
+    assert index.search("sweet") == []
+    assert [edited.page_number(page_id) for page_id, _ in index.search("juicy")] == [1]
+
+
+def test_matches_rebuilt_index():
+    deck = build_deck(DOCUMENT, CONFIG)
+    index = SearchIndex()
+    index.update(deck)
+    text = DOCUMENT.replace("# Pears", "# Pears and apples") + "\n---\n\nNew apples.\n"
+    edited = update_deck(deck, text, CONFIG)
+    index.update(edited)
+    fresh = SearchIndex()
+    fresh.update(edited)
+    assert index.postings == fresh.postings and index.total_words == fresh.total_words
+    assert index.search("apples") == fresh.search("apples")
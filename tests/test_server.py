@@ -0,0 +1,132 @@
+"""
+Tests of the image server.
+"""
+import email.parser
+import http.client
+
+import pytest
+
+from mdslider import ImageServer, Metrics
+from mdslider.server import parse_byte_range
+
+DATA = bytes(range(256)) * 4
+
+
+@pytest.mark.parametrize("header, byte_range", [
+    ("bytes=0-99", (0, 100)),
+    ("bytes=100-", (100, 1024)),
+    ("bytes=-24", (1000, 1024)),
+    ("bytes=1000-5000", (1000, 1024)),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=x-y", None),
+])
+def test_parse_byte_range(header, byte_range):
+    assert parse_byte_range(header, 1024) == byte_range
+
+
+def test_unsatisfiable_range():
+    with pytest.raises(ValueError):
+        parse_byte_range("bytes=2000-", 1024)
+
+
+@pytest.fixture
+def server(tmp_path):
+    images = tmp_path / "images"
+    (images / "sub").mkdir(parents=True)
+    (images / "pic.png").write_bytes(DATA)
+    (images / "sub" / "nested.png").write_bytes(b"nested")
+    (tmp_path / "secret.txt").write_text("secret")
+    server = ImageServer(metrics=Metrics())
+    server.start()
+    server.root = server.add_root(str(images))
+    yield server
+    server.stop()
+
+
+def request(server, path, method="GET", **headers):
+    connection = http.client.HTTPConnection("localhost", server.port, timeout=10)
+    connection.request(method, path, headers=headers)
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response, body
+
+
+def test_image(server):
+    response, body = request(server, f"/{server.root}/pic.png")
+    assert response.status == 200 and body == DATA
+    assert response.getheader("Content-Type") == "image/png"
+    assert response.getheader("Accept-Ranges") == "bytes"
+    assert "max-age" in response.getheader("Cache-Control")
+    response, body = request(server, f"/{server.root}/pic.png", method="HEAD")
+    assert response.status == 200 and body == b""
+    assert response.getheader("Content-Length") == str(len(DATA))
+
+
+def test_conditional(server):
+    response, _ = request(server, f"/{server.root}/pic.png")
+    etag, last_modified = response.getheader("ETag"), response.getheader("Last-Modified")
+    assert request(server, f"/{server.root}/pic.png")[0].getheader("ETag") == etag
+    assert request(server, f"/{server.root}/pic.png", **{"If-None-Match": etag})[0].status == 304
+    assert request(server, f"/{server.root}/pic.png", **{"If-None-Match": f'"other", W/{etag}'})[0].status == 304
+    assert request(server, f"/{server.root}/pic.png", **{"If-None-Match": '"other"'})[0].status == 200
+    assert request(server, f"/{server.root}/pic.png", **{"If-Modified-Since": last_modified})[0].status == 304
+
+
+def test_range(server):
+    response, body = request(server, f"/{server.root}/pic.png", Range="bytes=10-19")
+    assert response.status == 206 and body == DATA[10:20]
+    assert response.getheader("Content-Range") == f"bytes 10-19/{len(DATA)}"
+    response, body = request(server, f"/{server.root}/pic.png", Range="bytes=-4")
+    assert response.status == 206 and body == DATA[-4:]
+    response, body = request(server, f"/{server.root}/pic.png", Range="bytes=0-1,4-5")
+    assert response.status == 200 and body == DATA
+    response, body = request(server, f"/{server.root}/pic.png", Range="bytes=5000-")
+    assert response.status == 416 and body == b""
+    assert response.getheader("Content-Range") == f"bytes */{len(DATA)}"
+    # A range of an older version of the file gets the whole file
+    response, body = request(server, f"/{server.root}/pic.png", Range="bytes=0-1", **{"If-Range": '"old"'})
+    assert response.status == 200 and body == DATA
+
+
+def test_lookup(server):
+    assert request(server, f"/{server.root}/sub/nested.png")[1] == b"nested"
+    assert request(server, f"/{server.root}/nested.png")[1] == b"nested"
+    assert request(server, f"/{server.root}/missing.png")[0].status == 404
+    assert request(server, "/000000000000/pic.png")[0].status == 404
+
+
+@pytest.mark.parametrize("path", ["../secret.txt", "sub/../../secret.txt", "%2e%2e/secret.txt", "..%2fsecret.txt",
+                                  "/etc/passwd"])
+def test_traversal(server, path):
+    assert request(server, f"/{server.root}/{path}")[0].status == 404
+
+
+def test_bundle(server):
+    response, body = request(server, f"/bundle?src=/{server.root}/pic.png&src=/{server.root}/missing.png"
+                                     f"&src=/{server.root}/sub/nested.png")
+    assert response.status == 200
+    content_type = response.getheader("Content-Type")
+    message = email.parser.BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    parts = {part.get_param("name", header="Content-Disposition"): part.get_payload(decode=True)
+             for part in message.get_payload()}
+    assert parts == {"0": DATA, "2": b"nested"}
+
+
+def test_metrics(server):
+    response, body = request(server, "/metrics")
+    assert response.status == 200
+    assert response.getheader("Content-Type").startswith("text/plain")
+
+
+def test_remove_root(server, tmp_path):
+    root = server.add_root(str(tmp_path / "images"), "session a")
+    assert root == server.root
+    server.add_root(str(tmp_path / "images"), "session b")
+    server.remove_root(root, "session a")
+    server.remove_root(root)
+    assert request(server, f"/{root}/pic.png")[0].status == 200
+    server.remove_root(root, "session b")
+    assert request(server, f"/{root}/pic.png")[0].status == 404
+    server.remove_root(root, "session b")
@@ -0,0 +1,194 @@
+"""
+Differential tests of the splitting pipeline.
+
+split_content() is checked against the original sequential split passes,
+kept here as the reference, on random documents; update_deck() against
+build_deck() after random edits.
+"""
+import random
+import re
+
+import pytest
+
+from mdslider import SEPARATORS, build_deck, split_content, update_deck
+
+PIECES = [
+    "# H1 title", "## H2", "### H3", "#### H4", "  # indented", "#tag", "---", "--- ", "----", "**bold**", "****",
+    "**a** b **c**", "text line", "more text", "", "   ", "```", "```python", "| a | b |", "|---|---|", "+-+-+",
+    "![alt](img.png)", " ![x](y) trailing", "![[ob.png]]", "- item", "\t", "a\r", "x y",
+]
+
+
+def split_by_regex(regex, text):
+    """
+    Returns the parts of text split before lines matching regex, outside code
+    blocks and tables. Horizontal rules are dropped.
+    """
+    parts = []
+    current_part = ""
+    in_code_block = False
+    in_table = False
+    table_content = ""
+    for line in text.splitlines():
+        if line.strip().startswith("```"):
+            in_code_block = not in_code_block
+        if line.strip().startswith("|") or line.strip().startswith("+-"):
+            in_table = True
+            table_content += line + "\n"
+            continue
+        elif in_table and not line.strip():
+            in_table = False
+            current_part += table_content
+            table_content = ""
+            continue
+        if in_table:
+            table_content += line + "\n"
+            continue
+        if re.match(regex, line) and not in_code_block:
+            if current_part:
+                parts.append(current_part)
+                current_part = ""
+            if not re.match(r"---\s*$", line):
+                current_part += line + "\n"
+        else:
+            current_part += line + "\n"
+    if table_content:
+        current_part += table_content
+    if current_part:
+        parts.append(current_part)
+    return parts
+
+
+def is_markdown_heading(line):
+    return line.strip().startswith("#")
+
+
+def split_at_last_heading(text):
+    lines = text.splitlines()
+    last_heading_index = -1
+    for i, line in enumerate(lines):
+        if is_markdown_heading(line):
+            last_heading_index = i
+    if last_heading_index > 0:
+        return ["\n".join(lines[:last_heading_index]) + "\n", "\n".join(lines[last_heading_index:]) + "\n"]
+    return ["\n".join(lines) + "\n"]
+
+
+def split_by_lines(num, text):
+    """
+    Returns the parts of text split every num lines, outside code blocks and
+    tables, moving a heading that would end a part to the next one.
+    """
+    parts = []
+    current_chunk = []
+    in_table = False
+    in_code_block = False
+    chunk_line_count = 0
+    for line in text.splitlines():
+        if line.strip().startswith("```"):
+            in_code_block = not in_code_block
+        if line.strip().startswith("|") or line.strip().startswith("+-"):
+            in_table = True
+        elif in_table and not line.strip():
+            in_table = False
+        current_chunk.append(line)
+        chunk_line_count += 1
+        if chunk_line_count >= num and not in_table and not in_code_block:
+            chunk_text = "\n".join(current_chunk) + "\n"
+            if is_markdown_heading(current_chunk[-1]):
+                split_chunks = split_at_last_heading(chunk_text)
+                parts.extend(split_chunks[:-1])
+                current_chunk = [split_chunks[-1].strip()]
+            else:
+                parts.append(chunk_text)
+                current_chunk = []
+            chunk_line_count = len(current_chunk)
+    if current_chunk:
+        parts.append("\n".join(current_chunk) + "\n")
+    return parts
+
+
+def split_after_image(text):
+    parts = []
+    current_part = ""
+    for line in text.splitlines():
+        current_part += line + "\n"
+        if re.match(r"!\[.*\]\(.*\)", line.strip()):
+            parts.append(current_part)
+            current_part = ""
+    if current_part:
+        parts.append(current_part)
+    return parts
+
+
+def reference_split(text, separators, page_lines):
+    """
+    Returns the pages of text as the original split passes made them, each
+    applied to the parts of the previous ones. The H4 separator, which had
+    no pass of its own, splits like the other headings after H3.
+    """
+    passes = {
+        "separator_page_length": lambda x: split_by_lines(page_lines, x),
+        "separator_hr": lambda x: split_by_regex(r"---\s*$", x),
+        "separator_h1": lambda x: split_by_regex(r"^# .*$", x),
+        "separator_h2": lambda x: split_by_regex(r"^## .*$", x),
+        "separator_h3": lambda x: split_by_regex(r"^### .*$", x),
+        "separator_h4": lambda x: split_by_regex(r"^#### .*$", x),
+        "separator_bold": lambda x: split_by_regex(r"^\*\*(.*?)\*\*$", x),
+        "separator_after_image": split_after_image,
+    }
+    parts = [text]
+    for separator, split in passes.items():
+        if separator in separators:
+            parts = [part for page in parts for part in split(page)]
+    return parts if len(parts) > 1 else [text]
+
+
+def random_document(rnd, max_lines):
+    lines = [rnd.choice(PIECES) for _ in range(rnd.randint(0, max_lines))]
+    return "\n".join(lines) + rnd.choice(["", "\n", "\r\n"])
+
+
+def random_separators(rnd):
+    return frozenset(separator for separator in SEPARATORS if rnd.random() < 0.4)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_split_content_matches_reference(seed):
+    rnd = random.Random(seed)
+    for _ in range(1000):
+        text = random_document(rnd, 25)
+        separators = random_separators(rnd)
+        page_lines = rnd.randint(1, 6)
+        assert split_content(text, separators, page_lines) == reference_split(text, separators, page_lines), \
+            (text, sorted(separators), page_lines)
+
+
+def test_h4_separator():
+    text = "# One\ntext\n#### Four\nmore\n##### Five\nend\n"
+    assert split_content(text, {"separator_h4"}, 20) == ["# One\ntext\n", "#### Four\nmore\n##### Five\nend\n"]
+    assert split_content(text, {"separator_h3"}, 20) == [text]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_update_deck_matches_build_deck(seed):
+    rnd = random.Random(seed)
+    for _ in range(150):
+        config = (random_separators(rnd), rnd.randint(1, 6), rnd.choice([None, "http://localhost:1/abc"]),
+                  rnd.choice([None, "1920x1080"]))
+        text = random_document(rnd, 40)
+        deck = build_deck(text, config)
+        deck.toc()
+        for _ in range(6):
+            start = rnd.randint(0, len(text))
+            end = min(len(text), start + rnd.randint(0, 30))
+            inserted = rnd.choice(["", "x", "\n", "\r", "#", "|", "```\n",
+                                   "\n".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 4)))])
+            text = text[:start] + inserted + text[end:]
+            deck = update_deck(deck, text, config)
+            full = build_deck(text, config)
+            assert deck.text == full.text
+            assert deck.pages == full.pages, (text, config)
+            assert deck.segments == full.segments, (text, config)
+            assert deck.page_texts() == full.page_texts()
+            assert deck.toc() == full.toc(), (text, config)
@@ -0,0 +1,62 @@
+"""
+Tests of downscaled image variants.
+"""
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from mdslider import VariantCache, parse_fit
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = VariantCache(str(tmp_path / "cache"), 10 * 1024 * 1024, workers=1)
+    yield cache
+    cache.shutdown()
+
+
+def write_image(path, size):
+    Image.new("RGB", size, (200, 30, 30)).save(path)
+    return str(path)
+
+
+def test_parse_fit():
+    assert parse_fit("800x600") == (800, 600)
+    assert parse_fit("800X600") == (800, 600)
+    assert parse_fit("0x600") is None
+    assert parse_fit("wide") is None
+    assert parse_fit(None) is None
+
+
+def test_variant_scaled_down(cache, tmp_path):
+    path = write_image(tmp_path / "big.png", (400, 300))
+    variant = cache.get(path, (100, 100))
+    with Image.open(variant) as image:
+        assert image.size == (100, 75)
+    mtime = os.stat(variant).st_mtime_ns
+    assert cache.get(path, (100, 100)) == variant
+    assert os.stat(variant).st_mtime_ns == mtime
+
+
+def test_small_image_served_as_is(cache, tmp_path):
+    path = write_image(tmp_path / "small.png", (40, 30))
+    assert cache.get(path, (100, 100)) is None
+    assert cache.get(str(tmp_path / "missing.png"), (100, 100)) is None
+
+
+def test_made_again_after_shutdown(cache, tmp_path):
+    path = write_image(tmp_path / "big.png", (400, 300))
+    assert cache.get(path, (100, 100)) is not None
+    cache.shutdown()
+    assert not cache.jobs
+    assert cache.get(path, (50, 50)) is not None
+
+
+def test_new_pool_after_worker_died(cache, tmp_path):
+    path = write_image(tmp_path / "big.png", (400, 300))
+    died = cache.process_pool().submit(os._exit, 1)
+    with pytest.raises(Exception):
+        died.result(60)
+    assert cache.get(path, (100, 100)) is not None
@@ -0,0 +1,65 @@
+"""
+Tests of the table of contents.
+"""
+import random
+
+import pytest
+
+from mdslider import Outline, build_deck, make_index, page_label, remove_decorators, split_content
+
+CONFIG = (frozenset({"separator_hr"}), 20, None, None)
+DOCUMENT = "\n\n---\n\n".join([
+    "# Intro", "Plain page", "## Part A", "### Detail", "text under a", "## Part B", "---", "#### Deep",
+    "# Appendix", "**Bold title:**",
+])
+
+
+def test_page_label():
+    assert remove_decorators("## **Bold** title:") == " Bold title"
+    assert page_label("\n\n# Title\ntext") == " Title"
+    assert page_label("  \n") is None
+    assert page_label("---\n") is None
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_deck_toc_matches_make_index(seed):
+    rnd = random.Random(seed)
+    pieces = ["# H", "## Sub", "text", "", "---", "----", "**Bold:**", "```", "| a |"]
+    for _ in range(300):
+        text = "\n".join(rnd.choice(pieces) for _ in range(rnd.randint(0, 30)))
+        deck = build_deck(text, CONFIG)
+        labels, _ = make_index(split_content(text, CONFIG[0], 20))
+        assert deck.toc()[0] == labels, text
+
+
+def test_outline_tree():
+    deck = build_deck(DOCUMENT, CONFIG)
+    outline = deck.outline()
+    assert outline.titles == [" Intro", "Plain page", " Part A", " Detail", "text under a", " Part B", " Deep",
+                              " Appendix", "Bold title"]
+    assert outline.levels == [1, 0, 2, 3, 0, 2, 4, 1, 0]
+    # Entries are numbered like the page index
+    assert [f"{i + 1}. {title}" for i, title in enumerate(outline.titles)] == deck.toc()[0]
+    intro, part_a, detail, part_b, deep = 0, 2, 3, 5, 6
+    assert outline.children[-1] == [intro, 7]
+    assert outline.children[intro] == [1, part_a, part_b]
+    assert outline.children[part_a] == [detail]
+    assert outline.children[detail] == [4]
+    assert outline.ancestors(deep) == [part_b, intro]
+
+
+def test_outline_visible_and_filter():
+    deck = build_deck(DOCUMENT, CONFIG)
+    outline = deck.outline()
+    assert outline.visible(set()) == [(0, 0), (7, 0)]
+    expanded = {outline.page_ids[0], outline.page_ids[2]}
+    assert outline.visible(expanded) == [(0, 0), (1, 1), (2, 1), (3, 2), (5, 1), (7, 0)]
+    assert outline.filter("PART") == [2, 5]
+    assert outline.entry(outline.page_ids[3]) == 3
+    assert outline.entry(-1) is None
+
+
+def test_outline_of_pages_without_headings():
+    outline = Outline([0, 1], [10, 11], ["a", "b"], [0, 0])
+    assert outline.children[-1] == [0, 1]
+    assert outline.visible(set()) == [(0, 0), (1, 0)]
@@ -0,0 +1,68 @@
+"""
+Tests of the file watcher.
+"""
+import os
+import time
+
+import pytest
+
+from mdslider import FileWatcher
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def watcher(request, tmp_path, monkeypatch):
+    path = tmp_path / "deck.md"
+    path.write_text("# One\n")
+    if request.param == "polling":
+        monkeypatch.setattr("mdslider.watch.inotify_watch", lambda directory: None)
+    watcher = FileWatcher(str(path), debounce=0.05, interval=0.05)
+    watcher.start()
+    yield watcher
+    watcher.stop()
+
+
+def test_version_bumped_on_change(watcher):
+    with open(watcher.path, "w") as f:
+        f.write("# Two, edited\n")
+    assert wait_for(lambda: watcher.version == 1)
+
+
+def test_rename_over_file_noticed(watcher):
+    temp = watcher.path + ".tmp"
+    with open(temp, "w") as f:
+        f.write("# Saved\n")
+    os.replace(temp, watcher.path)
+    assert wait_for(lambda: watcher.version == 1)
+
+
+def test_same_content_ignored(watcher):
+    os.utime(watcher.path, ns=(0, 0))
+    with open(watcher.path, "w") as f:
+        f.write("# One\n")
+    time.sleep(0.5)
+    assert watcher.version == 0
+
+
+def test_other_files_ignored(watcher):
+    with open(os.path.join(os.path.dirname(watcher.path), "other.md"), "w") as f:
+        f.write("# Other\n")
+    time.sleep(0.5)
+    assert watcher.version == 0
+
+
+def test_stop_without_waiting(watcher):
+    thread = watcher.thread
+    assert not watcher.start()
+    watcher.stop(wait=False)
+    thread.join(5)
+    assert not thread.is_alive()
+    assert watcher.fd is None